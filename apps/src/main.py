@@ -0,0 +1,10 @@
+import os
+
+from common.src.registry import load_registry
+from common.src.rp_app import create_rp_host
+
+
+# 单进程承载多个应用：每个应用挂载在其 redirect_uri 的路径前缀下（如 /app3/callback -> /app3）
+# RP_HOST_APPS 指定本进程承载的应用（逗号分隔），默认为 SSO_APPS 中的全部应用
+_names = [n.strip() for n in os.getenv("RP_HOST_APPS", "").split(",") if n.strip()]
+app = create_rp_host(load_registry(_names or None))
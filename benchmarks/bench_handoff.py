@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+门户 -> 应用交接的应用侧耗时：?sso_token=<access_token>（userinfo / 本地 JWT 校验） vs. 一次性交接票据
+sso_token 每次都是新 token（真实登录如此），票据兑换包含签名校验与防重放记录（内存 / SQLite）
+用法: python -m benchmarks.bench_handoff [交接次数] [IdP 延迟秒数]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, List
+
+from benchmarks.fake_idp import start_fake_idp
+
+
+def _configure_env(issuer: str, client_id: str, client_secret: str) -> None:
+    os.environ.update({
+        "CASDOOR_ISSUER": issuer,
+        "SSO_APPS": "app1",
+        "APP1_CLIENT_ID": client_id,
+        "APP1_CLIENT_SECRET": client_secret,
+        "APP1_REDIRECT_URI": "http://127.0.0.1:9001/callback",
+        "LOG_LEVEL": "error",
+    })
+
+
+async def _time(label: str, handoffs: int, step: Callable[[int], Awaitable[object]]) -> float:
+    start = time.perf_counter()
+    for i in range(handoffs):
+        assert await step(i)
+    elapsed = (time.perf_counter() - start) / handoffs * 1000
+    print(f"{label:<28} {elapsed:8.3f} ms/次")
+    return elapsed
+
+
+async def run(handoffs: int, latency: float) -> None:
+    idp, server = start_fake_idp(latency)
+    try:
+        _configure_env(idp.issuer, idp.client_id, idp.client_secret)
+        from common.src.handoff import TicketReplayCache, issue_ticket, redeem_ticket
+        from common.src.registry import load_registry
+
+        rp = next(iter(load_registry(["app1"])))
+        await rp.oidc.open()
+        tokens: List[str] = [idp.sign(idp.claims()) for _ in range(handoffs)]
+        user = {"username": "bench", "name": "bench", "email": "bench@example.com", "sub": "bench-user-id"}
+        tickets = [issue_ticket(rp, user, "bench-sid") for _ in range(handoffs)]
+        # 预热：发现文档与 JWKS
+        await rp.oidc.verify_access_token(idp.sign(idp.claims()))
+        idp.reset_stats()
+
+        print(f"交接 {handoffs} 次，IdP 延迟 {latency * 1000:.0f} ms，票据 {len(tickets[0])} 字节 / access_token {len(tokens[0])} 字节")
+        await _time("sso_token + userinfo", handoffs, lambda i: rp.oidc.fetch_userinfo(tokens[i]))
+        userinfo_requests = idp.requests
+        await _time("sso_token + 本地 JWT 校验", handoffs, lambda i: rp.oidc.verify_access_token(tokens[i]))
+        memory = TicketReplayCache()
+
+        async def redeem_memory(i: int) -> object:
+            return await redeem_ticket(rp, tickets[i], memory, 30)
+
+        await _time("交接票据（内存防重放）", handoffs, redeem_memory)
+        tickets = [issue_ticket(rp, user, "bench-sid") for _ in range(handoffs)]
+        with tempfile.TemporaryDirectory() as tmp:
+            shared = TicketReplayCache(os.path.join(tmp, "handoff.db"))
+
+            async def redeem_sqlite(i: int) -> object:
+                return await redeem_ticket(rp, tickets[i], shared, 30)
+
+            await _time("交接票据（SQLite 防重放）", handoffs, redeem_sqlite)
+            replayed = sum([await redeem_ticket(rp, t, shared, 30) is None for t in tickets])
+            shared.close()
+        print(f"IdP 请求：userinfo 方案 {userinfo_requests} 次，其余 {idp.requests - userinfo_requests} 次；重放被拒 {replayed}/{handoffs}")
+        await rp.oidc.aclose()
+    finally:
+        server.__exit__(None, None, None)
+
+
+def main() -> None:
+    handoffs = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.005
+    asyncio.run(run(handoffs, latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+对比每次登录的 TCP 握手次数：每次调用新建 httpx 客户端 vs. 共享连接池
+用法: python -m benchmarks.bench_http_pool [登录次数]
+"""
+import asyncio
+import sys
+import time
+
+from common.src.config import HttpPoolConfig
+from common.src.oidc import OIDCClient
+from benchmarks.fake_idp import start_fake_idp
+
+
+async def _login(client: OIDCClient) -> None:
+    token = await client.exchange_code("bench-code")
+    await client.verify_id_token(token["id_token"])
+    await client.fetch_userinfo(token["access_token"])
+
+
+async def run(logins: int, pooled: bool) -> None:
+    idp, server = start_fake_idp()
+    try:
+        client = OIDCClient(idp.issuer, idp.client_id, idp.client_secret, "http://127.0.0.1/callback", pool=HttpPoolConfig())
+        if pooled:
+            await client.open()
+        start = time.perf_counter()
+        try:
+            for _ in range(logins):
+                await _login(client)
+        finally:
+            await client.aclose()
+        elapsed = time.perf_counter() - start
+        label = "共享连接池" if pooled else "每次新建客户端"
+        print(f"{label}: 登录 {logins} 次, 请求 {idp.requests}, TCP 连接 {len(idp.connections)}, "
+              f"每次登录握手 {len(idp.connections) / logins:.2f}, 平均耗时 {elapsed / logins * 1000:.2f} ms")
+    finally:
+        server.__exit__(None, None, None)
+
+
+def main() -> None:
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    asyncio.run(run(logins, pooled=False))
+    asyncio.run(run(logins, pooled=True))
+
+
+if __name__ == "__main__":
+    main()
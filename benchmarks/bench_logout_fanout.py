@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+后端通道注销扇出：门户退出后通知全部应用的耗时，按并发度对比
+替身应用为同一进程内挂载的真实应用引擎（create_rp_host），可注入响应延迟与 503 失败以验证重试；
+替身与门户共用一个进程，高并发时耗时受本机 CPU 限制（约 2ms/请求），真实部署中各应用独立处理
+用法: python -m benchmarks.bench_logout_fanout [--apps 120] [--latency 0.02] [--fail-rate 0.1]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from typing import Any, Dict, List
+
+from benchmarks.fake_idp import ServerThread
+from benchmarks.load_test import _free_port
+
+
+class StandInApps:
+    """包装应用宿主：为 /backchannel-logout 注入延迟与失败，并记录每次成功送达的时间"""
+
+    def __init__(self, app: Any, latency: float, fail_rate: float) -> None:
+        self.app = app
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.attempts = 0
+        self.delivered: List[float] = []
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not scope["path"].endswith("/backchannel-logout"):
+            await self.app(scope, receive, send)
+            return
+        self.attempts += 1
+        await asyncio.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            await send({"type": "http.response.start", "status": 503, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def record(message: Dict[str, Any]) -> None:
+            # 在响应发出前记录，门户收到 200 时送达时间已在列表中
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                self.delivered.append(time.monotonic())
+            await send(message)
+
+        await self.app(scope, receive, record)
+
+
+def _configure_env(names: List[str], port: int) -> None:
+    os.environ.update({
+        # 注销令牌以各应用的 client_secret 签名（HS256），不会访问 Casdoor
+        "CASDOOR_ISSUER": "http://127.0.0.1:9",
+        "SSO_APPS": ",".join(names),
+        "REVOCATION_BACKEND": "memory",
+        "LOG_LEVEL": "warning",
+    })
+    for name in names:
+        prefix = name.upper()
+        os.environ[f"{prefix}_CLIENT_ID"] = f"{name}-client"
+        os.environ[f"{prefix}_CLIENT_SECRET"] = f"{name}-secret"
+        os.environ[f"{prefix}_REDIRECT_URI"] = f"http://127.0.0.1:{port}/{name}/callback"
+
+
+async def _fan_out(stand_in: StandInApps, names: List[str], concurrency: int) -> Dict[str, Any]:
+    from common.src.config import LogoutFanoutConfig, RevocationConfig
+    from common.src.logout import LogoutFanout
+    from common.src.registry import load_registry
+    from common.src.revocation import open_revocation_index
+
+    fanout = LogoutFanout(load_registry(names), LogoutFanoutConfig(concurrency=concurrency, backoff=0.05))
+    await fanout.start()
+    sub = f"user-{concurrency}"
+    stand_in.delivered.clear()
+    attempts = stand_in.attempts
+    start = time.monotonic()
+    fanout.notify(sub=sub)
+    await fanout.drain()
+    elapsed = time.monotonic() - start
+    await fanout.aclose()
+    latencies = sorted(t - start for t in stand_in.delivered)
+    index = open_revocation_index(RevocationConfig(backend="memory"))
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) >= 2 else [elapsed] * 99
+    return {
+        "elapsed_ms": elapsed * 1000,
+        "p50_ms": cuts[49] * 1000,
+        "p95_ms": cuts[94] * 1000,
+        "delivered": len(latencies),
+        "attempts": stand_in.attempts - attempts,
+        "revoked": index.is_revoked(f"sub:{sub}", 0.0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="后端通道注销扇出基准（本地替身应用）")
+    parser.add_argument("--apps", type=int, default=120, help="注册应用数")
+    parser.add_argument("--latency", type=float, default=0.02, help="每个应用处理注销通知的延迟（秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.1, help="注销通知返回 503 的比例（触发重试）")
+    parser.add_argument("--concurrency", default="1,8,32,128", help="要对比的并发度（逗号分隔）")
+    args = parser.parse_args()
+
+    names = [f"app{i:03d}" for i in range(1, args.apps + 1)]
+    port = _free_port()
+    _configure_env(names, port)
+    # 环境变量就绪后再导入，应用在导入时读取配置
+    from common.src.registry import load_registry
+    from common.src.rp_app import create_rp_host
+
+    stand_in = StandInApps(create_rp_host(load_registry(names)), args.latency, args.fail_rate)
+    with ServerThread(stand_in, port=port, lifespan="on"):
+        print(f"应用数 {args.apps}，单个应用延迟 {args.latency * 1000:.0f} ms，失败率 {args.fail_rate:.0%}")
+        print(f"{'并发度':>6}{'全部送达 ms':>14}{'p50 ms':>10}{'p95 ms':>10}{'送达':>6}{'请求次数':>10}{'已吊销':>8}")
+        for concurrency in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+            r = asyncio.run(_fan_out(stand_in, names, concurrency))
+            print(f"{concurrency:>6}{r['elapsed_ms']:>14.0f}{r['p50_ms']:>10.0f}{r['p95_ms']:>10.0f}"
+                  f"{r['delivered']:>6}{r['attempts']:>10}{str(r['revoked']):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+已验证 Cookie 会话缓存微基准：get_session 每次解码 vs. 按 Cookie 摘要缓存解码结果
+两种情况都包含过期检查与吊销检查（内存吊销列表）
+用法: python -m benchmarks.bench_session_cache [迭代次数]
+"""
+import sys
+import time
+
+from fastapi import Request, Response
+
+from common.src.config import RevocationConfig, SessionCacheConfig, SessionCodecConfig
+from common.src.revocation import RevocationIndex
+from common.src.session import BaseSessionManager
+from benchmarks.bench_session_store import typical_session
+
+
+def _request(cookie_name: str, value: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [(b"cookie", f"{cookie_name}={value}".encode())]})
+
+
+def measure(label: str, codec: SessionCodecConfig, cache: SessionCacheConfig, revocation: RevocationIndex, iterations: int) -> float:
+    manager = BaseSessionManager("dev-secret-change-me", codec=codec, cache=cache, revocation=revocation)
+    response = Response()
+    manager.set_session(response, typical_session())
+    value = response.headers["set-cookie"].split(";", 1)[0].split("=", 1)[1]
+    # 每次请求都会新建 Request，Cookie 头解析计入耗时
+    assert manager.get_session(_request(manager.cookie_name, value))
+    start = time.perf_counter()
+    for _ in range(iterations):
+        manager.get_session(_request(manager.cookie_name, value))
+    elapsed = (time.perf_counter() - start) / iterations * 1e6
+    hits = manager.cache.hits if manager.cache is not None else 0
+    print(f"{label:<22} {len(value):>5} 字节, get_session {elapsed:7.2f} µs, 缓存命中 {hits}")
+    return elapsed
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    revocation = RevocationIndex(RevocationConfig(backend="memory"), gc_interval=0)
+    for i in range(1000):
+        revocation.revoke(f"sub:other-user-{i}", 3600)
+    off = SessionCacheConfig(max_entries=0)
+    on = SessionCacheConfig()
+    for name in ("json", "compact"):
+        codec = SessionCodecConfig(codec=name)
+        before = measure(f"{name}", codec, off, revocation, iterations)
+        after = measure(f"{name} + 缓存", codec, on, revocation, iterations)
+        print(f"{'':<22} 提速 {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
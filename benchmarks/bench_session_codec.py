@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+会话 Cookie 编码微基准：json（itsdangerous）与 compact（二进制 / zlib）的大小与编解码耗时
+用法: python -m benchmarks.bench_session_codec [迭代次数]
+"""
+import sys
+import time
+
+from common.src.session_codec import CompactCodec, JSONCodec
+from benchmarks.bench_session_store import typical_session
+
+
+def measure(label: str, codec: JSONCodec, data: dict, iterations: int) -> None:
+    value = codec.dumps(data)
+    assert codec.loads(value) == data
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.dumps(data)
+    encode = (time.perf_counter() - start) / iterations * 1e6
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.loads(value)
+    decode = (time.perf_counter() - start) / iterations * 1e6
+    print(f"{label:<16} {len(value):>5} 字节, 编码 {encode:7.2f} µs, 解码 {decode:7.2f} µs")
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    data = typical_session()
+    secret, salt = "dev-secret-change-me", "portal-session"
+    measure("json", JSONCodec(secret, salt), data, iterations)
+    measure("compact", CompactCodec(secret, salt, compress=False), data, iterations)
+    measure("compact+zlib", CompactCodec(secret, salt, compress=True), data, iterations)
+    budget = CompactCodec(secret, salt, budget=1000)
+    print(f"compact 预算 1000 字节: {len(budget.dumps(data))} 字节, 保留字段 {sorted(budget.loads(budget.dumps(data)))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+对比 Cookie 会话与服务端会话：Cookie 头字节数与每次请求的解码耗时
+用法: python -m benchmarks.bench_session_store [迭代次数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from common.src.session import BaseSessionManager
+from common.src.session_store import MemorySessionStore, SQLiteSessionStore
+from benchmarks.fake_idp import FakeIdP
+
+
+def typical_session() -> dict:
+    """门户登录后的典型会话：用户信息 + Casdoor 的 id_token / access_token"""
+    idp = FakeIdP()
+    idp.issuer = "http://casdoor.example.com:8000"
+    claims = idp.claims("057afae89f6bab92b9")
+    user = {k: claims[k] for k in ("name", "email", "sub")}
+    user["username"] = claims["preferred_username"]
+    return {"user": user, "id_token": idp.sign(claims), "access_token": idp.sign(claims)}
+
+
+def _request(cookie_name: str, value: str) -> Request:
+    headers = [(b"cookie", f"{cookie_name}={value}".encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def measure(label: str, manager: BaseSessionManager, data: dict, iterations: int) -> None:
+    response = Response()
+    manager.set_session(response, data)
+    set_cookie = response.headers["set-cookie"]
+    value = set_cookie.split(";", 1)[0].split("=", 1)[1]
+    header = f"{manager.cookie_name}={value}"
+    assert manager.get_session(_request(manager.cookie_name, value)) == data
+    start = time.perf_counter()
+    for _ in range(iterations):
+        # 每次请求都要重新解析 Cookie 头并解码会话
+        manager.get_session(_request(manager.cookie_name, value))
+    per_request = (time.perf_counter() - start) / iterations * 1e6
+    print(f"{label:<8} Cookie 头 {len(header):>5} 字节, 解码 {per_request:8.2f} µs/请求")
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    data = typical_session()
+    secret = "dev-secret-change-me"
+    measure("cookie", BaseSessionManager(secret, cookie_name="portal_session", salt="portal-session"), data, iterations)
+    memory = MemorySessionStore(gc_interval=0)
+    measure("memory", BaseSessionManager(secret, cookie_name="portal_session", salt="portal-session", store=memory), data, iterations)
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite = SQLiteSessionStore(os.path.join(tmp, "sessions.db"), gc_interval=0)
+        try:
+            measure("sqlite", BaseSessionManager(secret, cookie_name="portal_session", salt="portal-session", store=sqlite), data, iterations)
+        finally:
+            sqlite.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+页面渲染微基准：Jinja2Templates 每次渲染（旧实现）vs. 匿名页缓存 / ETag 304 / async / 流式渲染，
+以及冷启动时加载模板：每次编译 vs. 字节码缓存
+用法: python -m benchmarks.bench_templates [迭代次数]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable
+
+from fastapi.templating import Jinja2Templates
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+from common.src.config import AppSpec, BaseAppConfig, TemplateConfig
+from common.src.templating import PageTemplates
+
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+APP_TEMPLATES = os.path.join(ROOT, "common", "templates", "app")
+SPEC = AppSpec(
+    name="app1",
+    config=BaseAppConfig(
+        issuer="http://casdoor.example.com:8000", client_id="app1-client", client_secret="secret",
+        redirect_uri="http://localhost:9001/callback", cookie_secure=False, cookie_domain=None,
+        cookie_secret="secret", organization_name="built-in", application_name="app1",
+    ),
+    title="应用1", label="App1", color="#22c55e",
+)
+USER = {"username": "bench", "name": "Bench User", "email": "bench@example.com", "sub": "bench-user-id"}
+PAGE = {"app": SPEC, "root_path": "", "portal_url": "http://localhost:9000/"}
+
+
+def _request(headers: Any = ()) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": list(headers), "query_string": b""})
+
+
+async def _body(response: Response) -> int:
+    if isinstance(response, StreamingResponse):
+        return sum([len(chunk) async for chunk in response.body_iterator])
+    return len(response.body)
+
+
+async def _rate(iterations: int, render: Callable[[], Awaitable[Response]]) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await _body(await render())
+    return iterations / (time.perf_counter() - start)
+
+
+def _cold_load(cfg: TemplateConfig, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        templates = PageTemplates(APP_TEMPLATES, cfg)
+        for name in ("index.html", "protected.html"):
+            templates.env.get_template(name)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+async def run(iterations: int) -> None:
+    legacy = Jinja2Templates(directory=APP_TEMPLATES)
+    request = _request()
+
+    def legacy_render(name: str, **context: Any) -> Callable[[], Awaitable[Response]]:
+        async def render() -> Response:
+            return legacy.TemplateResponse(name, dict(context, request=request))
+        return render
+
+    pages = PageTemplates(APP_TEMPLATES, TemplateConfig())
+    first = await pages.cached(request, "index.html", **PAGE)
+    revalidate = _request([(b"if-none-match", first.headers["etag"].encode())])
+    modes = {mode: PageTemplates(APP_TEMPLATES, TemplateConfig(render_mode=mode)) for mode in ("sync", "async", "stream")}
+
+    results = [
+        ("匿名页 旧实现（每次渲染）", await _rate(iterations, legacy_render("index.html", **PAGE))),
+        ("匿名页 缓存字节", await _rate(iterations, lambda: pages.cached(request, "index.html", **PAGE))),
+        ("匿名页 ETag 命中 304", await _rate(iterations, lambda: pages.cached(revalidate, "index.html", **PAGE))),
+        ("登录页 旧实现（每次渲染）", await _rate(iterations, legacy_render("protected.html", user=USER, **PAGE))),
+    ]
+    for mode, templates in modes.items():
+        results.append((f"登录页 {mode}", await _rate(iterations, lambda t=templates: t.render(request, "protected.html", user=USER, **PAGE))))
+
+    print(f"{'场景':<24}{'次/秒':>12}")
+    for name, rate in results:
+        print(f"{name:<24}{rate:>12.0f}")
+
+    with tempfile.TemporaryDirectory() as bytecode_dir:
+        cold = _cold_load(TemplateConfig(), 50)
+        _cold_load(TemplateConfig(bytecode_dir=bytecode_dir), 1)
+        warm = _cold_load(TemplateConfig(bytecode_dir=bytecode_dir), 50)
+    print(f"冷启动加载模板：每次编译 {cold:.2f} ms，字节码缓存 {warm:.2f} ms")
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    asyncio.run(run(iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+本地模拟的 Casdoor OIDC 服务（仅用于基准测试）
+提供 discovery / authorize（自动同意）/ JWKS / token（授权码与 refresh_token）/ userinfo，签发真实签名的 JWT，
+支持配置响应延迟，并统计请求数与 TCP 连接数
+"""
+import asyncio
+import base64
+import secrets
+import threading
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+import uvicorn
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, RedirectResponse
+from starlette.routing import Route
+
+
+def _b64_uint(value: int) -> str:
+    raw = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+class FakeIdP:
+    def __init__(self, client_id: str = "bench-client", client_secret: str = "bench-secret", latency: float = 0.0, token_ttl: int = 3600) -> None:
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.issuer = ""
+        self.kid = "bench-key-1"
+        self._key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self._pem = self._key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ).decode()
+        # 预先构造签名密钥，避免每次签发都重新解析 PEM（RSA 私钥加载很慢）
+        self._signing_key = jwk.construct(self._pem, "RS256")
+        # 连接统计：uvicorn 为每条 TCP 连接分配不同的客户端端口
+        self.connections: Set[Tuple[str, int]] = set()
+        self.requests = 0
+        # 授权码 -> 申请该授权码的 client_id（作为 token 的 aud）
+        self._codes: Dict[str, str] = {}
+        # refresh_token -> client_id；每次刷新都轮换（旧 refresh_token 失效）
+        self._refresh_tokens: Dict[str, str] = {}
+        self.refreshes = 0
+        self.exchanges = 0
+        self.app = Starlette(routes=[
+            Route("/.well-known/openid-configuration", self.discovery),
+            Route("/login/oauth/authorize", self.authorize),
+            Route("/.well-known/jwks", self.jwks),
+            Route("/api/login/oauth/access_token", self.token, methods=["POST"]),
+            Route("/api/userinfo", self.userinfo),
+        ])
+
+    def reset_stats(self) -> None:
+        self.connections.clear()
+        self.requests = 0
+
+    async def _observe(self, request: Request) -> None:
+        self.requests += 1
+        if request.client is not None:
+            self.connections.add((request.client.host, request.client.port))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def sign(self, claims: Dict[str, Any]) -> str:
+        return jwt.encode(claims, self._signing_key, algorithm="RS256", headers={"kid": self.kid})
+
+    def claims(self, audience: Optional[str] = None, ttl: int = 3600) -> Dict[str, Any]:
+        now = int(time.time())
+        return {
+            "iss": self.issuer,
+            "aud": audience or self.client_id,
+            "sub": "bench-user-id",
+            "name": "bench",
+            "preferred_username": "bench",
+            "email": "bench@example.com",
+            "iat": now,
+            "nbf": now,
+            "exp": now + ttl,
+            "jti": f"admin/{secrets.token_hex(16)}",
+            # Casdoor 的 access/id token 中还携带大量用户资料字段
+            "owner": "sso-org",
+            "displayName": "Bench User",
+            "avatar": "https://cdn.casbin.org/img/casbin.svg",
+            "type": "normal-user",
+            "signupApplication": "portal-app",
+            "createdTime": "2024-01-01T00:00:00+08:00",
+            "updatedTime": "",
+            "phone": "",
+            "countryCode": "CN",
+            "region": "",
+            "location": "",
+            "isAdmin": False,
+            "isForbidden": False,
+            "tokenType": "access-token",
+            "scope": "openid profile email",
+        }
+
+    async def discovery(self, request: Request) -> JSONResponse:
+        await self._observe(request)
+        return JSONResponse({
+            "issuer": self.issuer,
+            "authorization_endpoint": f"{self.issuer}/login/oauth/authorize",
+            "token_endpoint": f"{self.issuer}/api/login/oauth/access_token",
+            "userinfo_endpoint": f"{self.issuer}/api/userinfo",
+            "jwks_uri": f"{self.issuer}/.well-known/jwks",
+        })
+
+    async def authorize(self, request: Request) -> RedirectResponse:
+        """模拟已登录用户：直接同意授权并带授权码跳回 redirect_uri"""
+        await self._observe(request)
+        params = request.query_params
+        code = secrets.token_urlsafe(16)
+        self._codes[code] = params.get("client_id") or self.client_id
+        query = urlencode({"code": code, "state": params.get("state", "")})
+        return RedirectResponse(f"{params['redirect_uri']}?{query}", status_code=302)
+
+    async def jwks(self, request: Request) -> JSONResponse:
+        await self._observe(request)
+        numbers = self._key.public_key().public_numbers()
+        return JSONResponse({"keys": [{
+            "kty": "RSA",
+            "use": "sig",
+            "alg": "RS256",
+            "kid": self.kid,
+            "n": _b64_uint(numbers.n),
+            "e": _b64_uint(numbers.e),
+        }]})
+
+    async def token(self, request: Request) -> JSONResponse:
+        await self._observe(request)
+        # 不依赖 python-multipart，直接解析 x-www-form-urlencoded
+        form = dict(parse_qsl((await request.body()).decode()))
+        if form.get("grant_type") == "urn:ietf:params:oauth:grant-type:token-exchange":
+            return await self._token_exchange(form)
+        if form.get("grant_type") == "refresh_token":
+            audience = self._refresh_tokens.pop(form.get("refresh_token", ""), None)
+            if audience is None:
+                # 与 Casdoor 一致：以 200 返回错误信息
+                return JSONResponse({"error": "invalid_grant", "error_description": "refresh token is invalid"})
+            self.refreshes += 1
+        else:
+            audience = self._codes.pop(form.get("code", ""), None) or form.get("client_id")
+        claims = self.claims(audience, self.token_ttl)
+        refresh_token = secrets.token_urlsafe(24)
+        self._refresh_tokens[refresh_token] = audience or self.client_id
+        return JSONResponse({
+            "access_token": self.sign(claims),
+            "id_token": self.sign(dict(claims, nonce=secrets.token_urlsafe(8))),
+            "refresh_token": refresh_token,
+            "token_type": "Bearer",
+            "expires_in": self.token_ttl,
+        })
+
+    async def _token_exchange(self, form: Dict[str, str]) -> JSONResponse:
+        """RFC 8693：用已签发的 access token 换取目标应用（audience）的 token"""
+        try:
+            jwt.decode(form.get("subject_token", ""), self._signing_key.public_key(), algorithms=["RS256"], options={"verify_aud": False})
+        except Exception:
+            return JSONResponse({"error": "invalid_grant", "error_description": "subject token is invalid"})
+        self.exchanges += 1
+        claims = self.claims(form.get("audience"), self.token_ttl)
+        return JSONResponse({
+            "access_token": self.sign(claims),
+            "issued_token_type": "urn:ietf:params:oauth:token-type:access_token",
+            "token_type": "Bearer",
+            "expires_in": self.token_ttl,
+        })
+
+    async def userinfo(self, request: Request) -> JSONResponse:
+        await self._observe(request)
+        claims = self.claims()
+        return JSONResponse({k: claims[k] for k in ("sub", "name", "preferred_username", "email")})
+
+
+class ServerThread:
+    """在后台线程中运行 uvicorn，监听随机端口"""
+
+    def __init__(self, app: Any, host: str = "127.0.0.1", port: int = 0, lifespan: str = "off") -> None:
+        config = uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan=lifespan)
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.host = host
+        self.port = port
+
+    def __enter__(self) -> "ServerThread":
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("server failed to start")
+            time.sleep(0.01)
+        self.port = self.server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+
+def start_fake_idp(latency: float = 0.0) -> Tuple[FakeIdP, ServerThread]:
+    idp = FakeIdP(latency=latency)
+    server = ServerThread(idp.app)
+    server.__enter__()
+    idp.issuer = server.url
+    return idp, server
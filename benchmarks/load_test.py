@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+端到端压测：进程内启动模拟 Casdoor、门户与 App1，并发执行
+门户登录 -> 授权 -> /callback -> /to/app1 -> App1 兑换交接票据（或 sso_token）
+输出每个端点的 RPS 与 p50/p95/p99，并可写出 JSON 供回归对比
+
+用法:
+    python -m benchmarks.load_test --users 20 --logins 10 --idp-latency 0.02 --json result.json
+    python -m benchmarks.load_test --baseline result.json   # 与上次结果对比
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from benchmarks.fake_idp import FakeIdP, ServerThread
+
+
+STEPS = ["portal /login", "idp authorize", "portal /callback", "portal /to/app1", "app1 hand-off"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _configure_env(issuer: str, portal_port: int, app1_port: int) -> None:
+    os.environ.update({
+        "CASDOOR_ISSUER": issuer,
+        "PORTAL_CLIENT_ID": "portal-client",
+        "PORTAL_CLIENT_SECRET": "portal-secret",
+        "PORTAL_REDIRECT_URI": f"http://127.0.0.1:{portal_port}/callback",
+        "PORTAL_BASE_URL": f"http://127.0.0.1:{portal_port}",
+        "SSO_APPS": "app1",
+        "APP1_CLIENT_ID": "app1-client",
+        "APP1_CLIENT_SECRET": "app1-secret",
+        "APP1_REDIRECT_URI": f"http://127.0.0.1:{app1_port}/callback",
+        # 门户与 App1 在同一进程内，共用进程内吊销索引即可
+        "REVOCATION_BACKEND": "memory",
+        "HANDOFF_REPLAY_BACKEND": "memory",
+    })
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = {step: [] for step in STEPS}
+        self.errors: Dict[str, int] = {step: 0 for step in STEPS}
+
+    async def call(self, step: str, client: httpx.AsyncClient, url: str, expect: int) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            resp = await client.get(url)
+        except httpx.HTTPError:
+            self.errors[step] += 1
+            raise
+        self.samples[step].append(time.perf_counter() - start)
+        if resp.status_code != expect:
+            self.errors[step] += 1
+            raise RuntimeError(f"{step}: HTTP {resp.status_code}")
+        return resp
+
+
+async def _login_flow(recorder: Recorder, client: httpx.AsyncClient, portal: str) -> None:
+    # 每次登录都从全新的浏览器状态开始
+    client.cookies.clear()
+    resp = await recorder.call("portal /login", client, f"{portal}/login", 307)
+    resp = await recorder.call("idp authorize", client, resp.headers["location"], 302)
+    resp = await recorder.call("portal /callback", client, resp.headers["location"], 307)
+    resp = await recorder.call("portal /to/app1", client, f"{portal}/to/app1", 307)
+    location = resp.headers["location"]
+    query = parse_qs(urlsplit(location).query)
+    if "sso_ticket" not in query and "sso_token" not in query:
+        raise RuntimeError("portal did not hand off a ticket or token")
+    await recorder.call("app1 hand-off", client, location, 200)
+
+
+async def _user(recorder: Recorder, portal: str, logins: int) -> int:
+    failures = 0
+    # 每个虚拟用户一个客户端（独立 Cookie），复用其连接
+    async with httpx.AsyncClient(follow_redirects=False, timeout=30) as client:
+        for _ in range(logins):
+            try:
+                await _login_flow(recorder, client, portal)
+            except Exception:
+                failures += 1
+    return failures
+
+
+def _summary(samples: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"count": len(samples), "errors": errors, "rps": len(samples) / elapsed if elapsed else 0.0}
+    if len(samples) >= 2:
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+        result.update(p50_ms=cuts[49] * 1000, p95_ms=cuts[94] * 1000, p99_ms=cuts[98] * 1000)
+    elif samples:
+        result.update(p50_ms=samples[0] * 1000, p95_ms=samples[0] * 1000, p99_ms=samples[0] * 1000)
+    return result
+
+
+async def drive(portal: str, users: int, logins: int) -> Dict[str, Any]:
+    recorder = Recorder()
+    # 预热：建立连接池、拉取发现文档与 JWKS
+    await _user(Recorder(), portal, 1)
+    start = time.perf_counter()
+    failures = await asyncio.gather(*[_user(recorder, portal, logins) for _ in range(users)])
+    elapsed = time.perf_counter() - start
+    completed = users * logins - sum(failures)
+    return {
+        "users": users,
+        "logins_per_user": logins,
+        "elapsed_s": elapsed,
+        "logins_per_s": completed / elapsed if elapsed else 0.0,
+        "failed_logins": sum(failures),
+        "endpoints": {step: _summary(recorder.samples[step], recorder.errors[step], elapsed) for step in STEPS},
+    }
+
+
+def _print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    print(f"并发用户 {report['users']}, 每用户登录 {report['logins_per_user']} 次, "
+          f"耗时 {report['elapsed_s']:.2f}s, 登录 {report['logins_per_s']:.1f}/s, 失败 {report['failed_logins']}")
+    print(f"{'端点':<20}{'次数':>8}{'错误':>6}{'RPS':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for step, stats in report["endpoints"].items():
+        line = f"{step:<20}{stats['count']:>8}{stats['errors']:>6}{stats['rps']:>9.1f}"
+        line += "".join(f"{stats.get(key, 0.0):>9.2f}" for key in ("p50_ms", "p95_ms", "p99_ms"))
+        base = (baseline or {}).get("endpoints", {}).get(step)
+        if base and base.get("p95_ms"):
+            line += f"   p95 {(stats.get('p95_ms', 0.0) / base['p95_ms'] - 1) * 100:+.1f}%"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SSO 登录链路压测（本地模拟 Casdoor）")
+    parser.add_argument("--users", type=int, default=20, help="并发虚拟用户数")
+    parser.add_argument("--logins", type=int, default=10, help="每个用户的登录次数")
+    parser.add_argument("--idp-latency", type=float, default=0.0, help="模拟 IdP 每个请求的延迟（秒）")
+    parser.add_argument("--prewarm", action="store_true", help="登录时预取各应用专属 token（PREWARM_APP_TOKENS，使用 sso_token 交接）")
+    parser.add_argument("--sso-token", action="store_true", help="以 ?sso_token=<access_token> 交接（HANDOFF_TICKETS=false）")
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="用于对比的历史 JSON 结果")
+    args = parser.parse_args()
+
+    idp = FakeIdP(latency=args.idp_latency)
+    portal_port, app1_port = _free_port(), _free_port()
+    with ServerThread(idp.app) as idp_server:
+        idp.issuer = idp_server.url
+        _configure_env(idp.issuer, portal_port, app1_port)
+        if args.prewarm:
+            os.environ["PREWARM_APP_TOKENS"] = "true"
+        if args.prewarm or args.sso_token:
+            os.environ["HANDOFF_TICKETS"] = "false"
+        # 环境变量就绪后再导入，服务在导入时读取配置
+        from portal.src.main import app as portal_app
+        from app1.src.main import app as app1_app
+        with ServerThread(portal_app, port=portal_port, lifespan="on") as portal, \
+                ServerThread(app1_app, port=app1_port, lifespan="on"):
+            report = asyncio.run(drive(portal.url, args.users, args.logins))
+    report["idp_latency_s"] = args.idp_latency
+    report["idp_requests"] = idp.requests
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    _print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+from jose import jwt
+
+
+V = TypeVar("V")
+
+
+def token_digest(token: str) -> bytes:
+    """Cache key for a bearer token: never keep the token itself as a key."""
+    return hashlib.sha256(token.encode()).digest()
+
+
+def token_expiry(token: str, default_ttl: float) -> float:
+    """Wall-clock expiry for a cached token result: the JWT ``exp`` if present."""
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except Exception:
+        exp = None
+    if isinstance(exp, (int, float)):
+        return float(exp)
+    return time.time() + default_ttl
+
+
+class TTLCache(Generic[V]):
+    """LRU cache with a per-entry absolute expiry and single-flight loading.
+
+    With ``max_bytes`` the cache is also bounded by the sum of the ``size``
+    values passed to :meth:`set`.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 0) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._inflight: Dict[Hashable, "asyncio.Future[V]"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Misses that joined an in-flight load instead of going upstream
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            self.pop(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: V, expires_at: float, size: int = 0) -> None:
+        if expires_at <= time.time() or (self.max_bytes and size > self.max_bytes):
+            return
+        if self.max_bytes:
+            self.bytes += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries or (self.max_bytes and self.bytes > self.max_bytes):
+            oldest, _ = self._data.popitem(last=False)
+            self.bytes -= self._sizes.pop(oldest, 0)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+        self.bytes -= self._sizes.pop(key, 0)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._sizes.clear()
+        self.bytes = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[V]], expires_at: float) -> V:
+        value = self.get(key)
+        if value is not None:
+            return value
+        future = self._inflight.get(key)
+        if future is None:
+            # First caller loads; concurrent callers for the same key await its result
+            future = asyncio.ensure_future(loader())
+            self._inflight[key] = future
+
+            def _done(fut: "asyncio.Future[V]") -> None:
+                self._inflight.pop(key, None)
+                if not fut.cancelled() and fut.exception() is None:
+                    self.set(key, fut.result(), expires_at)
+
+            future.add_done_callback(_done)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Dict, Optional, TypeVar
+
+from jose import jwt
+
+from .config import CallbackConfig
+from .oidc import OIDCClient
+
+
+T = TypeVar("T")
+
+
+@dataclass
+class LoginResult:
+    token: Dict[str, Any]
+    claims: Dict[str, Any] = field(default_factory=dict)
+    userinfo: Dict[str, Any] = field(default_factory=dict)
+    # Milliseconds per stage: exchange, verify, userinfo, total
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def profile(self) -> Dict[str, Any]:
+        return self.userinfo or self.claims or {}
+
+    def server_timing(self) -> str:
+        """Value for a ``Server-Timing`` response header."""
+        return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in self.timings.items())
+
+
+async def _timed(timings: Dict[str, float], stage: str, awaitable: Awaitable[T], timeout: float) -> T:
+    start = time.perf_counter()
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    finally:
+        timings[stage] = (time.perf_counter() - start) * 1000
+
+
+async def _optional(timings: Dict[str, float], stage: str, awaitable: Awaitable[Dict[str, Any]], timeout: float) -> Dict[str, Any]:
+    try:
+        return await _timed(timings, stage, awaitable, timeout)
+    except Exception:
+        return {}
+
+
+def _has_claims(id_token: Optional[str], required: Any) -> bool:
+    if not id_token:
+        return False
+    try:
+        claims = jwt.get_unverified_claims(id_token)
+    except Exception:
+        return False
+    return all(claims.get(name) for name in required)
+
+
+async def complete_login(oidc: OIDCClient, code: str, redirect_uri: str, cfg: Optional[CallbackConfig] = None) -> LoginResult:
+    """Exchange the code, then verify the ID token and fetch userinfo concurrently.
+
+    Each stage has its own timeout. Verification and userinfo failures are not
+    fatal (the other source may still identify the user); a failed exchange is.
+    """
+    cfg = cfg or CallbackConfig()
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    token = await _timed(timings, "exchange", oidc.exchange_code(code, redirect_uri=redirect_uri), cfg.exchange_timeout)
+    id_token = token.get("id_token")
+    access_token = token.get("access_token")
+
+    want_userinfo = bool(access_token) and cfg.userinfo_mode != "never"
+    if cfg.userinfo_mode == "auto" and _has_claims(id_token, cfg.required_claims):
+        # The ID token already carries everything the session needs
+        want_userinfo = False
+
+    stages = []
+    if id_token:
+        stages.append(_optional(timings, "verify", oidc.verify_id_token(id_token), cfg.verify_timeout))
+    if want_userinfo:
+        stages.append(_optional(timings, "userinfo", oidc.fetch_userinfo(access_token), cfg.userinfo_timeout))
+    results = await asyncio.gather(*stages)
+    claims = results[0] if id_token else {}
+    userinfo = results[-1] if want_userinfo else {}
+
+    if not claims and not userinfo and access_token and not want_userinfo and cfg.userinfo_mode == "auto":
+        # Skipped userinfo but the ID token did not verify: fall back to asking the IdP
+        userinfo = await _optional(timings, "userinfo", oidc.fetch_userinfo(access_token), cfg.userinfo_timeout)
+
+    timings["total"] = (time.perf_counter() - start) * 1000
+    return LoginResult(token=token, claims=claims, userinfo=userinfo, timings=timings)
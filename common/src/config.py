@@ -1,9 +1,47 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
+import json
 import os
+import re
 
+from dotenv import dotenv_values
 
-@dataclass
+
+# Values from SSO_CONFIG_FILE; the process environment takes precedence over them
+_file_values: Optional[Dict[str, str]] = None
+
+
+def read_config_file(path: str) -> Dict[str, str]:
+    """Settings from a JSON object or a dotenv-style KEY=VALUE file."""
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        if not isinstance(data, dict):
+            raise RuntimeError(f"{path}: expected a JSON object of settings")
+        return {k: (str(v).lower() if isinstance(v, bool) else str(v)) for k, v in data.items() if v is not None}
+    if not os.path.exists(path):
+        raise RuntimeError(f"Config file not found: {path}")
+    return {k: v for k, v in dotenv_values(path).items() if v is not None}
+
+
+def use_config_file(values: Dict[str, str]) -> Dict[str, str]:
+    """Install file values for subsequent ``load_*`` calls; returns the previous ones."""
+    global _file_values
+    previous, _file_values = _file_values or {}, values
+    return previous
+
+
+def _getenv(key: str, default: Optional[str] = None) -> Optional[str]:
+    global _file_values
+    if key in os.environ:
+        return os.environ[key]
+    if _file_values is None:
+        path = os.environ.get("SSO_CONFIG_FILE", "")
+        _file_values = read_config_file(path) if path else {}
+    return _file_values.get(key, default)
+
+
+@dataclass(frozen=True, slots=True)
 class BaseAppConfig:
     issuer: str
     client_id: str
@@ -17,14 +55,14 @@ class BaseAppConfig:
 
 
 def _get_env(key: str, default: Optional[str] = None) -> str:
-    value = os.getenv(key, default)
+    value = _getenv(key, default)
     if value is None or value == "":
         raise RuntimeError(f"Missing environment variable: {key}")
     return value
 
 
 def _get_bool(key: str, default: str = "false") -> bool:
-    val = os.getenv(key, default).strip().lower()
+    val = _getenv(key, default).strip().lower()
     return val in {"1", "true", "yes", "on"}
 
 
@@ -32,8 +70,8 @@ def _base() -> dict:
     return {
         "issuer": _get_env("CASDOOR_ISSUER"),
         "cookie_secure": _get_bool("COOKIE_SECURE", "false"),
-        "cookie_domain": os.getenv("COOKIE_DOMAIN", None) or None,
-        "cookie_secret": os.getenv("COOKIE_SECRET", "dev-secret-change-me"),
+        "cookie_domain": _getenv("COOKIE_DOMAIN", None) or None,
+        "cookie_secret": _getenv("COOKIE_SECRET", "dev-secret-change-me"),
     }
 
 
@@ -52,33 +90,509 @@ def load_portal_config() -> BaseAppConfig:
     )
 
 
-def load_app1_config() -> BaseAppConfig:
+def load_portal_base_url() -> str:
+    """Public URL of the portal as linked from the apps; empty to derive it from the request."""
+    return (_getenv("PORTAL_BASE_URL") or "").rstrip("/")
+
+
+def _env_prefix(name: str) -> str:
+    return re.sub(r"[^0-9A-Za-z]", "_", name).upper()
+
+
+def load_app_config(name: str) -> BaseAppConfig:
+    """Relying-party config from ``<NAME>_CLIENT_ID``, ``<NAME>_CLIENT_SECRET``, ..."""
+    prefix = _env_prefix(name)
     base = _base()
     return BaseAppConfig(
         issuer=base["issuer"],
-        client_id=_get_env("APP1_CLIENT_ID"),
-        client_secret=_get_env("APP1_CLIENT_SECRET"),
-        redirect_uri=_get_env("APP1_REDIRECT_URI"),
+        client_id=_get_env(f"{prefix}_CLIENT_ID"),
+        client_secret=_get_env(f"{prefix}_CLIENT_SECRET"),
+        redirect_uri=_get_env(f"{prefix}_REDIRECT_URI"),
         cookie_secure=base["cookie_secure"],
         cookie_domain=base["cookie_domain"],
         cookie_secret=base["cookie_secret"],
         organization_name=_get_env("CASDOOR_ORGANIZATION_NAME", "built-in"),
-        application_name=_get_env("APP1_APPLICATION_NAME", "app1"),
+        application_name=_get_env(f"{prefix}_APPLICATION_NAME", name),
     )
 
 
+def load_app1_config() -> BaseAppConfig:
+    return load_app_config("app1")
+
+
 def load_app2_config() -> BaseAppConfig:
-    base = _base()
-    return BaseAppConfig(
-        issuer=base["issuer"],
-        client_id=_get_env("APP2_CLIENT_ID"),
-        client_secret=_get_env("APP2_CLIENT_SECRET"),
-        redirect_uri=_get_env("APP2_REDIRECT_URI"),
-        cookie_secure=base["cookie_secure"],
-        cookie_domain=base["cookie_domain"],
-        cookie_secret=base["cookie_secret"],
-        organization_name=_get_env("CASDOOR_ORGANIZATION_NAME", "built-in"),
-        application_name=_get_env("APP2_APPLICATION_NAME", "app2"),
+    return load_app_config("app2")
+
+
+# Presentation defaults for the two original demo apps
+_APP_DEFAULTS = {
+    "app1": {"title": "应用1", "label": "App1", "color": "#22c55e"},
+    "app2": {"title": "应用2", "label": "App2", "color": "#f97316"},
+}
+
+
+@dataclass(frozen=True, slots=True)
+class AppSpec:
+    name: str
+    config: BaseAppConfig
+    title: str
+    label: str
+    color: str
+    # Public base URL of the app; when empty it is derived from the request host
+    # and the port/path of the app's redirect_uri
+    base_url: str = ""
+    # Where the portal POSTs logout tokens; when empty, /backchannel-logout next to the redirect_uri
+    backchannel_logout_uri: str = ""
+
+
+def load_app_names() -> List[str]:
+    names = [n.strip() for n in _getenv("SSO_APPS", "app1,app2").split(",") if n.strip()]
+    if len(set(names)) != len(names):
+        raise RuntimeError("Duplicate application in SSO_APPS")
+    return names
+
+
+def load_app_spec(name: str) -> AppSpec:
+    prefix = _env_prefix(name)
+    defaults = _APP_DEFAULTS.get(name, {})
+    return AppSpec(
+        name=name,
+        config=load_app_config(name),
+        title=_getenv(f"{prefix}_TITLE") or defaults.get("title", name),
+        label=_getenv(f"{prefix}_LABEL") or defaults.get("label", name),
+        color=_getenv(f"{prefix}_COLOR") or defaults.get("color", "#0ea5e9"),
+        base_url=(_getenv(f"{prefix}_BASE_URL") or "").rstrip("/"),
+        backchannel_logout_uri=_getenv(f"{prefix}_BACKCHANNEL_LOGOUT_URI") or "",
     )
 
 
+@dataclass(frozen=True, slots=True)
+class HttpPoolConfig:
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    timeout: float = 10.0
+    http2: bool = False
+
+
+def _get_int(key: str, default: int) -> int:
+    val = _getenv(key)
+    if val is None or val.strip() == "":
+        return default
+    try:
+        return int(val)
+    except ValueError:
+        raise RuntimeError(f"Invalid integer for environment variable: {key}")
+
+
+def _get_float(key: str, default: float) -> float:
+    val = _getenv(key)
+    if val is None or val.strip() == "":
+        return default
+    try:
+        return float(val)
+    except ValueError:
+        raise RuntimeError(f"Invalid number for environment variable: {key}")
+
+
+def load_http_pool_config() -> HttpPoolConfig:
+    return HttpPoolConfig(
+        max_connections=_get_int("HTTP_POOL_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=_get_int("HTTP_POOL_MAX_KEEPALIVE", 20),
+        keepalive_expiry=_get_float("HTTP_POOL_KEEPALIVE_EXPIRY", 30.0),
+        timeout=_get_float("HTTP_TIMEOUT", 10.0),
+        http2=_get_bool("HTTP2", "false"),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class UserinfoCacheConfig:
+    # 0 disables the cache (opt-in)
+    max_entries: int = 0
+    # Lifetime for opaque (non-JWT) tokens; JWT results expire at the token's exp
+    default_ttl: float = 60.0
+
+
+def load_userinfo_cache_config() -> UserinfoCacheConfig:
+    return UserinfoCacheConfig(
+        max_entries=_get_int("USERINFO_CACHE_SIZE", 0),
+        default_ttl=_get_float("USERINFO_CACHE_TTL", 60.0),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class ClaimsMemoConfig:
+    # Verified-claims entries kept per OIDCClient; 0 disables the memo
+    max_entries: int = 1024
+
+
+def load_claims_memo_config() -> ClaimsMemoConfig:
+    return ClaimsMemoConfig(max_entries=_get_int("CLAIMS_MEMO_SIZE", 1024))
+
+
+@dataclass(frozen=True, slots=True)
+class TokenValidationConfig:
+    # "local": verify the hand-off JWT against the cached JWKS; "userinfo": ask Casdoor
+    mode: str = "local"
+    # In local mode, fall back to the userinfo endpoint for opaque tokens or an unreachable JWKS
+    userinfo_fallback: bool = True
+    audiences: Tuple[str, ...] = ()
+
+
+def load_token_validation_config(client_id: str) -> TokenValidationConfig:
+    mode = _getenv("SSO_TOKEN_VALIDATION", "local").strip().lower()
+    if mode not in {"local", "userinfo"}:
+        raise RuntimeError(f"Invalid SSO_TOKEN_VALIDATION: {mode}")
+    audiences = [a.strip() for a in (_getenv("SSO_TOKEN_AUDIENCE") or "").split(",") if a.strip()]
+    if not audiences:
+        # The portal hands its own access token over, so accept the portal's client_id too
+        audiences = [client_id]
+        portal_client_id = _getenv("PORTAL_CLIENT_ID")
+        if portal_client_id and portal_client_id != client_id:
+            audiences.append(portal_client_id)
+    return TokenValidationConfig(
+        mode=mode,
+        userinfo_fallback=_get_bool("SSO_TOKEN_USERINFO_FALLBACK", "true"),
+        audiences=tuple(audiences),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class SessionStoreConfig:
+    # "cookie" keeps the whole session in the cookie; "memory"/"sqlite" keep it server-side
+    backend: str = "cookie"
+    sqlite_path: str = "sessions.db"
+    ttl: float = 8 * 3600
+    gc_interval: float = 60.0
+
+
+def load_session_store_config() -> SessionStoreConfig:
+    backend = _getenv("SESSION_BACKEND", "cookie").strip().lower()
+    if backend not in {"cookie", "memory", "sqlite"}:
+        raise RuntimeError(f"Invalid SESSION_BACKEND: {backend}")
+    return SessionStoreConfig(
+        backend=backend,
+        sqlite_path=_getenv("SESSION_SQLITE_PATH", "sessions.db"),
+        ttl=_get_float("SESSION_TTL", 8 * 3600),
+        gc_interval=_get_float("SESSION_GC_INTERVAL", 60.0),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class SessionCacheConfig:
+    # Decoded cookie sessions by cookie digest, skipping the HMAC check and decode
+    # for repeated cookies; 0 entries disables it
+    max_entries: int = 1024
+    # Bound on the summed cookie sizes of the cached sessions
+    max_bytes: int = 1024 * 1024
+
+
+def load_session_cache_config() -> SessionCacheConfig:
+    return SessionCacheConfig(
+        max_entries=max(_get_int("SESSION_CACHE_SIZE", 1024), 0),
+        max_bytes=max(_get_int("SESSION_CACHE_BYTES", 1024 * 1024), 0),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class RevocationConfig:
+    # "sqlite": shared by every service on the host; "memory": this process only; "off"
+    backend: str = "sqlite"
+    sqlite_path: str = "revocations.db"
+    # Expected live revocations and Bloom filter false-positive rate at that size
+    capacity: int = 100000
+    error_rate: float = 0.001
+    # Seconds between pulls of revocations made by other processes
+    sync_interval: float = 1.0
+
+
+def load_revocation_config() -> RevocationConfig:
+    backend = _getenv("REVOCATION_BACKEND", "sqlite").strip().lower()
+    if backend not in {"sqlite", "memory", "off"}:
+        raise RuntimeError(f"Invalid REVOCATION_BACKEND: {backend}")
+    error_rate = _get_float("REVOCATION_ERROR_RATE", 0.001)
+    if not 0 < error_rate < 1:
+        raise RuntimeError(f"Invalid REVOCATION_ERROR_RATE: {error_rate}")
+    return RevocationConfig(
+        backend=backend,
+        sqlite_path=_getenv("REVOCATION_SQLITE_PATH", "revocations.db"),
+        capacity=max(_get_int("REVOCATION_CAPACITY", 100000), 1),
+        error_rate=error_rate,
+        sync_interval=_get_float("REVOCATION_SYNC_INTERVAL", 1.0),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class SessionCodecConfig:
+    # "json": itsdangerous JSON/base64 (original format); "compact": binary + zlib
+    codec: str = "json"
+    compress: bool = True
+    # Max cookie value length; optional fields are dropped to stay under it
+    budget: int = 4000
+    optional_fields: Tuple[str, ...] = ("id_token",)
+
+
+def load_session_codec_config() -> SessionCodecConfig:
+    codec = _getenv("SESSION_CODEC", "json").strip().lower()
+    if codec not in {"json", "compact"}:
+        raise RuntimeError(f"Invalid SESSION_CODEC: {codec}")
+    optional = _getenv("SESSION_OPTIONAL_FIELDS", "id_token")
+    return SessionCodecConfig(
+        codec=codec,
+        compress=_get_bool("SESSION_COMPRESS", "true"),
+        budget=_get_int("SESSION_COOKIE_BUDGET", 4000),
+        optional_fields=tuple(f.strip() for f in optional.split(",") if f.strip()),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class SnapshotConfig:
+    # Directory for signed discovery/JWKS snapshots; empty disables them
+    directory: str = ""
+    secret: str = "dev-secret-change-me"
+
+
+def load_snapshot_config() -> SnapshotConfig:
+    return SnapshotConfig(
+        directory=_getenv("OIDC_SNAPSHOT_DIR", ""),
+        secret=_getenv("OIDC_SNAPSHOT_SECRET") or _getenv("COOKIE_SECRET", "dev-secret-change-me"),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class CallbackConfig:
+    # "always": fetch userinfo; "auto": skip it when the ID token has required_claims; "never"
+    userinfo_mode: str = "always"
+    exchange_timeout: float = 10.0
+    verify_timeout: float = 5.0
+    userinfo_timeout: float = 5.0
+    required_claims: Tuple[str, ...] = ("sub", "preferred_username", "name", "email")
+
+
+def load_callback_config() -> CallbackConfig:
+    mode = _getenv("CALLBACK_USERINFO_MODE", "always").strip().lower()
+    if mode not in {"always", "auto", "never"}:
+        raise RuntimeError(f"Invalid CALLBACK_USERINFO_MODE: {mode}")
+    required = _getenv("CALLBACK_REQUIRED_CLAIMS", "sub,preferred_username,name,email")
+    return CallbackConfig(
+        userinfo_mode=mode,
+        exchange_timeout=_get_float("CALLBACK_EXCHANGE_TIMEOUT", 10.0),
+        verify_timeout=_get_float("CALLBACK_VERIFY_TIMEOUT", 5.0),
+        userinfo_timeout=_get_float("CALLBACK_USERINFO_TIMEOUT", 5.0),
+        required_claims=tuple(c.strip() for c in required.split(",") if c.strip()),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class TokenRenewalConfig:
+    # Renew the portal's access token with its refresh token before it expires
+    enabled: bool = True
+    # Seconds before expiry at which a background renewal starts
+    skew: float = 60.0
+    # Renewed tokens kept for requests still carrying the old refresh token
+    max_entries: int = 1024
+
+
+def load_token_renewal_config() -> TokenRenewalConfig:
+    return TokenRenewalConfig(
+        enabled=_get_bool("TOKEN_RENEWAL", "true"),
+        skew=_get_float("TOKEN_RENEWAL_SKEW", 60.0),
+        max_entries=_get_int("TOKEN_RENEWAL_CACHE_SIZE", 1024),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class PrewarmConfig:
+    # Mint app-scoped tokens (RFC 8693 token exchange) for every app at portal login
+    enabled: bool = False
+    # Exchanges in flight per login
+    concurrency: int = 4
+    timeout: float = 5.0
+    # (login, app) tokens kept in process
+    max_entries: int = 4096
+
+
+def load_prewarm_config() -> PrewarmConfig:
+    return PrewarmConfig(
+        enabled=_get_bool("PREWARM_APP_TOKENS", "false"),
+        concurrency=max(1, _get_int("PREWARM_CONCURRENCY", 4)),
+        timeout=_get_float("PREWARM_TIMEOUT", 5.0),
+        max_entries=_get_int("PREWARM_CACHE_SIZE", 4096),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class ResilienceConfig:
+    connect_timeout: float = 3.0
+    # Read timeouts per call type
+    discovery_timeout: float = 5.0
+    token_timeout: float = 10.0
+    userinfo_timeout: float = 5.0
+    # Extra attempts for idempotent GETs (discovery, JWKS, userinfo), full-jitter backoff
+    retries: int = 2
+    retry_backoff: float = 0.1
+    retry_backoff_max: float = 1.0
+    # Consecutive failures that open the breaker, and seconds before a trial call
+    breaker_threshold: int = 5
+    breaker_reset: float = 30.0
+
+
+def load_resilience_config() -> ResilienceConfig:
+    return ResilienceConfig(
+        connect_timeout=_get_float("IDP_CONNECT_TIMEOUT", 3.0),
+        discovery_timeout=_get_float("IDP_DISCOVERY_TIMEOUT", 5.0),
+        token_timeout=_get_float("IDP_TOKEN_TIMEOUT", 10.0),
+        userinfo_timeout=_get_float("IDP_USERINFO_TIMEOUT", 5.0),
+        retries=max(0, _get_int("IDP_RETRIES", 2)),
+        retry_backoff=_get_float("IDP_RETRY_BACKOFF", 0.1),
+        retry_backoff_max=_get_float("IDP_RETRY_BACKOFF_MAX", 1.0),
+        breaker_threshold=max(1, _get_int("IDP_BREAKER_THRESHOLD", 5)),
+        breaker_reset=_get_float("IDP_BREAKER_RESET", 30.0),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class SharedCacheConfig:
+    # Memory-mapped file shared by the workers of one host (e.g. /dev/shm/sso-cache); empty disables it
+    path: str = ""
+    slots: int = 1024
+    # Largest cached JSON document is slot_size minus a 40-byte slot header
+    slot_size: int = 8192
+    # Seconds a worker waits for another worker's in-flight fetch before fetching itself
+    wait: float = 2.0
+
+
+def load_shared_cache_config() -> SharedCacheConfig:
+    return SharedCacheConfig(
+        path=_getenv("SHARED_CACHE_PATH", ""),
+        slots=max(1, _get_int("SHARED_CACHE_SLOTS", 1024)),
+        slot_size=max(1024, _get_int("SHARED_CACHE_SLOT_SIZE", 8192)),
+        wait=_get_float("SHARED_CACHE_WAIT", 2.0),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class TemplateConfig:
+    # Directory for compiled template bytecode kept across restarts; empty disables it
+    bytecode_dir: str = ""
+    # Serve anonymous landing pages from bytes rendered once, with ETag / 304
+    cache_anonymous: bool = True
+    # "sync": render to a string; "async": render_async; "stream": stream chunks as rendered
+    render_mode: str = "sync"
+
+
+def load_template_config() -> TemplateConfig:
+    mode = _getenv("TEMPLATE_RENDER", "sync").strip().lower()
+    if mode not in {"sync", "async", "stream"}:
+        raise RuntimeError(f"Invalid TEMPLATE_RENDER: {mode}")
+    return TemplateConfig(
+        bytecode_dir=_getenv("TEMPLATE_BYTECODE_DIR", ""),
+        cache_anonymous=_get_bool("TEMPLATE_CACHE_ANONYMOUS", "true"),
+        render_mode=mode,
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class LogConfig:
+    # "debug" | "info" | "warning" | "error"
+    level: str = "info"
+    # "json": one JSON object per line; "text": human-readable key=value lines
+    format: str = "json"
+    # Records waiting for the writer thread; the oldest are dropped beyond this
+    buffer: int = 10000
+    # Per-event sampling rates, e.g. (("sso_token_verified", 0.1),); unlisted events are kept
+    sample: Tuple[Tuple[str, float], ...] = ()
+    # Mask tokens, secrets and authorization codes in fields and messages
+    redact: bool = True
+
+
+def load_log_config() -> LogConfig:
+    level = _getenv("LOG_LEVEL", "info").strip().lower()
+    if level not in {"debug", "info", "warning", "error"}:
+        raise RuntimeError(f"Invalid LOG_LEVEL: {level}")
+    fmt = _getenv("LOG_FORMAT", "json").strip().lower()
+    if fmt not in {"json", "text"}:
+        raise RuntimeError(f"Invalid LOG_FORMAT: {fmt}")
+    sample = []
+    for item in (_getenv("LOG_SAMPLE") or "").split(","):
+        if not item.strip():
+            continue
+        event, _, rate = item.partition("=")
+        try:
+            sample.append((event.strip(), min(max(float(rate), 0.0), 1.0)))
+        except ValueError:
+            raise RuntimeError(f"Invalid LOG_SAMPLE entry: {item.strip()} (expected event=rate)")
+    return LogConfig(
+        level=level,
+        format=fmt,
+        buffer=max(_get_int("LOG_BUFFER", 10000), 1),
+        sample=tuple(sample),
+        redact=_get_bool("LOG_REDACT", "true"),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class LogoutFanoutConfig:
+    # Relay portal logouts (and Casdoor back-channel logouts) to every registered app
+    enabled: bool = True
+    # Deliveries in flight at once
+    concurrency: int = 16
+    # Further attempts after a failed delivery (network error, 5xx, 429), with jittered backoff
+    retries: int = 3
+    backoff: float = 0.5
+    backoff_max: float = 10.0
+    timeout: float = 5.0
+    # Deliveries waiting for a worker; new ones are dropped (and counted) beyond this
+    queue_size: int = 10000
+    # Lifetime of the logout tokens sent to apps
+    token_ttl: int = 120
+
+
+def load_logout_fanout_config() -> LogoutFanoutConfig:
+    return LogoutFanoutConfig(
+        enabled=_get_bool("LOGOUT_FANOUT", "true"),
+        concurrency=max(_get_int("LOGOUT_FANOUT_CONCURRENCY", 16), 1),
+        retries=max(_get_int("LOGOUT_FANOUT_RETRIES", 3), 0),
+        backoff=_get_float("LOGOUT_FANOUT_BACKOFF", 0.5),
+        backoff_max=_get_float("LOGOUT_FANOUT_BACKOFF_MAX", 10.0),
+        timeout=_get_float("LOGOUT_FANOUT_TIMEOUT", 5.0),
+        queue_size=max(_get_int("LOGOUT_FANOUT_QUEUE_SIZE", 10000), 1),
+        token_ttl=max(_get_int("LOGOUT_FANOUT_TOKEN_TTL", 120), 1),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class HandoffConfig:
+    # Hand off to apps with a one-time signed ticket carrying the user's claims;
+    # false: redirect with ?sso_token=<access_token> (apps call Casdoor to resolve it)
+    tickets: bool = True
+    # Seconds a ticket is valid; it only has to survive one redirect
+    ttl: int = 30
+    # Redeemed ticket IDs, rejected on reuse: "sqlite" is shared by every
+    # service on the host, "memory" covers this process only
+    replay_backend: str = "sqlite"
+    sqlite_path: str = "handoff.db"
+
+
+def load_handoff_config() -> HandoffConfig:
+    backend = _getenv("HANDOFF_REPLAY_BACKEND", "sqlite").strip().lower()
+    if backend not in {"sqlite", "memory"}:
+        raise RuntimeError(f"Invalid HANDOFF_REPLAY_BACKEND: {backend}")
+    return HandoffConfig(
+        tickets=_get_bool("HANDOFF_TICKETS", "true"),
+        ttl=max(_get_int("HANDOFF_TICKET_TTL", 30), 1),
+        replay_backend=backend,
+        sqlite_path=_getenv("HANDOFF_SQLITE_PATH", "handoff.db"),
+    )
+
+
+def load_oidc_options() -> Dict[str, Any]:
+    """Keyword arguments shared by every OIDCClient built in this process."""
+    return {
+        "pool": load_http_pool_config(),
+        "userinfo_cache": load_userinfo_cache_config(),
+        "snapshot": load_snapshot_config(),
+        "claims_memo": load_claims_memo_config(),
+        "resilience": load_resilience_config(),
+        "shared_cache": load_shared_cache_config(),
+    }
@@ -0,0 +1,160 @@
+import asyncio
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from .config import HandoffConfig
+from .log import log
+from .metrics import HANDOFF_TICKETS
+from .registry import RelyingParty
+
+
+def _serializer(rp: RelyingParty) -> URLSafeTimedSerializer:
+    # The app's client secret is shared by the portal and the app only
+    return URLSafeTimedSerializer(rp.spec.config.client_secret, salt="sso-handoff")
+
+
+def issue_ticket(rp: RelyingParty, user: Dict[str, Any], sid: Optional[str] = None) -> str:
+    """One-time ticket handing ``user`` (and the IdP session ``sid``) from the portal to ``rp``.
+
+    The ticket is a signed, timestamped blob: the app checks it without any
+    lookup beyond the replay cache and never calls Casdoor.
+    """
+    claims: Dict[str, Any] = {"aud": rp.spec.config.client_id, "jti": secrets.token_urlsafe(12), "user": user}
+    if sid:
+        claims["sid"] = sid
+    HANDOFF_TICKETS.inc(rp.name, "issued")
+    return _serializer(rp).dumps(claims)
+
+
+class TicketReplayCache:
+    """IDs of redeemed tickets, so each ticket is accepted once.
+
+    With a SQLite file the IDs are shared by every service and worker on the
+    host; the primary key makes "first redemption wins" atomic across
+    processes, and the insert runs in a worker thread. Rows are kept only
+    until the ticket would have expired anyway. An ID is remembered locally
+    only once the shared store has accepted it.
+
+    IDs are never evicted before their ticket expires: a process-local cache
+    holding ``max_entries`` live IDs rejects further tickets rather than
+    forget one that could then be replayed.
+    """
+
+    def __init__(self, path: Optional[str] = None, gc_interval: float = 60.0, max_entries: int = 100000) -> None:
+        self.gc_interval = gc_interval
+        self.max_entries = max_entries
+        # jti -> expires_at, in claim order (close to expiry order: every ticket has the same TTL)
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._gc_at = time.monotonic() + gc_interval
+        if path:
+            # Short busy timeout: the redirect waits for the insert
+            self._conn = sqlite3.connect(path, timeout=0.25, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS handoff_tickets (jti TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+
+    def _remember(self, jti: str, expires_at: float) -> bool:
+        now = time.time()
+        while self._seen:
+            oldest, oldest_expiry = next(iter(self._seen.items()))
+            if oldest_expiry > now:
+                break
+            del self._seen[oldest]
+        if len(self._seen) >= self.max_entries:
+            return False
+        self._seen[jti] = expires_at
+        return True
+
+    def _insert(self, jti: str, expires_at: float) -> Optional[bool]:
+        with self._lock:
+            try:
+                if time.monotonic() >= self._gc_at:
+                    self._gc_at = time.monotonic() + self.gc_interval
+                    self._conn.execute("DELETE FROM handoff_tickets WHERE expires_at <= ?", (time.time(),))
+                self._conn.execute("INSERT INTO handoff_tickets (jti, expires_at) VALUES (?, ?)", (jti, expires_at))
+            except sqlite3.IntegrityError:
+                return False
+            except sqlite3.Error as e:
+                # e.g. "database is locked": not redeemed, so the same ticket can be retried
+                log.warning("handoff_replay_failed", "记录交接票据失败", error=str(e))
+                return None
+        return True
+
+    async def claim(self, jti: str, expires_at: float) -> Optional[bool]:
+        """Record ``jti`` as redeemed: False if it already was, None if it could not be recorded."""
+        if jti in self._seen:
+            return False
+        if self._conn is not None:
+            claimed = await asyncio.get_running_loop().run_in_executor(None, self._insert, jti, expires_at)
+            if claimed is not None:
+                # Only a shortcut for replays: the shared store stays authoritative when this is full
+                self._remember(jti, expires_at)
+            return claimed
+        if not self._remember(jti, expires_at):
+            log.warning("handoff_replay_full", "交接票据防重放记录已满，拒绝新票据", max_entries=self.max_entries)
+            return None
+        return True
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+
+_replay_caches: Dict[str, TicketReplayCache] = {}
+
+
+def open_ticket_replay_cache(cfg: HandoffConfig) -> TicketReplayCache:
+    """The process-wide replay cache for ``cfg`` (shared by every app in the process)."""
+    name = cfg.sqlite_path if cfg.replay_backend == "sqlite" else ":memory:"
+    cache = _replay_caches.get(name)
+    if cache is not None:
+        return cache
+    if cfg.replay_backend == "sqlite":
+        try:
+            cache = TicketReplayCache(cfg.sqlite_path)
+        except sqlite3.Error as e:
+            log.warning("handoff_replay_unavailable", "交接票据防重放文件不可用，仅在本进程内生效", path=cfg.sqlite_path, error=str(e))
+            name = ":memory:"
+            cache = _replay_caches.get(name)
+    if cache is None:
+        cache = TicketReplayCache()
+    _replay_caches[name] = cache
+    return cache
+
+
+async def redeem_ticket(rp: RelyingParty, ticket: str, replay: TicketReplayCache, ttl: int) -> Optional[Dict[str, Any]]:
+    """Claims of a valid, unused ticket for ``rp`` (``user`` and optionally ``sid``), else None."""
+    try:
+        claims, signed_at = _serializer(rp).loads(ticket, max_age=ttl, return_timestamp=True)
+    except SignatureExpired:
+        HANDOFF_TICKETS.inc(rp.name, "expired")
+        log.warning("handoff_ticket_rejected", "交接票据已过期", app=rp.name)
+        return None
+    except BadSignature:
+        HANDOFF_TICKETS.inc(rp.name, "invalid")
+        log.warning("handoff_ticket_rejected", "交接票据签名无效", app=rp.name)
+        return None
+    if not isinstance(claims, dict) or claims.get("aud") != rp.spec.config.client_id or not isinstance(claims.get("user"), dict):
+        HANDOFF_TICKETS.inc(rp.name, "invalid")
+        log.warning("handoff_ticket_rejected", "交接票据内容无效", app=rp.name)
+        return None
+    claimed = await replay.claim(str(claims.get("jti")), signed_at.timestamp() + ttl + 1)
+    if claimed is None:
+        HANDOFF_TICKETS.inc(rp.name, "unavailable")
+        return None
+    if not claimed:
+        HANDOFF_TICKETS.inc(rp.name, "replayed")
+        log.warning("handoff_ticket_replayed", "交接票据已被使用", app=rp.name)
+        return None
+    HANDOFF_TICKETS.inc(rp.name, "redeemed")
+    return claims
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from jose import jwk
+from jose.backends.base import Key
+
+
+# Algorithm used for keys that do not advertise one in their JWK
+_DEFAULT_ALG = {"RSA": "RS256", "EC": "ES256"}
+
+
+class JWKSKeyStore:
+    """kid-indexed store of parsed JWKS public keys.
+
+    - Keys are parsed once per (kid, alg) and reused for every verification.
+    - Concurrent refreshes share a single in-flight fetch.
+    - Once ``ttl`` has elapsed the current keys keep being served while a
+      background refresh revalidates them (stale-while-revalidate).
+    - An unknown ``kid`` forces one refetch, at most every ``min_refresh_interval``
+      seconds, so key rotation is picked up without waiting for the TTL.
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable[Dict[str, Any]]], ttl: float = 300, min_refresh_interval: float = 30) -> None:
+        self._fetch = fetch
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._jwks: Optional[Dict[str, Any]] = None
+        self._raw: Dict[str, Dict[str, Any]] = {}
+        self._parsed: Dict[str, Dict[str, Key]] = {}
+        self._fetched_at: float = 0.0
+        self._forced_at: float = 0.0
+        self._inflight: Optional["asyncio.Task[None]"] = None
+        # Bumped whenever the key set actually changes
+        self.version = 0
+        self._listeners: List[Callable[[], None]] = []
+        # Lookups served fresh / served stale while revalidating / that had to wait for a fetch
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @property
+    def jwks(self) -> Optional[Dict[str, Any]]:
+        return self._jwks
+
+    @property
+    def kids(self) -> List[str]:
+        return list(self._raw)
+
+    def on_change(self, listener: Callable[[], None]) -> None:
+        """Call ``listener`` whenever the key set changes (rotation, revocation)."""
+        self._listeners.append(listener)
+
+    def adopt(self, other: "JWKSKeyStore") -> None:
+        """Take over the keys (and their age) of a store being replaced, e.g. on config reload."""
+        self._jwks, self._raw, self._parsed = other._jwks, other._raw, other._parsed
+        self._fetched_at = other._fetched_at
+        self.version = other.version
+
+    def _is_stale(self) -> bool:
+        return (time.monotonic() - self._fetched_at) >= self.ttl
+
+    async def _do_refresh(self) -> None:
+        self.prime(await self._fetch())
+
+    def prime(self, jwks: Dict[str, Any]) -> None:
+        """Install a key set fetched elsewhere (e.g. a persisted snapshot)."""
+        entries = jwks.get("keys", []) if isinstance(jwks, dict) else list(jwks)
+        raw: Dict[str, Dict[str, Any]] = {}
+        for index, entry in enumerate(entries):
+            if entry.get("use", "sig") != "sig":
+                continue
+            raw[entry.get("kid") or f"#{index}"] = entry
+        if raw != self._raw:
+            parsed: Dict[str, Dict[str, Key]] = {}
+            for kid, entry in raw.items():
+                # Keep already-parsed keys for kids whose JWK did not change
+                if self._raw.get(kid) == entry and kid in self._parsed:
+                    parsed[kid] = self._parsed[kid]
+                    continue
+                parsed[kid] = {}
+                alg = entry.get("alg") or _DEFAULT_ALG.get(entry.get("kty", ""))
+                if alg:
+                    try:
+                        parsed[kid][alg] = jwk.construct(entry, alg)
+                    except Exception:
+                        pass
+            self._raw, self._parsed = raw, parsed
+            self.version += 1
+            for listener in self._listeners:
+                listener()
+        self._jwks = {"keys": list(raw.values())}
+        self._fetched_at = time.monotonic()
+
+    async def refresh(self) -> None:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._do_refresh())
+        # shield: a cancelled waiter must not cancel the fetch other waiters share
+        await asyncio.shield(self._inflight)
+
+    def _revalidate_in_background(self) -> None:
+        if self._inflight is not None and not self._inflight.done():
+            return
+        self._inflight = asyncio.ensure_future(self._do_refresh())
+        # Errors are swallowed: the stale keys stay in service until the next attempt
+        self._inflight.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def _ensure_loaded(self) -> None:
+        if self._jwks is None:
+            self.misses += 1
+            await self.refresh()
+        elif self._is_stale():
+            self.stale_hits += 1
+            self._revalidate_in_background()
+        else:
+            self.hits += 1
+
+    async def get_jwks(self) -> Dict[str, Any]:
+        await self._ensure_loaded()
+        return self._jwks or {"keys": []}
+
+    def _lookup(self, kid: str, alg: str) -> Optional[Key]:
+        keys = self._parsed.get(kid)
+        if keys is None:
+            return None
+        key = keys.get(alg)
+        if key is None:
+            try:
+                key = jwk.construct(self._raw[kid], alg)
+            except Exception:
+                return None
+            keys[alg] = key
+        return key
+
+    async def get_keys(self, kid: Optional[str], alg: str) -> List[Key]:
+        """Return the candidate verification keys for a token header."""
+        await self._ensure_loaded()
+        if not kid:
+            return [key for key in (self._lookup(k, alg) for k in self._raw) if key is not None]
+        key = self._lookup(kid, alg)
+        if key is None and kid not in self._raw:
+            now = time.monotonic()
+            if now - self._forced_at >= self.min_refresh_interval:
+                self._forced_at = now
+                try:
+                    await self.refresh()
+                except Exception:
+                    # Stale-if-error: keep the current keys, the token's kid stays unknown
+                    pass
+                key = self._lookup(kid, alg)
+        if key is None:
+            raise KeyError(f"Unknown signing key: kid={kid} alg={alg}")
+        return [key]
@@ -0,0 +1,186 @@
+import atexit
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, TextIO, Tuple
+
+from .config import LogConfig, load_log_config
+from .metrics import REGISTRY
+
+
+_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+# Field names whose values are credentials
+_SECRET_KEYS = re.compile(r"token|secret|password|code|cookie|authorization", re.IGNORECASE)
+# Credentials embedded in free text: JWTs and token/code query parameters
+_JWT = re.compile(r"eyJ[\w-]{4,}\.[\w-]{4,}\.[\w-]*")
+_QUERY_SECRET = re.compile(r"((?:sso_token|sso_ticket|access_token|id_token|refresh_token|code|client_secret)=)[^&\s\"']+")
+
+# time, level, event, message, fields
+_Record = Tuple[float, str, str, str, Dict[str, Any]]
+
+
+def _fingerprint(value: str) -> str:
+    # Same secret -> same tag, so a token can be followed across lines without being logged
+    return f"[redacted:{hashlib.sha256(value.encode()).hexdigest()[:8]}]"
+
+
+def redact_text(text: str) -> str:
+    text = _JWT.sub(lambda m: _fingerprint(m.group(0)), text)
+    return _QUERY_SECRET.sub(lambda m: m.group(1) + _fingerprint(m.group(0)[len(m.group(1)):]), text)
+
+
+def redact(key: str, value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: redact(str(k), v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(key, v) for v in value]
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = str(value)
+    if _SECRET_KEYS.search(key):
+        return _fingerprint(text)
+    return redact_text(text)
+
+
+class Logger:
+    """Structured event log written by a background thread.
+
+    Handlers only append a record to a bounded in-memory buffer; formatting,
+    redaction and the (possibly blocking) write to the stream happen on the
+    writer thread, so a slow stdout or pipe never stalls the event loop. When
+    the writer falls behind, the oldest buffered records are dropped and
+    counted. Events can be sampled per name (``LOG_SAMPLE=event=rate``).
+    """
+
+    def __init__(self, cfg: Optional[LogConfig] = None, stream: Optional[TextIO] = None) -> None:
+        self.stream = stream
+        self.emitted = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self._buffer: Deque[_Record] = deque()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = 0
+        self.configure(cfg)
+
+    def configure(self, cfg: Optional[LogConfig]) -> None:
+        """Apply ``cfg`` (None: load it from the environment on first use)."""
+        self._cfg = cfg
+        if cfg is None:
+            return
+        self._level = _LEVELS[cfg.level]
+        self._sample = dict(cfg.sample)
+        if self._buffer.maxlen != cfg.buffer:
+            self._buffer = deque(self._buffer, maxlen=cfg.buffer)
+
+    def _start(self) -> None:
+        # Threads do not survive fork (uvicorn --workers): each process starts its own writer
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="sso-log-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, level: str, event: str, message: str = "", **fields: Any) -> None:
+        if self._cfg is None:
+            self.configure(load_log_config())
+        if _LEVELS[level] < self._level:
+            return
+        rate = self._sample.get(event)
+        if rate is not None and random.random() >= rate:
+            self.sampled_out += 1
+            return
+        buffer = self._buffer
+        if len(buffer) == buffer.maxlen:
+            # deque(maxlen) discards the oldest record on append
+            self.dropped += 1
+        buffer.append((time.time(), level, event, message, fields))
+        self.emitted += 1
+        if self._pid != os.getpid():
+            self._start()
+        if not self._wake.is_set():
+            self._wake.set()
+
+    def debug(self, event: str, message: str = "", **fields: Any) -> None:
+        self.log("debug", event, message, **fields)
+
+    def info(self, event: str, message: str = "", **fields: Any) -> None:
+        self.log("info", event, message, **fields)
+
+    def warning(self, event: str, message: str = "", **fields: Any) -> None:
+        self.log("warning", event, message, **fields)
+
+    def error(self, event: str, message: str = "", **fields: Any) -> None:
+        self.log("error", event, message, **fields)
+
+    def format(self, record: _Record) -> str:
+        ts, level, event, message, fields = record
+        if self._cfg is not None and self._cfg.redact:
+            message = redact_text(message)
+            fields = {k: redact(k, v) for k, v in fields.items()}
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(ts)) + f".{int(ts % 1 * 1000):03d}"
+        if self._cfg is not None and self._cfg.format == "text":
+            extra = "".join(f" {k}={v}" for k, v in fields.items())
+            return f"{stamp} {level.upper():<7} {event} {message}{extra}\n"
+        line = {"ts": stamp, "level": level, "event": event}
+        if message:
+            line["msg"] = message
+        line.update(fields)
+        return json.dumps(line, ensure_ascii=False, default=str) + "\n"
+
+    def _drain(self) -> None:
+        lines: List[str] = []
+        buffer = self._buffer
+        while buffer:
+            try:
+                record = buffer.popleft()
+            except IndexError:
+                break
+            try:
+                lines.append(self.format(record))
+            except Exception as e:
+                lines.append(json.dumps({"level": "error", "event": "log_format_failed", "msg": str(e)}) + "\n")
+        if lines:
+            stream = self.stream or sys.stdout
+            try:
+                stream.write("".join(lines))
+                stream.flush()
+            except Exception:
+                pass
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            self._drain()
+
+    def flush(self, timeout: float = 2.0) -> None:
+        """Wait (up to ``timeout`` seconds) until buffered records are written."""
+        deadline = time.monotonic() + timeout
+        while self._buffer and self._thread is not None and self._thread.is_alive() and time.monotonic() < deadline:
+            self._wake.set()
+            time.sleep(0.005)
+        if self._buffer:
+            self._drain()
+
+
+log = Logger()
+atexit.register(log.flush)
+
+
+def _collect_log_metrics() -> List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]:
+    return [
+        ("sso_log_records_total", "counter", "Log records by outcome.", [
+            ({"outcome": "emitted"}, log.emitted),
+            ({"outcome": "dropped"}, log.dropped),
+            ({"outcome": "sampled_out"}, log.sampled_out),
+        ]),
+        ("sso_log_buffered", "gauge", "Records waiting for the log writer thread.", [({}, len(log._buffer))]),
+    ]
+
+
+REGISTRY.register_collector(_collect_log_metrics)
@@ -0,0 +1,207 @@
+import asyncio
+import random
+import secrets
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs
+
+import httpx
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from jose import jwt
+
+from .cache import TTLCache
+from .config import LogoutFanoutConfig
+from .log import log
+from .metrics import LOGOUT_DELIVERIES, LOGOUT_DELIVERY_SECONDS
+from .oidc import BACKCHANNEL_LOGOUT_EVENT, OIDCClient
+from .registry import AppRegistry, RelyingParty
+from .session import BaseSessionManager
+
+
+# app name, sub, sid, attempt, monotonic time of the logout
+_Delivery = Tuple[str, Optional[str], Optional[str], int, float]
+
+
+def issue_logout_token(rp: RelyingParty, sub: Optional[str], sid: Optional[str], ttl: int = 120) -> str:
+    """Logout token for ``rp``, HS256-signed with its client secret (shared by the IdP, the portal and the app)."""
+    now = int(time.time())
+    claims: Dict[str, Any] = {
+        "iss": rp.oidc.issuer,
+        "aud": rp.spec.config.client_id,
+        "iat": now,
+        "exp": now + ttl,
+        "jti": secrets.token_urlsafe(16),
+        "events": {BACKCHANNEL_LOGOUT_EVENT: {}},
+    }
+    if sub:
+        claims["sub"] = sub
+    if sid:
+        claims["sid"] = sid
+    return jwt.encode(claims, rp.spec.config.client_secret, algorithm="HS256")
+
+
+async def _form_field(request: Request, name: str) -> Optional[str]:
+    # application/x-www-form-urlencoded, parsed here to avoid requiring python-multipart
+    values = parse_qs((await request.body()).decode("utf-8", "replace")).get(name)
+    return values[0] if values else None
+
+
+async def handle_backchannel_logout(request: Request, oidc: OIDCClient, session: BaseSessionManager, seen: TTLCache[bool]) -> Tuple[Response, Optional[Dict[str, Any]]]:
+    """Validate the request's ``logout_token`` and revoke the sessions it names.
+
+    A token with a ``sid`` revokes the sessions of that IdP session only; a
+    token with just a ``sub`` revokes every session of the user.
+
+    Returns the response for the IdP/portal (200, or 400 with an OAuth error)
+    and the accepted claims. ``seen`` remembers token IDs so a replayed token
+    is rejected.
+    """
+    logout_token = await _form_field(request, "logout_token")
+    headers = {"Cache-Control": "no-store"}
+    if not logout_token:
+        return JSONResponse({"error": "invalid_request", "error_description": "missing logout_token"}, 400, headers), None
+    try:
+        claims = await oidc.verify_logout_token(logout_token)
+    except ValueError as e:
+        log.warning("backchannel_logout_rejected", "后端通道注销令牌无效", error=str(e))
+        return JSONResponse({"error": "invalid_request", "error_description": str(e)}, 400, headers), None
+    jti = f"{claims.get('iss')}:{claims['jti']}"
+    if seen.get(jti) is not None:
+        return JSONResponse({"error": "invalid_request", "error_description": "logout token already used"}, 400, headers), None
+    seen.set(jti, True, float(claims.get("exp") or claims["iat"] + 600))
+    if claims.get("sid"):
+        # Only the sessions of that IdP session; the user's other logins stay valid
+        session.revoke_idp_session(claims["sid"])
+    else:
+        session.revoke_user(claims.get("sub"))
+    return Response(status_code=200, headers=headers), claims
+
+
+class LogoutFanout:
+    """Delivers back-channel logout notifications to every registered app.
+
+    ``notify`` only enqueues one delivery per app; ``concurrency`` workers
+    POST a freshly issued logout token to each app's back-channel logout URL
+    over one pooled client. Network errors, 5xx and 429 are retried with
+    jittered exponential backoff; deliveries beyond ``queue_size`` are dropped.
+    Outcomes are exported as ``sso_logout_deliveries_total``.
+    """
+
+    def __init__(self, registry: AppRegistry, cfg: LogoutFanoutConfig) -> None:
+        self.registry = registry
+        self.cfg = cfg
+        self.http: Optional[httpx.AsyncClient] = None
+        self._queue: Optional["asyncio.Queue[_Delivery]"] = None
+        self._workers: List["asyncio.Task[None]"] = []
+        self._timers: Set[asyncio.TimerHandle] = set()
+        self._pending = 0
+        self._idle: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(self.cfg.queue_size)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        limits = httpx.Limits(max_connections=self.cfg.concurrency, max_keepalive_connections=self.cfg.concurrency)
+        self.http = httpx.AsyncClient(timeout=self.cfg.timeout, limits=limits)
+        self._workers = [asyncio.ensure_future(self._work()) for _ in range(self.cfg.concurrency)]
+
+    def notify(self, sub: Optional[str] = None, sid: Optional[str] = None) -> int:
+        """Queue a logout of ``sub`` / ``sid`` for every registered app; returns how many were queued."""
+        if self._queue is None or not (sub or sid):
+            return 0
+        queued = 0
+        started = time.monotonic()
+        for rp in self.registry:
+            try:
+                self._queue.put_nowait((rp.name, sub, sid, 0, started))
+            except asyncio.QueueFull:
+                LOGOUT_DELIVERIES.inc(rp.name, "dropped")
+                continue
+            self._pending += 1
+            queued += 1
+        if queued:
+            self._idle.clear()
+        if queued < len(self.registry):
+            log.warning("logout_fanout_dropped", "注销通知队列已满，部分应用未通知", dropped=len(self.registry) - queued)
+        return queued
+
+    async def drain(self) -> None:
+        """Wait until every queued delivery has been delivered or given up."""
+        if self._idle is not None:
+            await self._idle.wait()
+
+    def _finish(self) -> None:
+        self._pending -= 1
+        if self._pending <= 0:
+            self._pending = 0
+            self._idle.set()
+
+    async def _work(self) -> None:
+        while True:
+            delivery = await self._queue.get()
+            try:
+                await self._deliver(delivery)
+            except Exception as e:
+                log.error("logout_delivery_crashed", "注销通知发送异常", app=delivery[0], error=str(e))
+                self._finish()
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, delivery: _Delivery) -> None:
+        name, sub, sid, attempt, started = delivery
+        rp = self.registry.get(name)
+        if rp is None:
+            # Removed by a config reload while queued
+            self._finish()
+            return
+        token = issue_logout_token(rp, sub, sid, self.cfg.token_ttl)
+        try:
+            resp = await self.http.post(rp.backchannel_logout_url, data={"logout_token": token})
+            status = resp.status_code
+        except httpx.HTTPError as e:
+            status, error = 0, str(e) or type(e).__name__
+        else:
+            error = f"HTTP {status}"
+        if 200 <= status < 300:
+            LOGOUT_DELIVERIES.inc(name, "delivered")
+            LOGOUT_DELIVERY_SECONDS.observe(time.monotonic() - started, name)
+            self._finish()
+            return
+        if (status == 0 or status == 429 or status >= 500) and attempt < self.cfg.retries:
+            LOGOUT_DELIVERIES.inc(name, "retried")
+            delay = min(self.cfg.backoff * 2 ** attempt, self.cfg.backoff_max) * random.uniform(0.5, 1.0)
+            self._schedule(delay, (name, sub, sid, attempt + 1, started))
+            return
+        LOGOUT_DELIVERIES.inc(name, "failed")
+        log.warning("logout_delivery_failed", "注销通知发送失败", app=name, attempts=attempt + 1, error=error)
+        self._finish()
+
+    def _schedule(self, delay: float, delivery: _Delivery) -> None:
+        def requeue() -> None:
+            self._timers.discard(handle)
+            try:
+                self._queue.put_nowait(delivery)
+            except asyncio.QueueFull:
+                LOGOUT_DELIVERIES.inc(delivery[0], "dropped")
+                self._finish()
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._timers.add(handle)
+
+    async def aclose(self) -> None:
+        for handle in list(self._timers):
+            handle.cancel()
+        self._timers.clear()
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+        self._queue = None
+        if self._idle is not None:
+            self._idle.set()
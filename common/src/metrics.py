@@ -0,0 +1,212 @@
+"""Minimal Prometheus metrics (text exposition format 0.0.4).
+
+Recording is lock-free: every service runs its handlers on a single event
+loop thread, so counters are plain dict/list updates with no locking on the
+hot path. Values derived from other objects (cache counters, breaker state)
+are read at scrape time through collectors.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# A collector yields (name, type, help, [(labels, value), ...]) at scrape time
+Sample = Tuple[Dict[str, str], float]
+Family = Tuple[str, str, str, List[Sample]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str, errors: Optional[Counter] = None) -> Iterator[None]:
+        """Observe the duration of the block; count it in ``errors`` if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            if errors is not None:
+                errors.inc(*labels)
+            raise
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {int(cumulative)}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {int(cumulative)}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], List[Family]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], List[Family]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        families: Dict[str, Family] = {}
+        for collector in self._collectors:
+            for name, kind, help, samples in collector():
+                # Several collectors may contribute samples to one family
+                if name in families:
+                    families[name][3].extend(samples)
+                else:
+                    families[name] = (name, kind, help, list(samples))
+        for name, kind, help, samples in families.values():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in _merge(samples):
+                lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(samples: List[Sample]) -> List[Sample]:
+    # Series with identical labels (e.g. two clients of one app in a process) are summed
+    merged: Dict[Tuple[Tuple[str, str], ...], float] = {}
+    for labels, value in samples:
+        key = tuple(labels.items())
+        merged[key] = merged.get(key, 0) + value
+    return [(dict(key), value) for key, value in merged.items()]
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "sso_http_request_duration_seconds", "Request latency by route.", ("service", "method", "route", "status")
+)
+IDP_CALL_SECONDS = REGISTRY.histogram(
+    "sso_idp_call_duration_seconds", "Latency of upstream IdP operations.", ("client", "operation")
+)
+IDP_CALL_ERRORS = REGISTRY.counter(
+    "sso_idp_call_errors_total", "Failed upstream IdP operations.", ("client", "operation")
+)
+IDP_CALL_RETRIES = REGISTRY.counter(
+    "sso_idp_call_retries_total", "Retried upstream IdP requests.", ("client", "operation")
+)
+LOGOUT_DELIVERIES = REGISTRY.counter(
+    "sso_logout_deliveries_total", "Back-channel logout notifications by app and result.", ("app", "result")
+)
+LOGOUT_DELIVERY_SECONDS = REGISTRY.histogram(
+    "sso_logout_delivery_seconds", "Time from logout to delivery at the app, retries included.", ("app",)
+)
+HANDOFF_TICKETS = REGISTRY.counter(
+    "sso_handoff_tickets_total", "Hand-off tickets issued by the portal and redeemed by apps, by result.", ("app", "result")
+)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency into HTTP_REQUEST_SECONDS."""
+
+    def __init__(self, app: ASGIApp, service: str) -> None:
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Label by route template (not the raw path) to keep cardinality bounded
+            path = scope.get("root_path", "") + route.path if route is not None else "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, self.service, scope["method"], path, str(status[0]))
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def install_metrics(app: Any, service: str) -> None:
+    """Add the latency middleware and a ``/metrics`` route to a FastAPI app."""
+    app.add_middleware(MetricsMiddleware, service=service)
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
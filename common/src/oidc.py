@@ -1,69 +1,305 @@
+import asyncio
 import time
-import json
+import weakref
 import httpx
-from typing import Dict, Any, Optional
-from urllib.parse import urlencode
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import quote_plus, urlencode
 
 from jose import jwt
 
+from .cache import TTLCache, token_digest, token_expiry
+from .config import BaseAppConfig, ClaimsMemoConfig, HttpPoolConfig, ResilienceConfig, SharedCacheConfig, SnapshotConfig, UserinfoCacheConfig
+from .jwks import JWKSKeyStore
+from .log import log
+from .metrics import IDP_CALL_ERRORS, IDP_CALL_SECONDS, REGISTRY
+from .resilience import CircuitOpenError, IdPCaller
+from .shared_cache import SharedCache, open_shared_cache
+from .snapshot import DiscoverySnapshot
+
+
+ALGORITHMS = ["RS256", "RS512", "ES256", "ES384"]
+TOKEN_EXCHANGE_GRANT = "urn:ietf:params:oauth:grant-type:token-exchange"
+ACCESS_TOKEN_TYPE = "urn:ietf:params:oauth:token-type:access_token"
+BACKCHANNEL_LOGOUT_EVENT = "http://schemas.openid.net/event/backchannel-logout"
+_AUTHORIZE_STATIC_PARAMS = frozenset({"client_id", "response_type", "scope", "redirect_uri", "state"})
+
+
+class NotAJWTError(ValueError):
+    """The token is not a JWT (e.g. an opaque access token), so it cannot be checked locally."""
+
+
+def build_http_client(pool: Optional[HttpPoolConfig] = None) -> httpx.AsyncClient:
+    pool = pool or HttpPoolConfig()
+    http2 = pool.http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            # httpx needs the optional "h2" package for HTTP/2; stay on HTTP/1.1 keep-alive
+            http2 = False
+    limits = httpx.Limits(
+        max_connections=pool.max_connections,
+        max_keepalive_connections=pool.max_keepalive_connections,
+        keepalive_expiry=pool.keepalive_expiry,
+    )
+    return httpx.AsyncClient(timeout=pool.timeout, limits=limits, http2=http2)
+
+
+def user_from_claims(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Lightweight user dict kept in sessions, from userinfo or token claims."""
+    return {
+        "username": info.get("username") or info.get("preferred_username"),
+        "name": info.get("name"),
+        "email": info.get("email"),
+        "sub": info.get("sub"),
+    }
+
+
+async def _request(caller: IdPCaller, http: Optional[httpx.AsyncClient], method: str, url: str, operation: str, **kwargs: Any) -> httpx.Response:
+    with IDP_CALL_SECONDS.time(caller.name, operation, errors=IDP_CALL_ERRORS):
+        return await caller.request(http, method, url, operation, **kwargs)
+
 
 class OIDCDiscovery:
-    def __init__(self, issuer: str) -> None:
+    def __init__(self, issuer: str, http: Optional[httpx.AsyncClient] = None, snapshot: Optional[DiscoverySnapshot] = None, caller: Optional[IdPCaller] = None, shared: Optional[SharedCache] = None) -> None:
         self.issuer = issuer.rstrip("/")
+        self.http = http
+        self.snapshot = snapshot
+        self.caller = caller or IdPCaller(self.issuer)
+        # Cross-worker tier: one worker fetches discovery/JWKS, the others read it
+        self.shared = shared
+        self._jwks_version = 0
         self._cache: Optional[Dict[str, Any]] = None
-        self._jwks_cache: Optional[Dict[str, Any]] = None
-        self._jwks_cache_ts: float = 0.0
+        self.hits = 0
+        self.misses = 0
+        # Bumped whenever the discovery document changes; derived values key on it
+        self.config_version = 0
+        self._revalidate_task: Optional["asyncio.Task[None]"] = None
+        # Cache JWKS for 5 minutes, refetch early on an unknown kid
+        self.keys = JWKSKeyStore(self.fetch_jwks, ttl=300, min_refresh_interval=30)
+
+    async def _fetch_config(self) -> Dict[str, Any]:
+        url = f"{self.issuer}/.well-known/openid-configuration"
+        resp = await _request(self.caller, self.http, "GET", url, "discovery")
+        return resp.json()
 
     async def get_config(self) -> Dict[str, Any]:
         if self._cache is not None:
+            self.hits += 1
             return self._cache
-        url = f"{self.issuer}/.well-known/openid-configuration"
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            self._cache = resp.json()
+        self.misses += 1
+        try:
+            if self.shared is not None:
+                _, conf = await self.shared.load(f"discovery:{self.issuer}", self._fetch_config, time.time() + 86400)
+            else:
+                conf = await self._fetch_config()
+        except Exception as e:
+            # Not cached yet and the IdP is failing: every caller falls back to Casdoor's
+            # default endpoints, so e.g. /login can still redirect. Nothing is cached.
+            log.warning("discovery_failed", "获取 OIDC 发现文档失败，使用默认端点", issuer=self.issuer, error=str(e))
+            return {}
+        self._set_config(conf)
+        if self.keys.jwks is not None:
+            await self._persist(self._cache, self.keys.jwks)
         return self._cache
 
-    async def get_jwks(self) -> Dict[str, Any]:
-        # Cache JWKS for 5 minutes
-        if self._jwks_cache and (time.time() - self._jwks_cache_ts) < 300:
-            return self._jwks_cache
+    @property
+    def config(self) -> Optional[Dict[str, Any]]:
+        """The cached discovery document, without fetching it."""
+        return self._cache
+
+    def adopt(self, other: "OIDCDiscovery") -> None:
+        """Start from the discovery document and keys of ``other`` (same issuer) instead of cold."""
+        if other._cache is not None:
+            self._set_config(other._cache)
+        self._jwks_version = other._jwks_version
+        self.keys.adopt(other.keys)
+
+    def _set_config(self, conf: Dict[str, Any]) -> None:
+        if conf != self._cache:
+            self._cache = conf
+            self.config_version += 1
+
+    async def _fetch_jwks(self) -> Dict[str, Any]:
         conf = await self.get_config()
         jwks_uri = conf.get("jwks_uri")
         if not jwks_uri:
             # Fallback for Casdoor
             jwks_uri = f"{self.issuer}/.well-known/jwks"
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get(jwks_uri)
-            resp.raise_for_status()
-            self._jwks_cache = resp.json()
-            self._jwks_cache_ts = time.time()
-        return self._jwks_cache
+        resp = await _request(self.caller, self.http, "GET", jwks_uri, "jwks")
+        jwks = resp.json()
+        # jose expects jwks as dict with 'keys'
+        return jwks if "keys" in jwks else {"keys": jwks}
+
+    async def fetch_jwks(self) -> Dict[str, Any]:
+        if self.shared is not None:
+            # A version newer than the one this worker holds was fetched by another
+            # worker (TTL refresh or unknown kid): take it instead of asking the IdP
+            self._jwks_version, jwks = await self.shared.load(
+                f"jwks:{self.issuer}", self._fetch_jwks, time.time() + self.keys.ttl, newer_than=self._jwks_version
+            )
+        else:
+            jwks = await self._fetch_jwks()
+        if self._cache is not None:
+            # Never snapshot the empty fallback used while discovery is failing
+            await self._persist(self._cache, jwks)
+        return jwks
+
+    async def get_jwks(self) -> Dict[str, Any]:
+        return await self.keys.get_jwks()
+
+    async def _persist(self, conf: Dict[str, Any], jwks: Dict[str, Any]) -> None:
+        if self.snapshot is None:
+            return
+        try:
+            # Off the event loop: includes an fsync
+            await asyncio.get_running_loop().run_in_executor(None, self.snapshot.save, conf, jwks)
+        except OSError:
+            pass
+
+    def load_snapshot(self) -> bool:
+        """Serve discovery and JWKS from the on-disk snapshot until revalidated."""
+        data = self.snapshot.load() if self.snapshot is not None else None
+        if data is None:
+            return False
+        self._set_config(data["discovery"])
+        self.keys.prime(data["jwks"])
+        return True
+
+    async def _revalidate(self) -> None:
+        try:
+            self._set_config(await self._fetch_config())
+            # fetch_jwks writes the snapshot back if either document changed
+            await self.keys.refresh()
+        except Exception:
+            # Keep serving the snapshot; the JWKS TTL schedules the next attempt
+            pass
+
+    def revalidate_in_background(self) -> None:
+        if self._revalidate_task is None or self._revalidate_task.done():
+            self._revalidate_task = asyncio.ensure_future(self._revalidate())
+
+    async def aclose(self) -> None:
+        task, self._revalidate_task = self._revalidate_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
 
 
 class OIDCClient:
-    def __init__(self, issuer: str, client_id: str, client_secret: str, redirect_uri: str, organization_name: str = "built-in", application_name: str = "") -> None:
+    def __init__(self, issuer: str, client_id: str, client_secret: str, redirect_uri: str, organization_name: str = "built-in", application_name: str = "", pool: Optional[HttpPoolConfig] = None, userinfo_cache: Optional[UserinfoCacheConfig] = None, snapshot: Optional[SnapshotConfig] = None, claims_memo: Optional[ClaimsMemoConfig] = None, resilience: Optional[ResilienceConfig] = None, shared_cache: Optional[SharedCacheConfig] = None) -> None:
         self.issuer = issuer.rstrip("/")
         self.client_id = client_id
         self.client_secret = client_secret
         self.redirect_uri = redirect_uri
         self.organization_name = organization_name
         self.application_name = application_name
-        self.discovery = OIDCDiscovery(self.issuer)
+        self.pool = pool
+        self.http: Optional[httpx.AsyncClient] = None
+        self.metrics_name = application_name or client_id
+        # Timeouts, retries and the circuit breaker, shared with discovery
+        self.caller = IdPCaller(self.metrics_name, resilience)
+        disk_snapshot = None
+        if snapshot is not None and snapshot.directory:
+            disk_snapshot = DiscoverySnapshot(snapshot.directory, self.issuer, snapshot.secret)
+        self.discovery = OIDCDiscovery(self.issuer, snapshot=disk_snapshot, caller=self.caller, shared=open_shared_cache(shared_cache))
+        # Static "endpoint?client_id=..&redirect_uri=..&state=" per (scope, redirect_uri)
+        self._authorize_prefixes: Dict[Tuple[str, str], str] = {}
+        self._authorize_version = -1
+        self.userinfo_cache_config = userinfo_cache or UserinfoCacheConfig()
+        self.userinfo_cache: Optional[TTLCache[Dict[str, Any]]] = None
+        if self.userinfo_cache_config.max_entries > 0:
+            self.userinfo_cache = TTLCache(self.userinfo_cache_config.max_entries)
+        # Claims of tokens that already passed signature verification, until their exp
+        self.claims_memo: Optional[TTLCache[Dict[str, Any]]] = None
+        memo_config = claims_memo or ClaimsMemoConfig()
+        if memo_config.max_entries > 0:
+            self.claims_memo = TTLCache(memo_config.max_entries)
+            # A rotated or withdrawn key must not keep vouching for old tokens
+            self.discovery.keys.on_change(self.claims_memo.clear)
+        _clients.add(self)
 
-    async def build_authorize_url(self, state: str, scope: str = "openid profile email", redirect_uri: Optional[str] = None, extra_params: Optional[Dict[str, Any]] = None) -> str:
-        conf = await self.discovery.get_config()
-        auth_endpoint = conf.get("authorization_endpoint") or f"{self.issuer}/login/oauth/authorize"
-        params = {
-            "client_id": self.client_id,
-            "response_type": "code",
-            "scope": scope,
-            "redirect_uri": redirect_uri or self.redirect_uri,
-            "state": state,
-        }
-        if extra_params:
+    @classmethod
+    def from_config(cls, cfg: BaseAppConfig, **options: Any) -> "OIDCClient":
+        return cls(cfg.issuer, cfg.client_id, cfg.client_secret, cfg.redirect_uri, cfg.organization_name, cfg.application_name, **options)
+
+    def adopt(self, previous: "OIDCClient") -> None:
+        """Carry the warm caches of the client this one replaces (config reload) over.
+
+        Discovery and JWKS only depend on the issuer; userinfo and verified claims
+        also on the client_id, so they are kept only when it is unchanged.
+        """
+        if previous.issuer == self.issuer:
+            self.discovery.adopt(previous.discovery)
+        if previous.client_id != self.client_id:
+            return
+        if self.userinfo_cache is not None and previous.userinfo_cache is not None:
+            previous.userinfo_cache.max_entries = self.userinfo_cache.max_entries
+            self.userinfo_cache = previous.userinfo_cache
+        if self.claims_memo is not None and previous.claims_memo is not None:
+            previous.claims_memo.max_entries = self.claims_memo.max_entries
+            self.claims_memo = previous.claims_memo
+            self.discovery.keys.on_change(self.claims_memo.clear)
+
+    async def open(self) -> None:
+        """Open the pooled HTTP client shared by this client and its discovery."""
+        if self.http is None:
+            self.http = build_http_client(self.pool)
+            self.discovery.http = self.http
+            # Cold start: answer from the snapshot at once, refresh it from the IdP behind the scenes
+            if self.discovery.load_snapshot():
+                self.discovery.revalidate_in_background()
+
+    async def aclose(self) -> None:
+        await self.discovery.aclose()
+        http, self.http = self.http, None
+        self.discovery.http = None
+        if http is not None:
+            await http.aclose()
+
+    def _authorize_prefix(self, conf: Dict[str, Any], scope: str, redirect_uri: str) -> str:
+        if self._authorize_version != self.discovery.config_version:
+            self._authorize_prefixes.clear()
+            self._authorize_version = self.discovery.config_version
+        key = (scope, redirect_uri)
+        prefix = self._authorize_prefixes.get(key)
+        if prefix is None:
+            auth_endpoint = conf.get("authorization_endpoint") or f"{self.issuer}/login/oauth/authorize"
+            params = {
+                "client_id": self.client_id,
+                "response_type": "code",
+                "scope": scope,
+                "redirect_uri": redirect_uri,
+            }
+            prefix = f"{auth_endpoint}?{urlencode(params)}&state="
+            # redirect_uri follows the request host; keep a hostile Host header from growing this
+            if len(self._authorize_prefixes) >= 64:
+                self._authorize_prefixes.clear()
+            self._authorize_prefixes[key] = prefix
+        return prefix
+
+    def authorize_url(self, conf: Dict[str, Any], state: str, scope: str = "openid profile email", redirect_uri: Optional[str] = None, extra_params: Optional[Dict[str, Any]] = None) -> str:
+        redirect_uri = redirect_uri or self.redirect_uri
+        if extra_params and not _AUTHORIZE_STATIC_PARAMS.isdisjoint(extra_params):
+            # Overrides a precomputed parameter: encode the whole query the slow way
+            params = {"client_id": self.client_id, "response_type": "code", "scope": scope, "redirect_uri": redirect_uri, "state": state}
             params.update(extra_params)
-        return f"{auth_endpoint}?{urlencode(params)}"
+            auth_endpoint = conf.get("authorization_endpoint") or f"{self.issuer}/login/oauth/authorize"
+            return f"{auth_endpoint}?{urlencode(params)}"
+        url = self._authorize_prefix(conf, scope, redirect_uri) + quote_plus(state)
+        if extra_params:
+            url = f"{url}&{urlencode(extra_params)}"
+        return url
+
+    async def build_authorize_url(self, state: str, scope: str = "openid profile email", redirect_uri: Optional[str] = None, extra_params: Optional[Dict[str, Any]] = None) -> str:
+        conf = self.discovery.config
+        if conf is None:
+            conf = await self.discovery.get_config()
+        # With discovery cached this never suspends: no event-loop hop per /login
+        return self.authorize_url(conf, state, scope, redirect_uri, extra_params)
 
     async def exchange_code(self, code: str, redirect_uri: Optional[str] = None) -> Dict[str, Any]:
         conf = await self.discovery.get_config()
@@ -75,38 +311,215 @@ class OIDCClient:
             "client_id": self.client_id,
             "client_secret": self.client_secret,
         }
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.post(token_endpoint, data=data, headers={"Accept": "application/json"})
-            resp.raise_for_status()
-            token = resp.json()
+        resp = await _request(self.caller, self.http, "POST", token_endpoint, "exchange_code", data=data, headers={"Accept": "application/json"})
+        token = resp.json()
         # Normalize token fields
         token.setdefault("token_type", token.get("token_type", "Bearer"))
         return token
 
-    async def verify_id_token(self, id_token: str) -> Dict[str, Any]:
+    async def refresh_token(self, refresh_token: str) -> Dict[str, Any]:
+        """Redeem a refresh token (``refresh_token`` grant) for a new token set."""
         conf = await self.discovery.get_config()
-        jwks = await self.discovery.get_jwks()
-        # jose expects jwks as dict with 'keys'
-        keys = jwks if "keys" in jwks else {"keys": jwks}
+        token_endpoint = conf.get("token_endpoint") or f"{self.issuer}/api/login/oauth/access_token"
+        data = {
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+        }
+        resp = await _request(self.caller, self.http, "POST", token_endpoint, "refresh_token", data=data, headers={"Accept": "application/json"})
+        token = resp.json()
+        if "error" in token or not token.get("access_token"):
+            # Casdoor answers 200 with an error body for a rejected refresh token
+            raise ValueError(f"Token refresh failed: {token.get('error_description') or token.get('error') or 'no access_token'}")
+        token.setdefault("token_type", "Bearer")
+        return token
+
+    async def exchange_token(self, subject_token: str, audience: str) -> Dict[str, Any]:
+        """Trade this client's access token for one issued to ``audience`` (RFC 8693)."""
+        conf = await self.discovery.get_config()
+        token_endpoint = conf.get("token_endpoint") or f"{self.issuer}/api/login/oauth/access_token"
+        data = {
+            "grant_type": TOKEN_EXCHANGE_GRANT,
+            "subject_token": subject_token,
+            "subject_token_type": ACCESS_TOKEN_TYPE,
+            "requested_token_type": ACCESS_TOKEN_TYPE,
+            "audience": audience,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+        }
+        resp = await _request(self.caller, self.http, "POST", token_endpoint, "token_exchange", data=data, headers={"Accept": "application/json"})
+        token = resp.json()
+        if "error" in token or not token.get("access_token"):
+            raise ValueError(f"Token exchange failed: {token.get('error_description') or token.get('error') or 'no access_token'}")
+        return token
+
+    async def _verify_jwt(self, token: str, audiences: List[str], kind: str) -> Dict[str, Any]:
+        memo_key = (token_digest(token), tuple(sorted(audiences)))
+        if self.claims_memo is not None:
+            memoized = self.claims_memo.get(memo_key)
+            if memoized is not None:
+                return dict(memoized)
+        claims = await self._verify_jwt_signature(token, audiences, kind)
+        exp = claims.get("exp")
+        if self.claims_memo is not None and isinstance(exp, (int, float)):
+            self.claims_memo.set(memo_key, dict(claims), float(exp))
+        return claims
+
+    async def _verify_jwt_signature(self, token: str, audiences: List[str], kind: str) -> Dict[str, Any]:
+        conf = await self.discovery.get_config()
+        try:
+            header = jwt.get_unverified_header(token)
+        except Exception as exc:
+            raise NotAJWTError(f"Invalid {kind}: {exc}")
+        alg = header.get("alg")
+        if alg not in ALGORITHMS:
+            raise ValueError(f"Invalid {kind}: unsupported algorithm {alg}")
+        try:
+            keys = await self.discovery.keys.get_keys(header.get("kid"), alg)
+        except KeyError as exc:
+            raise ValueError(f"Invalid {kind}: {exc}")
         try:
             claims = jwt.decode(
-                id_token,
+                token,
                 keys,
-                algorithms=[alg for alg in ["RS256", "RS512", "ES256", "ES384"]],
-                audience=self.client_id,
+                algorithms=ALGORITHMS,
+                # jose only accepts a single audience; checked below against the allowed set
                 issuer=conf.get("issuer", self.issuer),
-                options={"verify_at_hash": False},
+                options={"verify_aud": False, "verify_at_hash": False},
             )
-            return claims
         except Exception as exc:
-            raise ValueError(f"Invalid ID token: {exc}")
+            raise ValueError(f"Invalid {kind}: {exc}")
+        aud = claims.get("aud")
+        token_audiences = [aud] if isinstance(aud, str) else list(aud or [])
+        if not set(token_audiences) & set(audiences):
+            raise ValueError(f"Invalid {kind}: Invalid audience")
+        return claims
+
+    async def verify_id_token(self, id_token: str) -> Dict[str, Any]:
+        with IDP_CALL_SECONDS.time(self.metrics_name, "verify_id_token", errors=IDP_CALL_ERRORS):
+            return await self._verify_jwt(id_token, [self.client_id], "ID token")
+
+    async def verify_logout_token(self, logout_token: str) -> Dict[str, Any]:
+        """Validate a back-channel logout token (OpenID Connect Back-Channel Logout 1.0, 2.6).
+
+        Accepts tokens signed by the IdP (JWKS) and HS256 tokens keyed with this
+        client's secret, which the portal issues when relaying a logout to apps.
+        """
+        try:
+            header = jwt.get_unverified_header(logout_token)
+        except Exception as exc:
+            raise ValueError(f"Invalid logout token: {exc}")
+        if header.get("alg") == "HS256":
+            try:
+                claims = jwt.decode(logout_token, self.client_secret, algorithms=["HS256"], audience=self.client_id, issuer=self.issuer)
+            except Exception as exc:
+                raise ValueError(f"Invalid logout token: {exc}")
+        else:
+            # Not memoized: each logout token is accepted once
+            claims = await self._verify_jwt_signature(logout_token, [self.client_id], "logout token")
+        events = claims.get("events")
+        if not isinstance(events, dict) or BACKCHANNEL_LOGOUT_EVENT not in events:
+            raise ValueError("Invalid logout token: missing back-channel logout event")
+        if "nonce" in claims:
+            raise ValueError("Invalid logout token: nonce is not allowed")
+        if not claims.get("sub") and not claims.get("sid"):
+            raise ValueError("Invalid logout token: neither sub nor sid")
+        if not claims.get("jti") or not isinstance(claims.get("iat"), (int, float)):
+            raise ValueError("Invalid logout token: missing jti or iat")
+        return claims
+
+    async def verify_access_token(self, access_token: str, audiences: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Validate a JWT access token locally (signature, aud, iss, exp) without calling Casdoor."""
+        return await self._verify_jwt(access_token, audiences or [self.client_id], "access token")
+
+    async def resolve_access_token(self, access_token: str, audiences: Optional[List[str]] = None, local: bool = True, userinfo_fallback: bool = True) -> Dict[str, Any]:
+        """Claims for an access token: local JWT validation first, userinfo as fallback.
+
+        Only opaque tokens and an unreachable JWKS fall back to userinfo; a JWT
+        with a bad signature, another audience or an expired ``exp`` is rejected.
+        """
+        if local:
+            try:
+                return await self.verify_access_token(access_token, audiences)
+            except (NotAJWTError, httpx.HTTPError, CircuitOpenError):
+                # Cannot be checked locally: userinfo can still answer
+                if not userinfo_fallback:
+                    raise
+        return await self.fetch_userinfo(access_token)
 
     async def fetch_userinfo(self, access_token: str) -> Dict[str, Any]:
+        if self.userinfo_cache is None:
+            return await self._fetch_userinfo(access_token)
+        expires_at = token_expiry(access_token, self.userinfo_cache_config.default_ttl)
+        return await self.userinfo_cache.get_or_load(
+            token_digest(access_token),
+            lambda: self._load_userinfo(access_token, expires_at),
+            expires_at,
+        )
+
+    async def _load_userinfo(self, access_token: str, expires_at: float) -> Dict[str, Any]:
+        shared = self.discovery.shared
+        if shared is None:
+            return await self._fetch_userinfo(access_token)
+        key = f"userinfo:{self.client_id}:{token_digest(access_token).hex()}"
+        _, info = await shared.load(key, lambda: self._fetch_userinfo(access_token), expires_at)
+        return info
+
+    async def _fetch_userinfo(self, access_token: str) -> Dict[str, Any]:
         conf = await self.discovery.get_config()
         userinfo_endpoint = conf.get("userinfo_endpoint") or f"{self.issuer}/api/userinfo"
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get(userinfo_endpoint, headers={"Authorization": f"Bearer {access_token}"})
-            resp.raise_for_status()
-            return resp.json()
+        resp = await _request(self.caller, self.http, "GET", userinfo_endpoint, "fetch_userinfo", headers={"Authorization": f"Bearer {access_token}"})
+        return resp.json()
+
+
+# Every live client, read at scrape time for cache hit/miss counters
+_clients: "weakref.WeakSet[OIDCClient]" = weakref.WeakSet()
+
+
+def _collect_cache_metrics() -> List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]:
+    requests: List[Tuple[Dict[str, str], float]] = []
+    entries: List[Tuple[Dict[str, str], float]] = []
+    evictions: List[Tuple[Dict[str, str], float]] = []
+    for client in list(_clients):
+        name = client.metrics_name
+        discovery, keys = client.discovery, client.discovery.keys
+        counts = [
+            ("discovery", "hit", discovery.hits),
+            ("discovery", "miss", discovery.misses),
+            ("jwks", "hit", keys.hits),
+            ("jwks", "stale", keys.stale_hits),
+            ("jwks", "miss", keys.misses),
+        ]
+        for cache_name, cache in (("userinfo", client.userinfo_cache), ("claims", client.claims_memo)):
+            if cache is None:
+                continue
+            stats = cache.stats()
+            counts.append((cache_name, "hit", stats["hits"]))
+            counts.append((cache_name, "miss", stats["misses"]))
+            entries.append(({"client": name, "cache": cache_name}, stats["entries"]))
+            evictions.append(({"client": name, "cache": cache_name}, stats["evictions"]))
+        for cache_name, result, value in counts:
+            requests.append(({"client": name, "cache": cache_name, "result": result}, value))
+    return [
+        ("sso_cache_requests_total", "counter", "Cache lookups by result.", requests),
+        ("sso_cache_entries", "gauge", "Entries currently cached.", entries),
+        ("sso_cache_evictions_total", "counter", "Entries evicted to stay within the cache bounds.", evictions),
+    ]
+
+
+def _collect_breaker_metrics() -> List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]:
+    states: List[Tuple[Dict[str, str], float]] = []
+    opens: List[Tuple[Dict[str, str], float]] = []
+    for client in list(_clients):
+        breaker = client.caller.breaker
+        states.append(({"client": client.metrics_name}, breaker.state))
+        opens.append(({"client": client.metrics_name}, breaker.opens))
+    return [
+        ("sso_idp_circuit_state", "gauge", "IdP circuit breaker state (0 closed, 1 half-open, 2 open).", states),
+        ("sso_idp_circuit_opens_total", "counter", "Times the IdP circuit breaker opened.", opens),
+    ]
 
 
+REGISTRY.register_collector(_collect_cache_metrics)
+REGISTRY.register_collector(_collect_breaker_metrics)
@@ -0,0 +1,74 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from .cache import TTLCache
+from .config import PrewarmConfig
+from .log import log
+from .oidc import OIDCClient
+from .registry import AppRegistry, RelyingParty
+from .renewal import session_tokens
+
+
+# Do not hand off a pre-warmed token this close to its expiry
+_EXPIRY_MARGIN = 30
+
+
+class AppTokenPrewarmer:
+    """App-scoped access tokens minted for every registered app right after portal login.
+
+    Tokens are obtained with token exchange (the portal's access token as subject,
+    the app's client_id as audience), at most ``concurrency`` at a time per login,
+    in the background so the callback does not wait for them. They are kept in
+    process keyed by a login id stored in the session; a miss (other worker,
+    eviction, exchange unsupported) simply falls back to the portal's own token.
+    """
+
+    def __init__(self, oidc: OIDCClient, registry: AppRegistry, cfg: Optional[PrewarmConfig] = None) -> None:
+        cfg = cfg or PrewarmConfig()
+        self.oidc = oidc
+        self.registry = registry
+        self.concurrency = cfg.concurrency
+        self.timeout = cfg.timeout
+        self._tokens: TTLCache[str] = TTLCache(cfg.max_entries)
+        self._inflight: Dict[str, "asyncio.Task[None]"] = {}
+
+    async def _mint_one(self, semaphore: asyncio.Semaphore, login_id: str, subject_token: str, rp: RelyingParty) -> None:
+        async with semaphore:
+            token = await asyncio.wait_for(self.oidc.exchange_token(subject_token, rp.oidc.client_id), self.timeout)
+        expires_at = session_tokens(token).get("expires_at") or time.time() + self.timeout
+        self._tokens.set((login_id, rp.name), token["access_token"], expires_at - _EXPIRY_MARGIN)
+
+    async def _mint(self, login_id: str, subject_token: str) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        apps = list(self.registry)
+        results = await asyncio.gather(
+            *(self._mint_one(semaphore, login_id, subject_token, rp) for rp in apps),
+            return_exceptions=True,
+        )
+        failed = [rp.name for rp, result in zip(apps, results) if isinstance(result, BaseException)]
+        if failed:
+            log.warning("prewarm_failed", "预取应用 token 失败", apps=failed)
+
+    def start(self, login_id: str, subject_token: str) -> None:
+        """Mint tokens for ``login_id`` in the background."""
+        task = asyncio.ensure_future(self._mint(login_id, subject_token))
+        self._inflight[login_id] = task
+        task.add_done_callback(lambda t: (self._inflight.pop(login_id, None), t.cancelled() or t.exception()))
+
+    async def get(self, login_id: str, app_name: str) -> Optional[str]:
+        token = self._tokens.get((login_id, app_name))
+        if token is None and login_id in self._inflight:
+            # Minting already started at login: waiting is cheaper than a new round-trip
+            try:
+                await asyncio.shield(self._inflight[login_id])
+            except Exception:
+                return None
+            token = self._tokens.get((login_id, app_name))
+        return token
+
+    async def aclose(self) -> None:
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,160 @@
+import asyncio
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from fastapi import Request
+from itsdangerous import URLSafeSerializer
+
+from .config import AppSpec, load_app_names, load_app_spec, load_oidc_options
+from .oidc import OIDCClient
+
+
+# Replaced clients finish the requests already using them before being closed
+RETIRE_GRACE = 60.0
+_retiring: Set["asyncio.Task[None]"] = set()
+
+
+async def _close_later(client: OIDCClient, delay: float) -> None:
+    try:
+        await asyncio.sleep(delay)
+    finally:
+        await client.aclose()
+
+
+def retire_client(client: OIDCClient, delay: float = RETIRE_GRACE) -> None:
+    """Close ``client`` once in-flight requests holding it are done (after ``delay`` seconds)."""
+    task = asyncio.ensure_future(_close_later(client, delay))
+    _retiring.add(task)
+    task.add_done_callback(_retiring.discard)
+
+
+async def close_retired_clients() -> None:
+    """Close every retired client now instead of after its grace period (shutdown)."""
+    tasks = list(_retiring)
+    for task in tasks:
+        # Cancelling the sleep runs the close in _close_later's finally
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def replace_client(old: OIDCClient, new: OIDCClient) -> OIDCClient:
+    """Warm ``new`` from ``old``, open it if ``old`` was open and retire ``old``."""
+    new.adopt(old)
+    if old.http is not None:
+        await new.open()
+        retire_client(old)
+    return new
+
+
+def request_host(request: Request) -> str:
+    return request.headers.get("x-forwarded-host") or request.headers.get("host") or request.client.host
+
+
+class RelyingParty:
+    """Everything the portal and the app engine need for one registered app.
+
+    Built at startup: the OIDC client, the signer for ``state`` values and the
+    parts of the app's public URL derived from its redirect_uri. A config
+    reload replaces them in place through :meth:`reconfigure`.
+    """
+
+    def __init__(self, spec: AppSpec, oidc: OIDCClient, options: Optional[Mapping[str, Any]] = None) -> None:
+        self.name = spec.name
+        self.oidc = oidc
+        self.options = options or {}
+        self._apply(spec)
+
+    def _apply(self, spec: AppSpec) -> None:
+        self.spec = spec
+        self.state_signer = URLSafeSerializer(spec.config.client_secret, salt="oidc-state")
+        redirect = urlsplit(spec.config.redirect_uri)
+        self.port = redirect.port
+        # Apps hosted under a path (e.g. /app3/callback) keep that prefix for every URL
+        path = redirect.path.rstrip("/")
+        self.path_prefix = path[: -len("/callback")] if path.endswith("/callback") else ""
+        # Server-to-server, so derived from the configured URLs rather than a browser request
+        origin = f"{redirect.scheme}://{redirect.netloc}{self.path_prefix}"
+        self.backchannel_logout_url = spec.backchannel_logout_uri or f"{spec.base_url or origin}/backchannel-logout"
+
+    async def reconfigure(self, spec: AppSpec, options: Mapping[str, Any]) -> bool:
+        """Switch to ``spec``/``options``; returns whether anything changed.
+
+        Requests already holding the old client finish with it; new requests use
+        a client started from the old one's discovery, JWKS and userinfo caches.
+        """
+        if spec == self.spec and options == self.options:
+            return False
+        if spec.config != self.spec.config or options != self.options:
+            self.oidc = await replace_client(self.oidc, OIDCClient.from_config(spec.config, **options))
+            self.options = options
+        self._apply(spec)
+        return True
+
+    def url(self, request: Request, path: str) -> str:
+        """Absolute URL of ``path`` inside this app, as seen by the current browser."""
+        if self.spec.base_url:
+            return f"{self.spec.base_url}{path}"
+        base_host = request_host(request).split(":")[0]
+        port = f":{self.port}" if self.port else ""
+        return f"{request.url.scheme}://{base_host}{port}{self.path_prefix}{path}"
+
+
+class AppRegistry:
+    """Registered relying-party apps by name, for O(1) lookup per request."""
+
+    def __init__(self, specs: List[AppSpec], options: Optional[Mapping[str, Any]] = None) -> None:
+        options = load_oidc_options() if options is None else options
+        self._apps: Dict[str, RelyingParty] = {
+            spec.name: RelyingParty(spec, OIDCClient.from_config(spec.config, **options), options) for spec in specs
+        }
+        self._opened = False
+
+    def get(self, name: str) -> Optional[RelyingParty]:
+        return self._apps.get(name)
+
+    def __getitem__(self, name: str) -> RelyingParty:
+        return self._apps[name]
+
+    def __iter__(self) -> Iterator[RelyingParty]:
+        return iter(self._apps.values())
+
+    def __len__(self) -> int:
+        return len(self._apps)
+
+    @property
+    def cache_key(self) -> Tuple[AppSpec, ...]:
+        """The registered specs, in order: changes whenever :meth:`apply` changes what pages show."""
+        return tuple(rp.spec for rp in self._apps.values())
+
+    async def open(self) -> None:
+        self._opened = True
+        for rp in self._apps.values():
+            await rp.oidc.open()
+
+    async def aclose(self) -> None:
+        self._opened = False
+        for rp in self._apps.values():
+            await rp.oidc.aclose()
+        await close_retired_clients()
+
+    async def apply(self, specs: List[AppSpec], options: Mapping[str, Any]) -> None:
+        """Reconcile with a reloaded app list: update, add and retire apps, then swap atomically."""
+        apps: Dict[str, RelyingParty] = {}
+        for spec in specs:
+            rp = self._apps.get(spec.name)
+            if rp is None:
+                rp = RelyingParty(spec, OIDCClient.from_config(spec.config, **options), options)
+                if self._opened:
+                    await rp.oidc.open()
+            else:
+                await rp.reconfigure(spec, options)
+            apps[spec.name] = rp
+        removed = [rp for name, rp in self._apps.items() if name not in apps]
+        self._apps = apps
+        for rp in removed:
+            retire_client(rp.oidc)
+
+
+def load_registry(names: Optional[List[str]] = None, options: Optional[Mapping[str, Any]] = None) -> AppRegistry:
+    """Registry for ``names`` (default: the SSO_APPS list) from environment variables."""
+    return AppRegistry([load_app_spec(name) for name in (names or load_app_names())], options)
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from jose import jwt
+
+from .cache import TTLCache, token_digest
+from .config import TokenRenewalConfig
+from .log import log
+from .oidc import OIDCClient
+
+
+def _expires_at(token: Dict[str, Any]) -> Optional[int]:
+    expires_in = token.get("expires_in")
+    if isinstance(expires_in, (int, float)) and expires_in > 0:
+        return int(time.time() + expires_in)
+    try:
+        exp = jwt.get_unverified_claims(token.get("access_token") or "").get("exp")
+    except Exception:
+        return None
+    return int(exp) if isinstance(exp, (int, float)) else None
+
+
+def session_tokens(token: Dict[str, Any], refresh_token: bool = True) -> Dict[str, Any]:
+    """Token fields kept in a session: the tokens plus the access token's absolute expiry.
+
+    ``refresh_token=False`` leaves out the long-lived refresh token, for
+    sessions that live in a signed but unencrypted cookie.
+    """
+    fields: Dict[str, Any] = {"access_token": token.get("access_token")}
+    for name in ("id_token", "refresh_token") if refresh_token else ("id_token",):
+        if token.get(name):
+            fields[name] = token[name]
+    expires_at = _expires_at(token)
+    if expires_at is not None:
+        fields["expires_at"] = expires_at
+    return fields
+
+
+class TokenRenewer:
+    """Keeps a session's access token fresh with the ``refresh_token`` grant.
+
+    - Within ``skew`` seconds of expiry the current token is still used and a
+      renewal starts in the background; an expired token is renewed inline.
+    - Renewals are keyed by the refresh token, so concurrent requests of one
+      session share a single grant, and later requests still carrying the old
+      cookie pick up the result instead of redeeming the refresh token again.
+    """
+
+    def __init__(self, oidc: OIDCClient, cfg: Optional[TokenRenewalConfig] = None) -> None:
+        cfg = cfg or TokenRenewalConfig()
+        self.oidc = oidc
+        self.skew = cfg.skew
+        self._renewed: TTLCache[Dict[str, Any]] = TTLCache(cfg.max_entries)
+        self._inflight: Dict[bytes, "asyncio.Task[Dict[str, Any]]"] = {}
+
+    async def _grant(self, key: bytes, refresh_token: str) -> Dict[str, Any]:
+        fields = session_tokens(await self.oidc.refresh_token(refresh_token))
+        # Casdoor may not rotate the refresh token; keep using the old one then
+        fields.setdefault("refresh_token", refresh_token)
+        self._renewed.set(key, fields, fields.get("expires_at") or time.time() + self.skew)
+        return fields
+
+    def _renew(self, refresh_token: str) -> "asyncio.Task[Dict[str, Any]]":
+        key = token_digest(refresh_token)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._grant(key, refresh_token))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def ensure_fresh(self, sess: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Token fields to merge into ``sess``, or None when it needs no update."""
+        refresh_token = sess.get("refresh_token")
+        if not refresh_token:
+            return None
+        renewed = self._renewed.get(token_digest(refresh_token))
+        if renewed is not None:
+            return renewed
+        expires_at = sess.get("expires_at")
+        if sess.get("access_token"):
+            if not isinstance(expires_at, (int, float)):
+                return None
+            now = time.time()
+            if now < expires_at - self.skew:
+                return None
+            if now < expires_at:
+                # Still valid: serve it now, the next request picks up the renewed token
+                task = self._renew(refresh_token)
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                return None
+        try:
+            # shield: a disconnecting client must not cancel a grant other requests share
+            return await asyncio.shield(self._renew(refresh_token))
+        except Exception as e:
+            log.warning("token_refresh_failed", "刷新 access_token 失败", error=str(e))
+            return None
+
+    async def aclose(self) -> None:
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,128 @@
+import asyncio
+import random
+import time
+from typing import Any, Optional
+
+import httpx
+
+from .config import ResilienceConfig
+from .metrics import IDP_CALL_RETRIES
+
+
+class CircuitOpenError(RuntimeError):
+    """The IdP failed repeatedly; calls fail fast until the breaker half-opens."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    - closed: calls go through; ``threshold`` consecutive failures open it.
+    - open: calls fail fast with :class:`CircuitOpenError` for ``reset_timeout`` seconds.
+    - half-open: one trial call goes through; success closes, failure re-opens.
+      A trial that never completes (cancelled) must be reported as a failure.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+    _NAMES = {CLOSED: "closed", HALF_OPEN: "half_open", OPEN: "open"}
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._trial = False
+
+    @property
+    def state(self) -> int:
+        if self.failures < self.threshold:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    @property
+    def state_name(self) -> str:
+        return self._NAMES[self.state]
+
+    def before_call(self) -> bool:
+        """Raise if calls are blocked; True when this call is the half-open trial."""
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._trial):
+            raise CircuitOpenError(f"IdP circuit open after {self.failures} consecutive failures")
+        if state == self.HALF_OPEN:
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self._trial = False
+        self.failures += 1
+        if self.failures >= self.threshold:
+            # Opening, or a failed half-open trial: wait a full reset_timeout again
+            if self.failures == self.threshold:
+                self.opens += 1
+            self.opened_at = time.monotonic()
+
+
+class IdPCaller:
+    """IdP HTTP calls with per-operation timeouts, jittered GET retries and a circuit breaker.
+
+    Transport errors and 5xx responses count as failures; 4xx responses are the
+    IdP answering and neither trip the breaker nor get retried.
+    """
+
+    def __init__(self, name: str, cfg: Optional[ResilienceConfig] = None) -> None:
+        self.name = name
+        self.cfg = cfg or ResilienceConfig()
+        self.breaker = CircuitBreaker(self.cfg.breaker_threshold, self.cfg.breaker_reset)
+
+    def timeout(self, operation: str) -> httpx.Timeout:
+        read = {
+            "discovery": self.cfg.discovery_timeout,
+            "jwks": self.cfg.discovery_timeout,
+            "fetch_userinfo": self.cfg.userinfo_timeout,
+        }.get(operation, self.cfg.token_timeout)
+        return httpx.Timeout(read, connect=self.cfg.connect_timeout)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cfg.retry_backoff_max, self.cfg.retry_backoff * (2 ** attempt)))
+
+    async def request(self, http: Optional[httpx.AsyncClient], method: str, url: str, operation: str, **kwargs: Any) -> httpx.Response:
+        timeout = self.timeout(operation)
+        retries = self.cfg.retries if method == "GET" else 0
+        attempt = 0
+        while True:
+            trial = self.breaker.before_call()
+            try:
+                if http is not None:
+                    resp = await http.request(method, url, timeout=timeout, **kwargs)
+                else:
+                    # No shared pool (e.g. used outside the app lifespan): one-off connection
+                    async with httpx.AsyncClient(timeout=timeout) as client:
+                        resp = await client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                self.breaker.record_failure()
+                if attempt >= retries or self.breaker.state == CircuitBreaker.OPEN:
+                    raise
+            except BaseException:
+                # Cancelled (asyncio.wait_for timeout, client disconnect) or an unexpected
+                # error: the trial never completed, so re-open instead of blocking forever
+                if trial:
+                    self.breaker.record_failure()
+                raise
+            else:
+                if resp.status_code < 500:
+                    self.breaker.record_success()
+                    resp.raise_for_status()
+                    return resp
+                self.breaker.record_failure()
+                if attempt >= retries or self.breaker.state == CircuitBreaker.OPEN:
+                    resp.raise_for_status()
+            IDP_CALL_RETRIES.inc(self.name, operation)
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
@@ -0,0 +1,268 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import RevocationConfig
+from .log import log
+from .metrics import REGISTRY
+
+
+class BloomFilter:
+    """Set membership in a fixed bit array: false positives at ``error_rate``, never false negatives.
+
+    Uses Python's per-process ``hash()`` split into two halves for double
+    hashing, so a probe costs one string hash plus ``hashes`` bit tests.
+    The filter lives only in this process and is rebuilt, never shared.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        size = self.size
+        return ((h1 + i * h2) % size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        bits = self._bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        # Inlined _positions: this runs on every request and usually exits at the first bit
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        bits, size = self._bits, self.size
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % size
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+def session_keys(data: Dict[str, Any]) -> List[str]:
+    """Revocation keys a session can be revoked by: its own ID, its user and its IdP session."""
+    keys = []
+    if data.get("_sid"):
+        keys.append(f"session:{data['_sid']}")
+    user = data.get("user")
+    if isinstance(user, dict) and user.get("sub"):
+        keys.append(f"sub:{user['sub']}")
+    if data.get("oidc_sid"):
+        keys.append(f"sid:{data['oidc_sid']}")
+    return keys
+
+
+class RevocationIndex:
+    """Revoked session IDs, users (``sub``) and IdP sessions (``sid``), checked on every request.
+
+    A key revoked at time T invalidates sessions issued at or before T, so a
+    user can sign in again right after "log out everywhere". Entries expire
+    after the session TTL (older sessions are rejected by age anyway).
+
+    Lookups first probe a Bloom filter, so the common "not revoked" answer
+    costs one hash; only filter hits consult the exact ``key -> (revoked_at,
+    expires_at)`` map. With a SQLite file the revocations are shared by every
+    service on the host: a background thread pulls rows written by other
+    processes every ``sync_interval`` seconds and drops expired entries.
+    :meth:`revoke` applies locally at once and leaves the SQLite write to
+    that thread (woken immediately), so it never blocks the event loop.
+    """
+
+    def __init__(self, cfg: RevocationConfig, path: Optional[str] = None, gc_interval: float = 60.0) -> None:
+        self.cfg = cfg
+        self.gc_interval = gc_interval
+        self._bloom = BloomFilter(cfg.capacity, cfg.error_rate)
+        self._entries: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        # Held for SQLite I/O, which only the background thread does while it runs
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._cursor = 0
+        # Revocations not yet written to SQLite: (key, revoked_at, expires_at)
+        self._writes: List[Tuple[str, float, float]] = []
+        self._gc_at = time.monotonic() + gc_interval
+        # Lookups answered by the filter / filter false positives / revoked sessions found
+        self.clear = 0
+        self.false_positives = 0
+        self.revoked = 0
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            # AUTOINCREMENT: ids never go backwards, so "id > last seen" finds every new revocation
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS revocations (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL UNIQUE, "
+                "revoked_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._sync()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        interval = cfg.sync_interval if self._conn is not None and cfg.sync_interval > 0 else gc_interval
+        if interval > 0:
+            self._thread = threading.Thread(target=self._loop, args=(interval,), name="sso-revocation-sync", daemon=True)
+            self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _add(self, key: str, revoked_at: float, expires_at: float) -> None:
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None:
+                revoked_at, expires_at = max(current[0], revoked_at), max(current[1], expires_at)
+            self._entries[key] = (revoked_at, expires_at)
+            self._bloom.add(key)
+
+    def revoke(self, key: str, ttl: float) -> None:
+        """Invalidate every session matching ``key`` issued up to now, for ``ttl`` seconds."""
+        now = time.time()
+        self._add(key, now, now + ttl)
+        if self._conn is not None:
+            with self._lock:
+                self._writes.append((key, now, now + ttl))
+            if self._thread is not None:
+                self._wake.set()
+            else:
+                self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            writes, self._writes = self._writes, []
+        if not writes:
+            return
+        try:
+            with self._db_lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO revocations (key, revoked_at, expires_at) VALUES (?, ?, ?)", writes
+                )
+        except sqlite3.Error:
+            # Retried on the next round; the revocation already applies in this process
+            with self._lock:
+                self._writes[:0] = writes
+            raise
+
+    def is_revoked(self, key: str, issued_at: float) -> bool:
+        if key not in self._bloom:
+            return False
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            self.false_positives += 1
+            return False
+        return issued_at <= entry[0]
+
+    def session_revoked(self, data: Dict[str, Any]) -> bool:
+        issued_at = data.get("_iat")
+        # Sessions written before revocation support carry no issue time: any revocation applies
+        issued_at = issued_at if isinstance(issued_at, (int, float)) else 0.0
+        for key in session_keys(data):
+            if self.is_revoked(key, issued_at):
+                self.revoked += 1
+                return True
+        self.clear += 1
+        return False
+
+    def _sync(self) -> None:
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT id, key, revoked_at, expires_at FROM revocations WHERE id > ? AND expires_at > ? ORDER BY id",
+                (self._cursor, time.time()),
+            ).fetchall()
+        for row_id, key, revoked_at, expires_at in rows:
+            self._add(key, revoked_at, expires_at)
+            self._cursor = row_id
+
+    def gc(self) -> int:
+        """Drop expired revocations and rebuild the filter without them; returns how many were dropped."""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]
+            if expired:
+                for key in expired:
+                    del self._entries[key]
+                bloom = BloomFilter(self.cfg.capacity, self.cfg.error_rate)
+                for key in self._entries:
+                    bloom.add(key)
+                self._bloom = bloom
+        if self._conn is not None:
+            with self._db_lock:
+                self._conn.execute("DELETE FROM revocations WHERE expires_at <= ?", (now,))
+        return len(expired)
+
+    def _loop(self, interval: float) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                if self._conn is not None:
+                    self._flush()
+                    self._sync()
+                if time.monotonic() >= self._gc_at:
+                    self._gc_at = time.monotonic() + self.gc_interval
+                    self.gc()
+            except Exception as e:
+                log.warning("revocation_sync_failed", "同步吊销列表失败", error=str(e))
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._conn is not None:
+            try:
+                self._flush()
+            except sqlite3.Error as e:
+                log.warning("revocation_sync_failed", "同步吊销列表失败", error=str(e))
+            with self._db_lock:
+                self._conn.close()
+
+
+_indexes: Dict[str, RevocationIndex] = {}
+
+
+def open_revocation_index(cfg: RevocationConfig) -> Optional[RevocationIndex]:
+    """The process-wide index for ``cfg`` (shared by every session manager), None when disabled."""
+    if cfg.backend == "off":
+        return None
+    name = cfg.sqlite_path if cfg.backend == "sqlite" else ":memory:"
+    index = _indexes.get(name)
+    if index is not None:
+        return index
+    if cfg.backend == "sqlite":
+        try:
+            index = RevocationIndex(cfg, cfg.sqlite_path)
+            log.info("revocation_shared", "吊销列表与同机服务共享", path=os.path.abspath(cfg.sqlite_path))
+        except sqlite3.Error as e:
+            log.warning("revocation_unavailable", "吊销列表文件不可用，仅在本进程内生效", path=cfg.sqlite_path, error=str(e))
+            name = ":memory:"
+            index = _indexes.get(name)
+    if index is None:
+        index = RevocationIndex(cfg)
+    _indexes[name] = index
+    return index
+
+
+def _collect_revocation_metrics() -> List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]:
+    checks: List[Tuple[Dict[str, str], float]] = []
+    entries: List[Tuple[Dict[str, str], float]] = []
+    for index in list(_indexes.values()):
+        checks.append(({"result": "clear"}, index.clear))
+        checks.append(({"result": "bloom_false_positive"}, index.false_positives))
+        checks.append(({"result": "revoked"}, index.revoked))
+        entries.append(({}, len(index)))
+    return [
+        ("sso_revocation_checks_total", "counter", "Session revocation checks by result.", checks),
+        ("sso_revocation_entries", "gauge", "Live revocations held by this process.", entries),
+    ]
+
+
+REGISTRY.register_collector(_collect_revocation_metrics)
@@ -0,0 +1,272 @@
+import os
+import secrets
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import RedirectResponse
+from itsdangerous import BadSignature
+
+from .cache import TTLCache
+from .handoff import open_ticket_replay_cache, redeem_ticket
+from .log import log
+from .logout import handle_backchannel_logout
+from .metrics import install_metrics
+from .oidc import user_from_claims
+from .registry import AppRegistry, RelyingParty, close_retired_clients, request_host
+from .revocation import open_revocation_index
+from .session import BaseSessionManager, SessionMiddleware
+from .session_store import build_session_store
+from .settings import ConfigRegistry, Settings, load_settings
+from .templating import PageTemplates
+
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "..", "templates", "app")
+
+
+def _path(request: Request, path: str) -> str:
+    # Mounted under a prefix (multi-app host) all local redirects keep that prefix
+    return request.scope.get("root_path", "") + path
+
+
+def _abs_callback_url(request: Request, path: str) -> str:
+    return f"{request.url.scheme}://{request_host(request)}{_path(request, path)}"
+
+
+def _portal_url(request: Request, base_url: str) -> str:
+    # 优先配置覆盖（PORTAL_BASE_URL）
+    if base_url:
+        return base_url + "/"
+    base_host = request_host(request).split(":")[0]
+    return f"{request.url.scheme}://{base_host}:9000/"
+
+
+def create_rp_app(rp: RelyingParty, manage_lifespan: bool = True, config: Optional[ConfigRegistry] = None) -> FastAPI:
+    """FastAPI app for one registered relying party (the former app1/app2 modules).
+
+    With ``manage_lifespan=False`` the caller (e.g. :func:`create_rp_host`) opens
+    and closes the OIDC client and session store, serves ``/metrics`` and
+    handles config reloads. Otherwise SIGHUP reloads the app's OIDC settings;
+    session, cookie and template settings are read once and need a restart.
+    """
+    config = config or ConfigRegistry(lambda: load_settings([rp.name]))
+    settings = config.settings
+    cfg = rp.spec.config
+    store_cfg = settings.session_store
+    session = BaseSessionManager(
+        cfg.cookie_secret,
+        cfg.cookie_secure,
+        cfg.cookie_domain or "",
+        cookie_name=f"{rp.name}_session",
+        salt=f"{rp.name}-session",
+        store=build_session_store(store_cfg),
+        ttl=store_cfg.ttl,
+        codec=settings.session_codec,
+        revocation=open_revocation_index(settings.revocation),
+        cache=settings.session_cache,
+    )
+    templates = PageTemplates(TEMPLATES_DIR, settings.templates)
+    seen_logout_tokens: TTLCache[bool] = TTLCache(10000)
+    # 已兑换的交接票据，同机各服务共享，保证每张票据只能使用一次
+    ticket_replay = open_ticket_replay_cache(settings.handoff)
+
+    async def reload(old: Settings, new: Settings) -> None:
+        spec = new.app(rp.name)
+        if spec is not None:
+            await rp.reconfigure(spec, new.oidc_options)
+
+    if manage_lifespan:
+        config.on_reload(reload)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await rp.oidc.open()
+        config.install_sighup()
+        try:
+            yield
+        finally:
+            config.remove_sighup()
+            await rp.oidc.aclose()
+            await close_retired_clients()
+            session.close()
+
+    app = FastAPI(title=rp.spec.label, lifespan=lifespan if manage_lifespan else None)
+    app.state.rp = rp
+    app.state.session = session
+    app.state.config = config
+    app.add_middleware(SessionMiddleware, manager=session)
+    if manage_lifespan:
+        install_metrics(app, rp.name)
+
+    def portal_url(request: Request) -> str:
+        return _portal_url(request, config.settings.portal_base_url)
+
+    async def render(request: Request, name: str, **context: Any):
+        context.update(app=rp.spec, root_path=_path(request, ""), portal_url=portal_url(request))
+        return await templates.render(request, name, **context)
+
+    @app.get("/")
+    async def root(request: Request):
+        # 门户签发的一次性交接票据：本地验签并查重，无需访问 Casdoor
+        sso_ticket = request.query_params.get("sso_ticket")
+        if sso_ticket:
+            claims = await redeem_ticket(rp, sso_ticket, ticket_replay, config.settings.handoff.ttl)
+            if claims is not None:
+                user = user_from_claims(claims["user"])
+                response = await render(request, "protected.html", user=user)
+                data: Dict[str, Any] = {"user": user}
+                if claims.get("sid"):
+                    # 门户的 IdP 会话被注销时，本应用会话随之失效
+                    data["oidc_sid"] = claims["sid"]
+                session.set_session(response, data, request)
+                log.info("handoff_ticket_redeemed", "交接票据验证成功", app=rp.name, username=user.get("username"))
+                return response
+
+        # 检查是否有SSO token参数
+        sso_token = request.query_params.get("sso_token")
+
+        if sso_token:
+            # 验证SSO token
+            try:
+                # 默认本地校验 JWT（签名/aud/iss/exp）；仅当 token 不是 JWT 或 JWKS 不可用且允许时回退到 userinfo
+                token_validation = config.settings.token_validation[rp.name]
+                user_info = await rp.oidc.resolve_access_token(
+                    sso_token,
+                    audiences=list(token_validation.audiences),
+                    local=token_validation.mode == "local",
+                    userinfo_fallback=token_validation.userinfo_fallback,
+                )
+                if user_info:
+                    # Token有效，保存用户会话
+                    user = user_from_claims(user_info)
+                    response = await render(request, "protected.html", user=user)
+                    data = {"user": user, "access_token": sso_token}
+                    if user_info.get("sid"):
+                        # 门户的 IdP 会话被注销时，本应用会话随之失效
+                        data["oidc_sid"] = user_info["sid"]
+                    session.set_session(response, data, request)
+                    log.info("sso_token_verified", "SSO Token验证成功", app=rp.name, username=user.get("username"))
+                    return response
+            except Exception as e:
+                log.warning("sso_token_rejected", "SSO Token验证失败", app=rp.name, error=str(e))
+                # Token无效，继续正常流程
+
+        sess = session.get_session(request) or {}
+        if sess.get("user"):
+            # 已登录，显示受保护页面
+            return await render(request, "protected.html", user=sess.get("user"))
+        # 未登录，显示登录页面（对所有访客相同，渲染一次后按 ETag 返回）
+        return await templates.cached(request, "index.html", app=rp.spec, root_path=_path(request, ""), portal_url=portal_url(request))
+
+    @app.get("/login")
+    async def login(request: Request):
+        state = secrets.token_urlsafe(16)
+        redirect_uri = _abs_callback_url(request, "/callback")
+        url = await rp.oidc.build_authorize_url(state, redirect_uri=redirect_uri)
+        return RedirectResponse(url)
+
+    @app.get("/callback")
+    async def callback(request: Request, code: Optional[str] = None, state: Optional[str] = None, error: Optional[str] = None):
+        # 如果静默免登失败（如 login_required），回退到标准授权
+        if error:
+            log.warning("oauth_error", "OAuth错误", app=rp.name, error=error)
+            redirect_uri = _abs_callback_url(request, "/callback")
+            url = await rp.oidc.build_authorize_url(secrets.token_urlsafe(16), redirect_uri=redirect_uri)
+            return RedirectResponse(url)
+
+        if not code:
+            log.warning("callback_without_code", "未收到授权码", app=rp.name)
+            return RedirectResponse(_path(request, "/"))
+
+        # 兼容性校验 state（若为门户签名则校验，否则忽略）
+        if state:
+            try:
+                rp.state_signer.loads(state)
+                log.debug("state_verified", "State验证成功", app=rp.name)
+            except BadSignature:
+                log.warning("state_invalid", "State验证失败，但继续处理", app=rp.name)
+
+        redirect_uri = _abs_callback_url(request, "/callback")
+        # 整个回调使用同一个客户端，期间重载配置也不影响本次登录
+        oidc = rp.oidc
+        token = await oidc.exchange_code(code, redirect_uri=redirect_uri)
+        access_token = token.get("access_token")
+        user: Dict[str, Any] = {}
+
+        if access_token:
+            try:
+                info = await oidc.fetch_userinfo(access_token)
+                user = user_from_claims(info)
+                log.debug("userinfo_fetched", "用户信息获取成功", app=rp.name, username=user.get("username"))
+            except Exception as e:
+                log.warning("userinfo_failed", "获取用户信息失败", app=rp.name, error=str(e))
+                user = {}
+
+        # 写入会话并回到主页
+        response = RedirectResponse(_path(request, "/"))
+        # 仅保存轻量信息
+        session.set_session(response, {"user": user}, request)
+        log.info("login_succeeded", "用户登录成功，重定向到主页", app=rp.name, username=user.get("username"))
+        return response
+
+    @app.get("/logout")
+    async def logout(request: Request):
+        response = RedirectResponse(url=_path(request, "/"))
+        session.clear_session(response, request)
+        return response
+
+    @app.post("/backchannel-logout")
+    async def backchannel_logout(request: Request):
+        # 门户（或 Casdoor）发来的后端通道注销：吊销该用户 / IdP 会话在本应用的会话
+        response, claims = await handle_backchannel_logout(request, rp.oidc, session, seen_logout_tokens)
+        if claims is not None:
+            log.info("backchannel_logout", "收到后端通道注销", app=rp.name, sub=claims.get("sub"), sid=claims.get("sid"))
+        return response
+
+    return app
+
+
+def create_rp_host(registry: AppRegistry, config: Optional[ConfigRegistry] = None) -> FastAPI:
+    """One process serving every app of ``registry``, each mounted at its redirect_uri path prefix.
+
+    SIGHUP reloads the OIDC settings of the hosted apps; adding or removing
+    apps, or changing their path prefix, needs a restart.
+    """
+    prefixes: Dict[str, str] = {}
+    for rp in registry:
+        if not rp.path_prefix:
+            raise RuntimeError(f"{rp.name}: redirect_uri must include a path prefix (e.g. /{rp.name}/callback) to share a host")
+        if rp.path_prefix in prefixes:
+            raise RuntimeError(f"{rp.name}: path prefix {rp.path_prefix} already used by {prefixes[rp.path_prefix]}")
+        prefixes[rp.path_prefix] = rp.name
+    config = config or ConfigRegistry(lambda: load_settings([rp.name for rp in registry]))
+    apps: List[FastAPI] = [create_rp_app(rp, manage_lifespan=False, config=config) for rp in registry]
+
+    async def reload(old: Settings, new: Settings) -> None:
+        for rp in registry:
+            spec = new.app(rp.name)
+            if spec is not None:
+                await rp.reconfigure(spec, new.oidc_options)
+
+    config.on_reload(reload)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Mounted sub-apps do not run their own lifespan
+        await registry.open()
+        config.install_sighup()
+        try:
+            yield
+        finally:
+            config.remove_sighup()
+            await registry.aclose()
+            for sub_app in apps:
+                sub_app.state.session.close()
+
+    host = FastAPI(title="Apps", lifespan=lifespan)
+    host.state.registry = registry
+    # Mounted routes are labelled with their prefix, e.g. /app1/callback
+    install_metrics(host, "apps")
+    for sub_app in apps:
+        host.mount(sub_app.state.rp.path_prefix, sub_app)
+    return host
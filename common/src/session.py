@@ -0,0 +1,312 @@
+import asyncio
+import secrets
+import time
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+from itsdangerous import BadSignature, Signer
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .cache import TTLCache, token_digest
+from .config import SessionCacheConfig, SessionCodecConfig
+from .metrics import REGISTRY
+from .revocation import RevocationIndex
+from .session_codec import build_session_codec
+from .session_store import SessionStore
+
+
+class BaseSessionManager:
+    """Signed session cookie, optionally backed by a server-side store.
+
+    Without a store the whole session dict is serialized into the cookie
+    with the configured codec.
+    With a store the cookie only carries a short signed session ID.
+
+    Every session carries an ID (``_sid``) and issue time (``_iat``), kept
+    across rewrites of the same session. Sessions older than ``ttl`` or
+    revoked in the shared :class:`RevocationIndex` (by session, user or IdP
+    session) are treated as absent, so a copied cookie stops working after
+    logout.
+
+    Cookie sessions are decoded once per distinct cookie: the decoded dict is
+    kept in an LRU keyed by the cookie's digest (bounded by ``cache``), so
+    repeat requests skip the signature check and decompression. Expiry and
+    revocation are still checked on every request.
+
+    Under :class:`SessionMiddleware` the session is resolved at most once per
+    request and kept on ``request.state.session``; writing back an unchanged
+    session sends no ``Set-Cookie``. Reads and writes of a blocking store
+    (SQLite) then run in a worker thread instead of on the event loop.
+    """
+
+    def __init__(self, secret: str, cookie_secure: bool = False, cookie_domain: str = "", cookie_name: str = "session", salt: str = "session", store: Optional[SessionStore] = None, ttl: float = 8 * 3600, codec: Optional[SessionCodecConfig] = None, revocation: Optional[RevocationIndex] = None, cache: Optional[SessionCacheConfig] = None) -> None:
+        self.codec = build_session_codec(secret, salt, codec)
+        self.signer = Signer(secret, salt=f"{salt}-id")
+        self.cookie_secure = cookie_secure
+        self.cookie_domain = cookie_domain or None
+        self.cookie_name = cookie_name
+        self.store = store
+        self.ttl = ttl
+        self.revocation = revocation
+        cache = cache or SessionCacheConfig()
+        self.cache: Optional[TTLCache[Dict[str, Any]]] = None
+        if store is None and cache.max_entries > 0:
+            self.cache = TTLCache(cache.max_entries, cache.max_bytes)
+            _managers.add(self)
+
+    def _session_id(self, request: Optional[Request]) -> Optional[str]:
+        raw = request.cookies.get(self.cookie_name) if request is not None else None
+        if not raw:
+            return None
+        try:
+            return self.signer.unsign(raw).decode()
+        except BadSignature:
+            return None
+
+    def _request_session(self, request: Optional[Request]) -> Optional["RequestSession"]:
+        state = request.scope.get("state") if request is not None else None
+        current = state.get("session") if state else None
+        return current if isinstance(current, RequestSession) and current.manager is self else None
+
+    def set_session(self, response: Response, data: Dict[str, Any], request: Optional[Request] = None) -> None:
+        if "_sid" not in data:
+            data = {**data, "_sid": secrets.token_urlsafe(12), "_iat": time.time()}
+        current = self._request_session(request)
+        if current is not None:
+            if current.loaded and not current.written and data == current.original:
+                # Same session the browser already holds
+                return
+            # Later reads in this request see the stamped session, so it can be revoked
+            current.replace(data)
+        if self.store is None:
+            token = self.codec.dumps(data)
+        else:
+            # New ID on every write so a pre-login ID is never promoted to a logged-in session
+            old_sid = self._session_id(request)
+            if old_sid:
+                self._store_call(current, self.store.delete, old_sid)
+            sid = secrets.token_urlsafe(16)
+            self._store_call(current, self.store.set, sid, data, self.ttl)
+            token = self.signer.sign(sid).decode()
+        response.set_cookie(
+            key=self.cookie_name,
+            value=token,
+            httponly=True,
+            secure=self.cookie_secure,
+            samesite="lax",
+            domain=self.cookie_domain,
+            path="/",
+        )
+
+    def clear_session(self, response: Response, request: Optional[Request] = None) -> None:
+        if self.revocation is not None and request is not None:
+            # Deleting the cookie only affects this browser; revoke the session itself
+            sess = self.get_session(request)
+            if sess and sess.get("_sid"):
+                self.revocation.revoke(f"session:{sess['_sid']}", self.ttl)
+        current = self._request_session(request)
+        if current is not None:
+            current.replace(None)
+        if self.store is not None:
+            sid = self._session_id(request)
+            if sid:
+                self._store_call(current, self.store.delete, sid)
+        elif self.cache is not None and request is not None and request.cookies.get(self.cookie_name):
+            self.cache.pop(token_digest(request.cookies[self.cookie_name]))
+        response.delete_cookie(self.cookie_name, domain=self.cookie_domain or None, path="/")
+
+    def _store_call(self, current: Optional["RequestSession"], op: Callable[..., None], *args: Any) -> None:
+        if current is not None and self.store is not None and self.store.blocking:
+            # Run by SessionMiddleware in a worker thread before the response starts
+            current.pending.append((op, args))
+        else:
+            op(*args)
+
+    def revoke_user(self, sub: Optional[str]) -> None:
+        """Invalidate every session of user ``sub`` issued so far, in all services sharing the index."""
+        if self.revocation is not None and sub:
+            self.revocation.revoke(f"sub:{sub}", self.ttl)
+
+    def revoke_idp_session(self, sid: Optional[str]) -> None:
+        """Invalidate the sessions created from IdP session ``sid`` (back-channel logout)."""
+        if self.revocation is not None and sid:
+            self.revocation.revoke(f"sid:{sid}", self.ttl)
+
+    def _load(self, request: Request) -> Optional[Dict[str, Any]]:
+        if self.store is not None:
+            sid = self._session_id(request)
+            return self.store.get(sid) if sid else None
+        raw = request.cookies.get(self.cookie_name)
+        if not raw:
+            return None
+        if self.cache is None:
+            try:
+                return self.codec.loads(raw)
+            except BadSignature:
+                return None
+        key = token_digest(raw)
+        cached = self.cache.get(key)
+        if cached is not None:
+            # Callers may modify the session before writing it back
+            return dict(cached)
+        try:
+            data = self.codec.loads(raw)
+        except BadSignature:
+            return None
+        if isinstance(data, dict) and data:
+            issued_at = data.get("_iat")
+            expires_at = issued_at + self.ttl if isinstance(issued_at, (int, float)) else time.time() + self.ttl
+            self.cache.set(key, data, expires_at, size=len(raw))
+            return dict(data)
+        return data
+
+    def get_session(self, request: Request) -> Optional[Dict[str, Any]]:
+        current = self._request_session(request)
+        if current is not None:
+            return current.data
+        return self._resolve(request)
+
+    def _resolve(self, request: Request) -> Optional[Dict[str, Any]]:
+        return self._check(self._load(request))
+
+    def _check(self, data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not data:
+            return data
+        issued_at = data.get("_iat")
+        if isinstance(issued_at, (int, float)) and issued_at + self.ttl <= time.time():
+            return None
+        if self.revocation is not None and self.revocation.session_revoked(data):
+            return None
+        return data
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
+        if self.cache is not None:
+            self.cache.clear()
+
+
+class RequestSession:
+    """The session of one request, resolved on first access (``request.state.session``)."""
+
+    __slots__ = ("manager", "request", "loaded", "written", "original", "pending", "_data")
+
+    def __init__(self, manager: BaseSessionManager, request: Request) -> None:
+        self.manager = manager
+        self.request = request
+        self.loaded = False
+        self.written = False
+        # As decoded from the request cookie, to tell whether a write changes it
+        self.original: Optional[Dict[str, Any]] = None
+        # Store writes deferred until the response starts (blocking stores only)
+        self.pending: List[Tuple[Callable[..., None], Tuple[Any, ...]]] = []
+        self._data: Optional[Dict[str, Any]] = None
+
+    @property
+    def data(self) -> Optional[Dict[str, Any]]:
+        if not self.loaded:
+            self._loaded(self.manager._resolve(self.request))
+        return self._data
+
+    def _loaded(self, original: Optional[Dict[str, Any]]) -> None:
+        self.original = original
+        self._data = dict(original) if original else original
+        self.loaded = True
+
+    async def prefetch(self) -> None:
+        """Resolve the session now, fetching it from the store in a worker thread."""
+        if not self.loaded:
+            raw = await asyncio.get_running_loop().run_in_executor(None, self.manager._load, self.request)
+            if not self.loaded:
+                self._loaded(self.manager._check(raw))
+
+    async def flush(self) -> None:
+        """Apply the deferred store writes in a worker thread."""
+        ops, self.pending = self.pending, []
+        if ops:
+            await asyncio.get_running_loop().run_in_executor(None, _apply, ops)
+
+    def replace(self, data: Optional[Dict[str, Any]]) -> None:
+        # Later reads in this request see what was written, not the stale cookie
+        self._data = data
+        self.loaded = True
+        self.written = True
+
+
+def _apply(ops: List[Tuple[Callable[..., None], Tuple[Any, ...]]]) -> None:
+    for op, args in ops:
+        op(*args)
+
+
+# Static assets, probes and scrapes never need the session
+SESSION_SKIP_PATHS = ("/metrics", "/health", "/healthz", "/static/", "/favicon.ico")
+
+
+class SessionMiddleware:
+    """Pure ASGI middleware putting a lazily resolved :class:`RequestSession` on ``request.state.session``.
+
+    Nothing is decoded until a handler reads the session, and then only once
+    per request however many times it is read. Paths starting with one of
+    ``skip_paths`` get no session state at all.
+
+    With a blocking store (SQLite) the store is never touched on the event
+    loop: a request carrying the session cookie has its session fetched in a
+    worker thread before the handler runs, and writes made by the handler are
+    applied in a worker thread before the response (and its ``Set-Cookie``)
+    is sent, so the browser never holds a session ID the store lacks.
+    """
+
+    def __init__(self, app: ASGIApp, manager: BaseSessionManager, skip_paths: Tuple[str, ...] = SESSION_SKIP_PATHS) -> None:
+        self.app = app
+        self.manager = manager
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            path = scope["path"]
+            root_path = scope.get("root_path", "")
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+            if not path.startswith(self.skip_paths):
+                request = Request(scope, receive)
+                current = RequestSession(self.manager, request)
+                scope.setdefault("state", {})["session"] = current
+                store = self.manager.store
+                if store is not None and store.blocking:
+                    if request.cookies.get(self.manager.cookie_name):
+                        await current.prefetch()
+                    send = _flushing(current, send)
+        await self.app(scope, receive, send)
+
+
+def _flushing(current: RequestSession, send: Send) -> Send:
+    async def wrapped(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            await current.flush()
+        await send(message)
+
+    return wrapped
+
+
+# Managers with a cookie cache, read at scrape time
+_managers: "weakref.WeakSet[BaseSessionManager]" = weakref.WeakSet()
+
+
+def _collect_session_cache_metrics() -> List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]:
+    requests: List[Tuple[Dict[str, str], float]] = []
+    sizes: List[Tuple[Dict[str, str], float]] = []
+    for manager in list(_managers):
+        stats = manager.cache.stats()
+        name = manager.cookie_name
+        requests.append(({"cookie": name, "result": "hit"}, stats["hits"]))
+        requests.append(({"cookie": name, "result": "miss"}, stats["misses"]))
+        sizes.append(({"cookie": name, "unit": "entries"}, stats["entries"]))
+        sizes.append(({"cookie": name, "unit": "bytes"}, stats["bytes"]))
+    return [
+        ("sso_session_cache_requests_total", "counter", "Decoded session cookie cache lookups by result.", requests),
+        ("sso_session_cache_size", "gauge", "Decoded session cookies cached, in entries and cookie bytes.", sizes),
+    ]
+
+
+REGISTRY.register_collector(_collect_session_cache_metrics)
@@ -0,0 +1,169 @@
+import base64
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from itsdangerous import BadSignature, Signer, URLSafeSerializer
+
+from .config import SessionCodecConfig
+from .log import log
+
+
+# Cookie values written by CompactCodec start with this marker; itsdangerous
+# JSON payloads start with "ey" (or "." when compressed), so both can coexist.
+_COMPACT_PREFIX = "~"
+_VERSION = 1
+_FLAG_ZLIB = 0x01
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _write_bytes(out: bytearray, raw: bytes) -> None:
+    _write_varint(out, len(raw))
+    out += raw
+
+
+def _read_bytes(buf: bytes, pos: int) -> Tuple[bytes, int]:
+    length, pos = _read_varint(buf, pos)
+    return buf[pos:pos + length], pos + length
+
+
+def _split_jwt(value: Any) -> Optional[List[bytes]]:
+    """Raw segments of a compact JWS, or None if ``value`` is not one."""
+    if not isinstance(value, str) or value.count(".") != 2:
+        return None
+    try:
+        segments = [_b64decode(part) for part in value.split(".")]
+    except Exception:
+        return None
+    # Only accept canonical encodings so decoding restores the exact token
+    if ".".join(_b64encode(raw) for raw in segments) != value:
+        return None
+    return segments
+
+
+class JSONCodec:
+    """The original itsdangerous URL-safe JSON cookie format."""
+
+    def __init__(self, secret: str, salt: str) -> None:
+        self.serializer = URLSafeSerializer(secret_key=secret, salt=salt)
+
+    def dumps(self, data: Dict[str, Any]) -> str:
+        return self.serializer.dumps(data)
+
+    def loads(self, raw: str) -> Dict[str, Any]:
+        return self.serializer.loads(raw)
+
+
+class CompactCodec(JSONCodec):
+    """Binary session cookie: JWTs stored as raw segments, optional zlib, byte budget.
+
+    Layout before signing: version, flags, then (optionally deflated) body of
+    varint-prefixed fields: the JSON of the non-token fields followed by
+    (name, header, payload, signature) for every top-level JWT value.
+    Cookies in the legacy JSON format are still accepted by ``loads``.
+    """
+
+    def __init__(self, secret: str, salt: str, compress: bool = True, budget: int = 4000, optional_fields: Tuple[str, ...] = ("id_token",)) -> None:
+        super().__init__(secret, salt)
+        self.signer = Signer(secret, salt=f"{salt}-compact")
+        self.compress = compress
+        self.budget = budget
+        self.optional_fields = optional_fields
+
+    def _encode(self, data: Dict[str, Any]) -> str:
+        plain: Dict[str, Any] = {}
+        tokens: List[Tuple[str, List[bytes]]] = []
+        for key, value in data.items():
+            segments = _split_jwt(value)
+            if segments is None:
+                plain[key] = value
+            else:
+                tokens.append((key, segments))
+        body = bytearray()
+        _write_bytes(body, json.dumps(plain, separators=(",", ":")).encode())
+        for key, segments in tokens:
+            _write_bytes(body, key.encode())
+            for raw in segments:
+                _write_bytes(body, raw)
+        flags = 0
+        payload = bytes(body)
+        if self.compress:
+            deflated = zlib.compress(payload)
+            if len(deflated) < len(payload):
+                payload, flags = deflated, flags | _FLAG_ZLIB
+        blob = bytes([_VERSION, flags]) + payload
+        return _COMPACT_PREFIX + self.signer.sign(_b64encode(blob)).decode()
+
+    def dumps(self, data: Dict[str, Any]) -> str:
+        token = self._encode(data)
+        if len(token) <= self.budget:
+            return token
+        # Over budget: drop optional fields (e.g. id_token) until the cookie fits
+        data = dict(data)
+        for field in self.optional_fields:
+            if field in data:
+                del data[field]
+                token = self._encode(data)
+                if len(token) <= self.budget:
+                    return token
+        # Browsers drop cookies over ~4 KB, which silently logs the user out
+        log.warning("session_cookie_oversized", "会话 Cookie 超出大小预算，浏览器可能丢弃", size=len(token), budget=self.budget, fields=sorted(data))
+        return token
+
+    def loads(self, raw: str) -> Dict[str, Any]:
+        if not raw.startswith(_COMPACT_PREFIX):
+            return super().loads(raw)
+        blob = _b64decode(self.signer.unsign(raw[len(_COMPACT_PREFIX):]).decode())
+        try:
+            version, flags = blob[0], blob[1]
+            if version != _VERSION:
+                raise BadSignature(f"Unsupported session cookie version: {version}")
+            body = blob[2:]
+            if flags & _FLAG_ZLIB:
+                body = zlib.decompress(body)
+            plain, pos = _read_bytes(body, 0)
+            data: Dict[str, Any] = json.loads(plain)
+            while pos < len(body):
+                key, pos = _read_bytes(body, pos)
+                segments = []
+                for _ in range(3):
+                    segment, pos = _read_bytes(body, pos)
+                    segments.append(_b64encode(segment))
+                data[key.decode()] = ".".join(segments)
+        except BadSignature:
+            raise
+        except Exception as exc:
+            raise BadSignature(f"Malformed session cookie: {exc}")
+        return data
+
+
+def build_session_codec(secret: str, salt: str, cfg: Optional[SessionCodecConfig] = None) -> JSONCodec:
+    cfg = cfg or SessionCodecConfig()
+    if cfg.codec == "compact":
+        return CompactCodec(secret, salt, compress=cfg.compress, budget=cfg.budget, optional_fields=tuple(cfg.optional_fields))
+    return JSONCodec(secret, salt)
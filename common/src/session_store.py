@@ -0,0 +1,137 @@
+import json
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from .config import SessionStoreConfig
+
+
+class SessionStore(ABC):
+    """Server-side session backend: opaque session ID -> session dict with TTL."""
+
+    # get/set/delete do file or network I/O; SessionMiddleware runs them in a worker thread
+    blocking = False
+
+    def __init__(self, gc_interval: float = 60.0) -> None:
+        self._stop = threading.Event()
+        self._gc_thread: Optional[threading.Thread] = None
+        if gc_interval > 0:
+            self._gc_thread = threading.Thread(target=self._gc_loop, args=(gc_interval,), daemon=True)
+            self._gc_thread.start()
+
+    @abstractmethod
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def set(self, sid: str, data: Dict[str, Any], ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, sid: str) -> None:
+        ...
+
+    @abstractmethod
+    def gc(self) -> int:
+        """Drop expired sessions, return how many were removed."""
+
+    def _gc_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.gc()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._gc_thread is not None:
+            self._gc_thread.join(timeout=5)
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, gc_interval: float = 60.0) -> None:
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        super().__init__(gc_interval)
+
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+        entry = self._data.get(sid)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at <= time.time():
+            self.delete(sid)
+            return None
+        return dict(data)
+
+    def set(self, sid: str, data: Dict[str, Any], ttl: float) -> None:
+        with self._lock:
+            self._data[sid] = (time.time() + ttl, dict(data))
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def gc(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (expires_at, _) in self._data.items() if expires_at <= now]
+            for sid in expired:
+                del self._data[sid]
+        return len(expired)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite file, shared by every worker process on the host."""
+
+    blocking = True
+
+    def __init__(self, path: str, gc_interval: float = 60.0) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+        super().__init__(gc_interval)
+
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE sid = ? AND expires_at > ?", (sid, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, sid: str, data: Dict[str, Any], ttl: float) -> None:
+        payload = json.dumps(data, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)",
+                (sid, payload, time.time() + ttl),
+            )
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def gc(self) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def close(self) -> None:
+        super().close()
+        with self._lock:
+            self._conn.close()
+
+
+def build_session_store(cfg: SessionStoreConfig) -> Optional[SessionStore]:
+    """Session backend for ``cfg.backend``; None keeps the whole session in the cookie."""
+    if cfg.backend == "memory":
+        return MemorySessionStore(cfg.gc_interval)
+    if cfg.backend == "sqlite":
+        return SQLiteSessionStore(cfg.sqlite_path, cfg.gc_interval)
+    return None
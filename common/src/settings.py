@@ -0,0 +1,172 @@
+import asyncio
+import os
+import signal
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, List, Mapping, Optional, Sequence, Tuple
+
+from .config import (
+    AppSpec,
+    BaseAppConfig,
+    CallbackConfig,
+    HandoffConfig,
+    LogConfig,
+    LogoutFanoutConfig,
+    PrewarmConfig,
+    RevocationConfig,
+    SessionCacheConfig,
+    SessionCodecConfig,
+    SessionStoreConfig,
+    TemplateConfig,
+    TokenRenewalConfig,
+    TokenValidationConfig,
+    load_app_names,
+    load_app_spec,
+    load_callback_config,
+    load_handoff_config,
+    load_log_config,
+    load_logout_fanout_config,
+    load_oidc_options,
+    load_portal_base_url,
+    load_portal_config,
+    load_prewarm_config,
+    load_revocation_config,
+    load_session_cache_config,
+    load_session_codec_config,
+    load_session_store_config,
+    load_template_config,
+    load_token_renewal_config,
+    load_token_validation_config,
+    read_config_file,
+    use_config_file,
+)
+from .log import log
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Every setting of one service, validated together and never mutated."""
+
+    apps: Tuple[AppSpec, ...]
+    # Keyword arguments for every OIDCClient (see load_oidc_options)
+    oidc_options: Mapping[str, Any]
+    # Hand-off token validation per app name
+    token_validation: Mapping[str, TokenValidationConfig]
+    session_store: SessionStoreConfig
+    session_codec: SessionCodecConfig
+    revocation: RevocationConfig
+    session_cache: SessionCacheConfig
+    templates: TemplateConfig
+    callback: CallbackConfig
+    token_renewal: TokenRenewalConfig
+    prewarm: PrewarmConfig
+    logout_fanout: LogoutFanoutConfig
+    handoff: HandoffConfig
+    log: LogConfig
+    portal: Optional[BaseAppConfig] = None
+    portal_base_url: str = ""
+
+    def app(self, name: str) -> Optional[AppSpec]:
+        for spec in self.apps:
+            if spec.name == name:
+                return spec
+        return None
+
+
+def load_settings(app_names: Optional[Sequence[str]] = None, portal: bool = False) -> Settings:
+    """Settings from the environment and, if set, ``SSO_CONFIG_FILE`` (re-read on every call).
+
+    Raises RuntimeError on a missing or invalid value; the file values in use
+    before the call are kept in that case.
+    """
+    path = os.getenv("SSO_CONFIG_FILE", "")
+    previous = use_config_file(read_config_file(path) if path else {})
+    try:
+        apps = tuple(load_app_spec(name) for name in (app_names or load_app_names()))
+        return Settings(
+            apps=apps,
+            # Read-only views: the frozen dataclass alone would still let callers mutate the dicts
+            oidc_options=MappingProxyType(load_oidc_options()),
+            token_validation=MappingProxyType({spec.name: load_token_validation_config(spec.config.client_id) for spec in apps}),
+            session_store=load_session_store_config(),
+            session_codec=load_session_codec_config(),
+            revocation=load_revocation_config(),
+            session_cache=load_session_cache_config(),
+            templates=load_template_config(),
+            callback=load_callback_config(),
+            token_renewal=load_token_renewal_config(),
+            prewarm=load_prewarm_config(),
+            logout_fanout=load_logout_fanout_config(),
+            handoff=load_handoff_config(),
+            log=load_log_config(),
+            portal=load_portal_config() if portal else None,
+            portal_base_url=load_portal_base_url(),
+        )
+    except BaseException:
+        use_config_file(previous)
+        raise
+
+
+ReloadListener = Callable[[Settings, Settings], Awaitable[None]]
+
+
+class ConfigRegistry:
+    """The process's current :class:`Settings`, replaced atomically on reload.
+
+    ``reload()`` (bound to SIGHUP by :meth:`install_sighup`) builds and validates
+    a complete new Settings first; an invalid config leaves the running one in
+    place. Listeners then rebuild whatever depends on the changed parts; log
+    level, format and sampling apply directly.
+    """
+
+    def __init__(self, loader: Callable[[], Settings]) -> None:
+        self._loader = loader
+        self._settings = loader()
+        log.configure(self._settings.log)
+        self._listeners: List[ReloadListener] = []
+        self._lock: Optional[asyncio.Lock] = None
+        self._sighup = False
+
+    @property
+    def settings(self) -> Settings:
+        return self._settings
+
+    def on_reload(self, listener: ReloadListener) -> None:
+        self._listeners.append(listener)
+
+    async def reload(self) -> bool:
+        """Swap in freshly loaded settings; returns whether anything changed."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            try:
+                new = self._loader()
+            except Exception as e:
+                log.error("config_reload_failed", "配置重载失败，继续使用当前配置", error=str(e))
+                return False
+            old = self._settings
+            if new == old:
+                return False
+            self._settings = new
+            log.configure(new.log)
+            for listener in self._listeners:
+                await listener(old, new)
+            log.info("config_reloaded", "配置已重载")
+            return True
+
+    def install_sighup(self) -> None:
+        """Reload on SIGHUP; call from within the running event loop (e.g. a lifespan)."""
+        if not hasattr(signal, "SIGHUP"):
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(self.reload()))
+        except (NotImplementedError, RuntimeError, ValueError):
+            # Not the main thread (e.g. an embedded server): reload() stays callable
+            return
+        self._sighup = True
+
+    def remove_sighup(self) -> None:
+        if self._sighup:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+            self._sighup = False
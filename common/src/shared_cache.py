@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+from .config import SharedCacheConfig
+from .log import log
+from .metrics import REGISTRY
+
+
+_MAGIC = b"SSOC"
+_LAYOUT = 1
+# magic, layout version, slot count, slot size
+_HEADER = struct.Struct("<4sIII")
+_HEADER_SIZE = 64
+# seq (odd while being written), expires_at, payload length, key digest
+_SLOT = struct.Struct("<QdI16s4x")
+_SEQ = struct.Struct("<Q")
+
+
+class SharedCache:
+    """JSON values shared by the worker processes of one host through a memory-mapped file.
+
+    The file is a direct-mapped table of fixed-size slots. Each slot carries a
+    sequence number used as a seqlock (odd while a writer is inside) and as
+    the entry's version: readers never lock, and a worker that already holds
+    the parsed value of a version does not read the payload again. Writers
+    serialize per slot with ``fcntl`` byte-range locks, and a second lock
+    range per slot is a fetch lease, so one worker refreshes a key while the
+    others wait for it to publish.
+
+    ``fcntl`` locks belong to the process, so they only exclude other
+    workers: within a process, concurrent loads of a key share one in-flight
+    load, and leases are reference-counted so one coroutine never releases
+    the lease another still relies on.
+    """
+
+    def __init__(self, path: str, slots: int = 1024, slot_size: int = 8192, wait: float = 2.0) -> None:
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.wait = wait
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self._inflight: Dict[str, "asyncio.Future[Tuple[int, Any]]"] = {}
+        # Lease index -> loads of this process relying on it
+        self._leases: Dict[int, int] = {}
+        size = _HEADER_SIZE + slots * slot_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self._fd).st_size == 0:
+                    os.ftruncate(self._fd, size)
+                    os.pwrite(self._fd, _HEADER.pack(_MAGIC, _LAYOUT, slots, slot_size), 0)
+                header = _HEADER.unpack(os.pread(self._fd, _HEADER.size, 0))
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            if header != (_MAGIC, _LAYOUT, slots, slot_size) or os.fstat(self._fd).st_size != size:
+                raise OSError(f"{path} was created with a different layout; remove it to resize")
+            self._mm = mmap.mmap(self._fd, size)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def _slot(self, key: str) -> Tuple[bytes, int, int]:
+        digest = hashlib.sha256(key.encode()).digest()[:16]
+        index = int.from_bytes(digest[:8], "little") % self.slots
+        return digest, index, _HEADER_SIZE + index * self.slot_size
+
+    def _lock(self, offset: int, blocking: bool = True) -> bool:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.lockf(self._fd, flags, 1, offset)
+        except OSError:
+            return False
+        return True
+
+    def _unlock(self, offset: int) -> None:
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, offset)
+
+    def _acquire_lease(self, lease: int) -> bool:
+        held = self._leases.get(lease, 0)
+        if held == 0 and not self._lock(lease, blocking=False):
+            return False
+        self._leases[lease] = held + 1
+        return True
+
+    def _release_lease(self, lease: int) -> None:
+        held = self._leases.pop(lease) - 1
+        if held:
+            self._leases[lease] = held
+        else:
+            self._unlock(lease)
+
+    def version(self, key: str) -> int:
+        """Version of the live entry for ``key`` (0 if absent or expired), without reading it."""
+        digest, _, offset = self._slot(key)
+        seq, expires_at, _, slot_key = _SLOT.unpack_from(self._mm, offset)
+        if seq & 1 or slot_key != digest or expires_at <= time.time():
+            return 0
+        return seq
+
+    def get(self, key: str) -> Optional[Tuple[int, Any]]:
+        """``(version, value)`` of the live entry for ``key``."""
+        digest, _, offset = self._slot(key)
+        for _ in range(8):
+            seq, expires_at, length, slot_key = _SLOT.unpack_from(self._mm, offset)
+            if seq & 1:
+                # A writer is inside; it holds the slot for microseconds
+                continue
+            if seq == 0 or slot_key != digest or expires_at <= time.time():
+                return None
+            start = offset + _SLOT.size
+            payload = self._mm[start:start + length]
+            if _SEQ.unpack_from(self._mm, offset)[0] != seq:
+                continue
+            try:
+                return seq, json.loads(payload)
+            except ValueError:
+                return None
+        return None
+
+    def set(self, key: str, value: Any, expires_at: float) -> int:
+        """Publish ``value``; returns its version, 0 if it was not published.
+
+        Runs on the event loop, so the slot lock is tried once without
+        waiting: if another worker is writing the slot, this value is not
+        published and the other worker's is kept.
+        """
+        payload = json.dumps(value, separators=(",", ":")).encode()
+        if len(payload) > self.slot_size - _SLOT.size or expires_at <= time.time():
+            return 0
+        digest, index, offset = self._slot(key)
+        if not self._lock(index, blocking=False):
+            return 0
+        try:
+            seq = _SEQ.unpack_from(self._mm, offset)[0]
+            # Make the sequence odd first so readers skip the half-written slot
+            seq = seq + 1 if seq % 2 == 0 else seq
+            _SEQ.pack_into(self._mm, offset, seq)
+            start = offset + _SLOT.size
+            self._mm[start:start + len(payload)] = payload
+            _SLOT.pack_into(self._mm, offset, seq, expires_at, len(payload), digest)
+            _SEQ.pack_into(self._mm, offset, seq + 1)
+        finally:
+            self._unlock(index)
+        return seq + 1
+
+    def _newer(self, key: str, newer_than: int) -> Optional[Tuple[int, Any]]:
+        # Compare versions first: a version the caller already holds is not read again
+        if self.version(key) <= newer_than:
+            return None
+        hit = self.get(key)
+        return hit if hit is not None and hit[0] > newer_than else None
+
+    async def load(self, key: str, loader: Callable[[], Awaitable[Any]], expires_at: float, newer_than: int = 0) -> Tuple[int, Any]:
+        """The shared value of ``key`` if it is newer than ``newer_than``, else load and publish it.
+
+        Only the worker holding the key's lease calls ``loader``; the others poll
+        the slot for up to ``wait`` seconds before loading on their own.
+        Concurrent callers in this process share a single load.
+        """
+        hit = self._newer(key, newer_than)
+        if hit is not None:
+            self.hits += 1
+            return hit
+        self.misses += 1
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, loader, expires_at, newer_than))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], expires_at: float, newer_than: int) -> Tuple[int, Any]:
+        _, index, _ = self._slot(key)
+        lease = self.slots + index
+        leased = self._acquire_lease(lease)
+        if not leased:
+            self.waits += 1
+            deadline = time.monotonic() + self.wait
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+                hit = self._newer(key, newer_than)
+                if hit is not None:
+                    return hit
+                leased = self._acquire_lease(lease)
+                if leased:
+                    # The other worker gave up (or crashed): load it here
+                    break
+        try:
+            value = await loader()
+            # Publish before releasing the lease so waiters find it
+            return self.set(key, value, expires_at), value
+        finally:
+            if leased:
+                self._release_lease(lease)
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+
+_caches: Dict[str, SharedCache] = {}
+
+
+def open_shared_cache(cfg: Optional[SharedCacheConfig]) -> Optional[SharedCache]:
+    """The process-wide cache for ``cfg.path``, or None to fall back to per-process caching."""
+    if cfg is None or not cfg.path:
+        return None
+    cache = _caches.get(cfg.path)
+    if cache is not None:
+        return cache
+    if fcntl is None:
+        log.warning("shared_cache_unavailable", "共享缓存不可用（缺少 fcntl），使用进程内缓存")
+        return None
+    try:
+        cache = SharedCache(cfg.path, cfg.slots, cfg.slot_size, cfg.wait)
+    except (OSError, ValueError) as e:
+        log.warning("shared_cache_unavailable", "共享缓存不可用，使用进程内缓存", path=cfg.path, error=str(e))
+        return None
+    _caches[cfg.path] = cache
+    return cache
+
+
+def _collect_shared_cache_metrics() -> List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]:
+    samples: List[Tuple[Dict[str, str], float]] = []
+    for cache in list(_caches.values()):
+        samples.append(({"result": "hit"}, cache.hits))
+        samples.append(({"result": "miss"}, cache.misses))
+        samples.append(({"result": "wait"}, cache.waits))
+    return [("sso_shared_cache_requests_total", "counter", "Cross-worker cache lookups by result.", samples)]
+
+
+REGISTRY.register_collector(_collect_shared_cache_metrics)
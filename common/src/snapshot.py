@@ -0,0 +1,58 @@
+import hashlib
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+from itsdangerous import BadSignature, Serializer
+
+
+class DiscoverySnapshot:
+    """Signed on-disk copy of an issuer's discovery document and JWKS.
+
+    Lets a freshly started worker serve logins before it has talked to the
+    IdP. The file is HMAC-signed so a tampered snapshot cannot inject keys,
+    and replaced atomically so concurrent workers never read a partial file.
+    """
+
+    def __init__(self, directory: str, issuer: str, secret: str) -> None:
+        name = hashlib.sha256(issuer.encode()).hexdigest()[:16]
+        self.path = os.path.join(directory, f"oidc-{name}.json")
+        self.issuer = issuer
+        self.serializer = Serializer(secret, salt="oidc-snapshot")
+        # Content last read from or written to disk, to skip identical rewrites
+        self._saved: Optional[Dict[str, Any]] = None
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                data = self.serializer.loads(fh.read())
+        except (OSError, ValueError, BadSignature):
+            return None
+        if data.get("issuer") != self.issuer or not data.get("discovery") or not data.get("jwks"):
+            return None
+        self._saved = {"discovery": data["discovery"], "jwks": data["jwks"]}
+        return data
+
+    def save(self, discovery: Dict[str, Any], jwks: Dict[str, Any]) -> bool:
+        content = {"discovery": discovery, "jwks": jwks}
+        if content == self._saved:
+            return False
+        payload = self.serializer.dumps(dict(content, issuer=self.issuer, saved_at=int(time.time())))
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".oidc-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write(payload)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self._saved = content
+        return True
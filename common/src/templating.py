@@ -0,0 +1,96 @@
+import dataclasses
+import hashlib
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, Response, StreamingResponse
+
+from .config import TemplateConfig
+
+
+_SCALARS = (str, int, float, bool, type(None))
+
+
+def _context_key(name: str, value: Any) -> Any:
+    # By content, never by identity: ids are reused and live objects change
+    if isinstance(value, _SCALARS):
+        return value
+    key = getattr(value, "cache_key", None)
+    if key is not None:
+        return key
+    if isinstance(value, (tuple, frozenset)) or (dataclasses.is_dataclass(value) and not isinstance(value, type)):
+        # Frozen dataclasses and tuples hash by content
+        hash(value)
+        return value
+    raise TypeError(f"cached page context {name!r} needs a hashable value or a cache_key, got {type(value).__name__}")
+
+
+class PageTemplates:
+    """Jinja2 rendering for the portal and app pages.
+
+    - Compiled templates are kept as bytecode in ``bytecode_dir`` so a restart
+      does not recompile them.
+    - :meth:`cached` renders a page once per distinct context and serves the
+      stored bytes with an ETag, answering ``If-None-Match`` with 304.
+    - :meth:`render` renders per request, optionally async or streamed.
+    """
+
+    # Distinct cached pages; the context may follow the Host header
+    max_cached = 64
+
+    def __init__(self, directory: str, cfg: Optional[TemplateConfig] = None) -> None:
+        self.cfg = cfg or TemplateConfig()
+        bytecode_cache = None
+        enable_async = self.cfg.render_mode != "sync"
+        if self.cfg.bytecode_dir:
+            # Jinja's cache key ignores enable_async, yet sync and async bytecode differ
+            cache_dir = os.path.join(self.cfg.bytecode_dir, "async" if enable_async else "sync")
+            os.makedirs(cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        self.env = Environment(
+            loader=FileSystemLoader(directory),
+            autoescape=True,
+            bytecode_cache=bytecode_cache,
+            enable_async=enable_async,
+        )
+        self._pages: Dict[Tuple[str, Tuple[Tuple[str, Any], ...]], Tuple[bytes, str]] = {}
+
+    async def render(self, request: Request, name: str, **context: Any) -> Response:
+        template = self.env.get_template(name)
+        context["request"] = request
+        if self.cfg.render_mode == "stream":
+            # First bytes leave before the whole page is rendered
+            return StreamingResponse(template.generate_async(context), media_type="text/html; charset=utf-8")
+        if self.cfg.render_mode == "async":
+            return HTMLResponse(await template.render_async(context))
+        return HTMLResponse(template.render(context))
+
+    async def cached(self, request: Request, name: str, **context: Any) -> Response:
+        """A page identical for every visitor with this context (e.g. anonymous landing pages).
+
+        Context values are told apart by content: scalars, tuples, frozen
+        dataclasses (e.g. an app spec), or objects with a ``cache_key`` (e.g.
+        the app registry, whose key changes when a reload changes its apps).
+        """
+        if not self.cfg.cache_anonymous:
+            return await self.render(request, name, **context)
+        key = (name, tuple((k, _context_key(k, v)) for k, v in sorted(context.items())))
+        page = self._pages.get(key)
+        if page is None:
+            template = self.env.get_template(name)
+            if self.cfg.render_mode == "sync":
+                body = template.render(context).encode()
+            else:
+                body = (await template.render_async(context)).encode()
+            page = (body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+            if len(self._pages) >= self.max_cached:
+                self._pages.clear()
+            self._pages[key] = page
+        body, etag = page
+        # Same URL serves the signed-in page to others: revalidate every time, keyed by cookie
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Cookie"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="text/html; charset=utf-8", headers=headers)
@@ -1,44 +1,109 @@
 import os
 import secrets
 import time
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import RedirectResponse, HTMLResponse
-from fastapi.templating import Jinja2Templates
 
-from common.src.config import load_portal_config, load_app1_config, load_app2_config
-from common.src.oidc import OIDCClient
+from common.src.callback import complete_login
+from common.src.cache import TTLCache
+from common.src.handoff import issue_ticket
+from common.src.log import log
+from common.src.logout import LogoutFanout, handle_backchannel_logout
+from common.src.metrics import install_metrics
+from common.src.oidc import OIDCClient, user_from_claims
+from common.src.registry import AppRegistry, RelyingParty, replace_client
+from common.src.prewarm import AppTokenPrewarmer
+from common.src.renewal import TokenRenewer, session_tokens
+from common.src.revocation import open_revocation_index
+from common.src.session import SessionMiddleware
+from common.src.session_store import build_session_store
+from common.src.settings import ConfigRegistry, Settings, load_settings
+from common.src.templating import PageTemplates
 from .session import SessionManager
-from itsdangerous import URLSafeSerializer
 
 
-app = FastAPI(title="Portal")
-
-templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "..", "templates"))
-
-_cfg = load_portal_config()
-_oidc = OIDCClient(_cfg.issuer, _cfg.client_id, _cfg.client_secret, _cfg.redirect_uri, _cfg.organization_name, _cfg.application_name)
-_session = SessionManager(_cfg.cookie_secret, _cfg.cookie_secure, _cfg.cookie_domain or "")
-
-# For IdP-initiated SSO to apps
-_app1_cfg = load_app1_config()
-_app2_cfg = load_app2_config()
-_oidc_app1 = OIDCClient(_app1_cfg.issuer, _app1_cfg.client_id, _app1_cfg.client_secret, _app1_cfg.redirect_uri, _app1_cfg.organization_name, _app1_cfg.application_name)
-_oidc_app2 = OIDCClient(_app2_cfg.issuer, _app2_cfg.client_id, _app2_cfg.client_secret, _app2_cfg.redirect_uri, _app2_cfg.organization_name, _app2_cfg.application_name)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 每个 OIDCClient 共享一个连接池，整个进程生命周期内复用到 Casdoor 的长连接
+    await _oidc.open()
+    await _registry.open()
+    # kill -HUP 重新加载配置：校验通过后原子替换，进行中的请求不受影响
+    if _fanout is not None:
+        await _fanout.start()
+    _config.install_sighup()
+    try:
+        yield
+    finally:
+        _config.remove_sighup()
+        if _fanout is not None:
+            await _fanout.aclose()
+        if _renewer is not None:
+            await _renewer.aclose()
+        if _prewarmer is not None:
+            await _prewarmer.aclose()
+        await _registry.aclose()
+        await _oidc.aclose()
+        _session.close()
+
+
+app = FastAPI(title="Portal", lifespan=lifespan)
+install_metrics(app, "portal")
+
+# 全部配置（环境变量 + SSO_CONFIG_FILE）一次性加载并校验；会话、Cookie 与模板配置需重启生效
+_config = ConfigRegistry(lambda: load_settings(portal=True))
+_settings = _config.settings
+templates = PageTemplates(os.path.join(os.path.dirname(__file__), "..", "templates"), _settings.templates)
+
+_cfg = _settings.portal
+_oidc = OIDCClient.from_config(_cfg, **_settings.oidc_options)
+# 在 access_token 过期前用 refresh_token 续期，/to/{app} 始终走快速路径
+_renewer = TokenRenewer(_oidc, _settings.token_renewal) if _settings.token_renewal.enabled else None
+_session = SessionManager(_cfg.cookie_secret, _cfg.cookie_secure, _cfg.cookie_domain or "", store=build_session_store(_settings.session_store), ttl=_settings.session_store.ttl, codec=_settings.session_codec, revocation=open_revocation_index(_settings.revocation), cache=_settings.session_cache)
+if _renewer is not None and _settings.handoff.tickets:
+    log.warning("token_renewal_unused", "已启用交接票据（HANDOFF_TICKETS=true），门户会话不保存 token，TOKEN_RENEWAL 不生效")
+elif _renewer is not None and _session.store is None:
+    log.warning("token_renewal_unused", "Cookie 会话（SESSION_BACKEND=cookie）不保存 refresh_token，TOKEN_RENEWAL 不生效")
+# 会话在处理函数首次读取时才解码，每个请求至多一次；/metrics 等路径不做会话处理
+app.add_middleware(SessionMiddleware, manager=_session)
+
+# For IdP-initiated SSO to apps: every app in SSO_APPS
+_registry = AppRegistry(list(_settings.apps), _settings.oidc_options)
+# 登录时为每个应用预先换取专属 token，首次进入应用无需再访问 Casdoor
+# 仅用于 ?sso_token= 交接；启用交接票据（默认）时不预取，票据不需要应用 token
+_prewarmer = AppTokenPrewarmer(_oidc, _registry, _settings.prewarm) if _settings.prewarm.enabled else None
+if _prewarmer is not None and _settings.handoff.tickets:
+    log.warning("prewarm_unused", "已启用交接票据（HANDOFF_TICKETS=true），PREWARM_APP_TOKENS 不生效")
+# 门户退出 / Casdoor 后端通道注销时，并发通知每个应用的 /backchannel-logout
+_fanout = LogoutFanout(_registry, _settings.logout_fanout) if _settings.logout_fanout.enabled else None
+# 已处理的注销令牌 jti，防止重放
+_seen_logout_tokens: TTLCache[bool] = TTLCache(10000)
+
+
+async def _reload(old: Settings, new: Settings) -> None:
+    global _oidc
+    if new.portal != old.portal or new.oidc_options != old.oidc_options:
+        # 新客户端沿用旧客户端的发现文档 / JWKS / userinfo 缓存，旧客户端稍后关闭
+        _oidc = await replace_client(_oidc, OIDCClient.from_config(new.portal, **new.oidc_options))
+        if _renewer is not None:
+            _renewer.oidc = _oidc
+        if _prewarmer is not None:
+            _prewarmer.oidc = _oidc
+    await _registry.apply(list(new.apps), new.oidc_options)
+
+
+_config.on_reload(_reload)
 
 
 @app.get("/")
 async def index(request: Request):
     sess = _session.get_session(request) or {}
-    return templates.TemplateResponse(
-        "index.html",
-        {
-            "request": request,
-            "user": sess.get("user"),
-            "logged_in": bool(sess.get("user")),
-        },
-    )
+    if not sess.get("user"):
+        # 未登录的首页对所有访客相同：只渲染一次，之后按 ETag 返回缓存内容
+        return await templates.cached(request, "index.html", user=None, logged_in=False, apps=_registry)
+    return await templates.render(request, "index.html", user=sess.get("user"), logged_in=True, apps=list(_registry))
 
 
 def _abs_callback_url(request: Request, path: str) -> str:
@@ -54,7 +119,7 @@ async def login(request: Request):
     auth_url = await _oidc.build_authorize_url(state, redirect_uri=redirect_uri)
     # 在真正返回给浏览器的重定向响应上设置 cookie，避免被覆盖
     response = RedirectResponse(url=auth_url)
-    _session.set_session(response, {"state": state})
+    _session.set_session(response, {"state": state}, request)
     return response
 
 
@@ -65,132 +130,126 @@ async def callback(request: Request, code: Optional[str] = None, state: Optional
     if not code or not state or state != saved_state:
         # 清理无效会话并回首页
         response = RedirectResponse("/")
-        _session.clear_session(response)
+        _session.clear_session(response, request)
         return response
     redirect_uri = _abs_callback_url(request, "/callback")
-    token = await _oidc.exchange_code(code, redirect_uri=redirect_uri)
-    id_token = token.get("id_token")
-    access_token = token.get("access_token")
-    claims = {}
-    try:
-        if id_token:
-            claims = await _oidc.verify_id_token(id_token)
-    except Exception:
-        pass
-    userinfo = {}
-    if access_token:
-        try:
-            userinfo = await _oidc.fetch_userinfo(access_token)
-        except Exception:
-            userinfo = {}
+    # 换取 token 后并发执行 ID Token 验证与 userinfo 获取，各阶段独立超时
+    result = await complete_login(_oidc, code, redirect_uri, _config.settings.callback)
     # 只保留必要的轻量字段，避免 Cookie 过大
-    base_user = userinfo or claims or {}
-    user = {
-        "username": base_user.get("username") or base_user.get("preferred_username"),
-        "name": base_user.get("name"),
-        "email": base_user.get("email"),
-        "sub": base_user.get("sub"),
-    }
+    user = user_from_claims(result.profile)
+    data: Dict[str, Any] = {"user": user}
+    if not _config.settings.handoff.tickets:
+        # 仅 ?sso_token= 交接需要门户保存 token（交接票据只携带用户信息）；
+        # refresh_token 长期有效，只保存在服务端会话中，Cookie 会话只签名不加密
+        data.update(session_tokens(result.token, refresh_token=_session.store is not None))
+    # 本次登录的会话标识：Casdoor 未提供 sid 时由门户生成，交接出去的应用会话随之携带，退出时据此只吊销本次登录
+    data["oidc_sid"] = result.claims.get("sid") or secrets.token_urlsafe(16)
+    if _prewarmer is not None and data.get("access_token"):
+        data["login_id"] = secrets.token_urlsafe(12)
+        _prewarmer.start(data["login_id"], data["access_token"])
 
     response = RedirectResponse(url="/")
-    # 保存用户信息和tokens用于SSO
-    _session.set_session(response, {
-        "user": user, 
-        "id_token": id_token,
-        "access_token": access_token
-    })
+    # 保存用户信息（及 ?sso_token= 交接所需的 tokens）用于SSO
+    _session.set_session(response, data, request)
+    # 各阶段耗时通过 Server-Timing 暴露，便于在浏览器开发者工具中查看
+    response.headers["Server-Timing"] = result.server_timing()
     return response
 
 
 @app.get("/logout")
-async def logout():
+async def logout(request: Request, everywhere: bool = False):
+    sess = _session.get_session(request) or {}
     response = RedirectResponse(url="/")
-    _session.clear_session(response)
+    # 吊销当前门户会话（含被复制的 Cookie）
+    _session.clear_session(response, request)
+    if everywhere:
+        # 在所有设备上退出：该用户此前在门户与各应用的全部会话失效
+        sub = (sess.get("user") or {}).get("sub")
+        _session.revoke_user(sub)
+        if _fanout is not None:
+            _fanout.notify(sub=sub)
+        return response
+    # 只退出本次登录：由本次登录交接出去的应用会话一并失效，其他设备上的登录不受影响
+    sid = sess.get("oidc_sid")
+    _session.revoke_idp_session(sid)
+    if _fanout is not None:
+        # 其他主机上的应用不共享吊销索引，通过后端通道逐个通知
+        _fanout.notify(sid=sid)
     return response
 
 
-def _abs_url(request: Request, port: int, path: str) -> str:
-    scheme = request.url.scheme
-    host = request.headers.get("x-forwarded-host") or request.headers.get("host") or request.client.host
-    base_host = host.split(":")[0]
-    return f"{scheme}://{base_host}:{port}{path}"
+@app.post("/backchannel-logout")
+async def backchannel_logout(request: Request):
+    # Casdoor 的后端通道注销：校验 logout_token，吊销本地会话并转发给全部应用
+    response, claims = await handle_backchannel_logout(request, _oidc, _session, _seen_logout_tokens)
+    if claims is not None:
+        log.info("backchannel_logout", "收到 Casdoor 后端通道注销", sub=claims.get("sub"), sid=claims.get("sid"))
+        if _fanout is not None:
+            _fanout.notify(sub=claims.get("sub"), sid=claims.get("sid"))
+    return response
 
 
-@app.get("/to/app1")
-async def to_app1(request: Request):
-    # 检查用户是否已在门户登录
-    sess = _session.get_session(request) or {}
-    if not sess.get("user"):
-        # 用户未登录，重定向到门户登录
-        return RedirectResponse("/login")
-    
-    # 获取用户的access_token和id_token
-    access_token = sess.get("access_token")
+async def _hand_off(request: Request, rp: RelyingParty, sess: dict, app_token: Optional[str] = None) -> RedirectResponse:
+    # 获取用户的access_token和id_token（有预取的应用专属 token 时优先使用）
+    access_token = app_token or sess.get("access_token")
     id_token = sess.get("id_token")
+    expires_at = sess.get("expires_at")
+    if not app_token and isinstance(expires_at, (int, float)) and expires_at <= time.time():
+        # 已过期且未能续期，目标应用无法校验该 token
+        access_token = None
     
     if not access_token:
         # 如果没有access_token，尝试静默授权获取
-        s = URLSafeSerializer(_app1_cfg.client_secret, salt="oidc-state")
-        state = s.dumps({"n": secrets.token_urlsafe(8), "ts": int(time.time())})
+        state = rp.state_signer.dumps({"n": secrets.token_urlsafe(8), "ts": int(time.time())})
         
-        redirect_uri = _abs_url(request, 9001, "/callback")
+        redirect_uri = rp.url(request, "/callback")
         extra = {"prompt": "none"}
         
         if id_token:
             extra["id_token_hint"] = id_token
         
         try:
-            auth_url = await _oidc_app1.build_authorize_url(state, redirect_uri=redirect_uri, extra_params=extra)
+            auth_url = await rp.oidc.build_authorize_url(state, redirect_uri=redirect_uri, extra_params=extra)
             return RedirectResponse(auth_url)
         except Exception as e:
-            print(f"静默登录失败: {e}")
-            auth_url = await _oidc_app1.build_authorize_url(state, redirect_uri=redirect_uri)
+            log.warning("silent_login_failed", "静默登录失败", app=rp.name, error=str(e))
+            auth_url = await rp.oidc.build_authorize_url(state, redirect_uri=redirect_uri)
             return RedirectResponse(auth_url)
     
-    # 使用JWT Token传递方案：直接跳转到App1并传递token
-    app1_url = _abs_url(request, 9001, "/")
-    token_url = f"{app1_url}?sso_token={access_token}"
+    # 旧方案（HANDOFF_TICKETS=false）：直接跳转到目标应用并传递token，应用需访问 Casdoor 解析
+    token_url = f"{rp.url(request, '/')}?sso_token={access_token}"
     
-    print(f"使用JWT Token传递方案跳转到App1: {token_url}")
+    log.info("hand_off", "使用JWT Token传递方案跳转到目标应用", app=rp.name)
     return RedirectResponse(token_url)
 
 
-@app.get("/to/app2")
-async def to_app2(request: Request):
+@app.get("/to/{app_name}")
+async def to_app(request: Request, app_name: str):
+    rp = _registry.get(app_name)
+    if rp is None:
+        raise HTTPException(status_code=404, detail=f"Unknown application: {app_name}")
+
     # 检查用户是否已在门户登录
     sess = _session.get_session(request) or {}
     if not sess.get("user"):
         # 用户未登录，重定向到门户登录
         return RedirectResponse("/login")
-    
-    # 获取用户的access_token和id_token
-    access_token = sess.get("access_token")
-    id_token = sess.get("id_token")
-    
-    if not access_token:
-        # 如果没有access_token，尝试静默授权获取
-        s = URLSafeSerializer(_app2_cfg.client_secret, salt="oidc-state")
-        state = s.dumps({"n": secrets.token_urlsafe(8), "ts": int(time.time())})
-        
-        redirect_uri = _abs_url(request, 9002, "/callback")
-        extra = {"prompt": "none"}
-        
-        if id_token:
-            extra["id_token_hint"] = id_token
-        
-        try:
-            auth_url = await _oidc_app2.build_authorize_url(state, redirect_uri=redirect_uri, extra_params=extra)
-            return RedirectResponse(auth_url)
-        except Exception as e:
-            print(f"静默登录失败: {e}")
-            auth_url = await _oidc_app2.build_authorize_url(state, redirect_uri=redirect_uri)
-            return RedirectResponse(auth_url)
-    
-    # 使用JWT Token传递方案：直接跳转到App2并传递token
-    app2_url = _abs_url(request, 9002, "/")
-    token_url = f"{app2_url}?sso_token={access_token}"
-    
-    print(f"使用JWT Token传递方案跳转到App2: {token_url}")
-    return RedirectResponse(token_url)
-
 
+    if _config.settings.handoff.tickets:
+        # 一次性交接票据：携带已解析的用户信息，应用本地校验即可，不经过 Casdoor，URL 中也不出现 access_token
+        # 此模式下门户会话不保存 token，下面的续期与预取只用于 ?sso_token= 交接
+        ticket = issue_ticket(rp, sess["user"], sess.get("oidc_sid"))
+        log.info("hand_off", "使用一次性票据跳转到目标应用", app=rp.name)
+        return RedirectResponse(f"{rp.url(request, '/')}?sso_ticket={ticket}")
+
+    # 临近过期时后台续期，已过期则先用 refresh_token 换取新 token
+    renewed = await _renewer.ensure_fresh(sess) if _renewer is not None else None
+    if renewed:
+        sess = {**sess, **renewed}
+    app_token = None
+    if _prewarmer is not None and sess.get("login_id"):
+        app_token = await _prewarmer.get(sess["login_id"], rp.name)
+    response = await _hand_off(request, rp, sess, app_token)
+    if renewed:
+        _session.set_session(response, sess, request)
+    return response
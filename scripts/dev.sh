@@ -1,18 +1,13 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-# Load env if exists
+# Config file: read by the services themselves (SSO_CONFIG_FILE) so that
+# `kill -HUP <pid>` reloads it without a restart
 ENV_FILE_DIR="$(cd "$(dirname "$0")"/.. && pwd)/.env"
 if [ -f "$ENV_FILE_DIR/.env.local" ]; then
-  set -a
-  # shellcheck disable=SC1090
-  source "$ENV_FILE_DIR/.env.local"
-  set +a
+  export SSO_CONFIG_FILE="$ENV_FILE_DIR/.env.local"
 elif [ -f "$ENV_FILE_DIR/.env" ]; then
-  set -a
-  # shellcheck disable=SC1090
-  source "$ENV_FILE_DIR/.env"
-  set +a
+  export SSO_CONFIG_FILE="$ENV_FILE_DIR/.env"
 else
   echo "[dev.sh] 未找到环境文件: $ENV_FILE_DIR/.env.local 或 $ENV_FILE_DIR/.env"
   echo "请先创建并填写凭证: cp $ENV_FILE_DIR/.env.example $ENV_FILE_DIR/.env.local"
@@ -0,0 +1,18 @@
+from typing import Callable
+
+import pytest
+
+from common.src.config import AppSpec, BaseAppConfig
+
+
+@pytest.fixture
+def make_spec() -> Callable[..., AppSpec]:
+    def make(name: str, title: str = "", secret: str = "secret") -> AppSpec:
+        config = BaseAppConfig(
+            issuer="http://idp.invalid", client_id=f"{name}-client", client_secret=secret,
+            redirect_uri=f"http://127.0.0.1:9001/{name}/callback", cookie_secure=False, cookie_domain=None,
+            cookie_secret="cookie", organization_name="built-in", application_name=name,
+        )
+        return AppSpec(name=name, config=config, title=title or name, label=title or name, color="#000")
+
+    return make
@@ -0,0 +1,116 @@
+import asyncio
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+import pytest
+from itsdangerous import TimestampSigner
+
+from common.src.handoff import TicketReplayCache, issue_ticket, redeem_ticket
+from common.src.oidc import OIDCClient
+from common.src.registry import RelyingParty
+
+
+USER = {"username": "alice", "sub": "user-1"}
+
+
+def _redeem(rp: RelyingParty, ticket: str, replay: TicketReplayCache) -> Optional[Dict[str, Any]]:
+    return asyncio.run(redeem_ticket(rp, ticket, replay, ttl=30))
+
+
+@pytest.fixture
+def rp(make_spec) -> RelyingParty:
+    spec = make_spec("app1")
+    return RelyingParty(spec, OIDCClient.from_config(spec.config), {})
+
+
+def test_ticket_is_redeemed_once(rp: RelyingParty) -> None:
+    replay = TicketReplayCache()
+    ticket = issue_ticket(rp, USER, "idp-sid")
+    claims = _redeem(rp, ticket, replay)
+    assert claims["user"] == USER and claims["sid"] == "idp-sid"
+    assert _redeem(rp, ticket, replay) is None
+
+
+def test_expired_ticket_is_rejected(rp: RelyingParty, monkeypatch) -> None:
+    monkeypatch.setattr(TimestampSigner, "get_timestamp", lambda self: int(time.time()) - 60)
+    ticket = issue_ticket(rp, USER)
+    monkeypatch.undo()
+    assert _redeem(rp, ticket, TicketReplayCache()) is None
+
+
+def test_ticket_for_another_app_is_rejected(rp: RelyingParty, make_spec) -> None:
+    other_secret = make_spec("app2", secret="other-secret")
+    other = RelyingParty(other_secret, OIDCClient.from_config(other_secret.config), {})
+    assert _redeem(rp, issue_ticket(other, USER), TicketReplayCache()) is None
+    # Same secret, different client_id: the audience does not match
+    same_secret = make_spec("app3")
+    shared = RelyingParty(same_secret, OIDCClient.from_config(same_secret.config), {})
+    assert _redeem(rp, issue_ticket(shared, USER), TicketReplayCache()) is None
+
+
+def test_tampered_ticket_is_rejected(rp: RelyingParty) -> None:
+    ticket = issue_ticket(rp, USER)
+    # Not the last character: it may only carry padding bits
+    i = ticket.rindex(".") + 1
+    assert _redeem(rp, ticket[:i] + ("A" if ticket[i] != "A" else "B") + ticket[i + 1:], TicketReplayCache()) is None
+
+
+def test_sqlite_replay_cache_is_shared_between_processes(rp: RelyingParty, tmp_path) -> None:
+    path = str(tmp_path / "handoff.db")
+    first, second = TicketReplayCache(path), TicketReplayCache(path)
+    ticket = issue_ticket(rp, USER)
+    assert _redeem(rp, ticket, first) is not None
+    assert _redeem(rp, ticket, second) is None
+    first.close()
+    second.close()
+
+
+def test_locked_store_does_not_burn_the_ticket(rp: RelyingParty, tmp_path) -> None:
+    path = str(tmp_path / "handoff.db")
+    replay = TicketReplayCache(path)
+    ticket = issue_ticket(rp, USER)
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN EXCLUSIVE")
+    assert asyncio.run(replay.claim("jti", time.time() + 30)) is None
+    assert _redeem(rp, ticket, replay) is None
+    blocker.execute("ROLLBACK")
+    blocker.close()
+    # Not recorded while the store was locked: the retry succeeds, once
+    assert asyncio.run(replay.claim("jti", time.time() + 30)) is True
+    assert _redeem(rp, ticket, replay) is not None
+    assert _redeem(rp, ticket, replay) is None
+    replay.close()
+
+
+def test_full_memory_cache_rejects_instead_of_forgetting() -> None:
+    replay = TicketReplayCache(max_entries=2)
+
+    async def scenario() -> None:
+        assert await replay.claim("a", time.time() + 30) is True
+        assert await replay.claim("b", time.time() + 30) is True
+        # Evicting "a" would let it be replayed within its TTL
+        assert await replay.claim("c", time.time() + 30) is None
+        assert await replay.claim("a", time.time() + 30) is False
+        # Expired IDs make room again
+        replay._seen["a"] = replay._seen["b"] = time.time() - 1
+        assert await replay.claim("c", time.time() + 30) is True
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_insert_runs_off_the_event_loop(tmp_path) -> None:
+    replay = TicketReplayCache(str(tmp_path / "handoff.db"))
+
+    async def scenario() -> None:
+        replay._lock.acquire()
+        claim = asyncio.ensure_future(replay.claim("jti", time.time() + 30))
+        await asyncio.sleep(0.05)
+        # Waiting in a worker thread while the loop keeps serving
+        assert not claim.done()
+        replay._lock.release()
+        assert await claim is True
+        assert await replay.claim("jti", time.time() + 30) is False
+
+    asyncio.run(scenario())
+    replay.close()
@@ -0,0 +1,115 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from common.src.jwks import JWKSKeyStore
+
+
+def _jwk(kid: str) -> Dict[str, Any]:
+    return {"kty": "oct", "kid": kid, "alg": "HS256", "k": "c2VjcmV0LWtleQ"}
+
+
+class _Fetcher:
+    """Serves ``kids`` as the IdP's key set and counts fetches."""
+
+    def __init__(self, *kids: str) -> None:
+        self.kids: List[str] = list(kids)
+        self.calls = 0
+        self.fail = False
+        self.gate: Optional[asyncio.Event] = None
+
+    async def __call__(self) -> Dict[str, Any]:
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail:
+            raise OSError("jwks unreachable")
+        return {"keys": [_jwk(kid) for kid in self.kids]}
+
+
+def test_concurrent_first_lookups_share_one_fetch() -> None:
+    fetch = _Fetcher("k1")
+    store = JWKSKeyStore(fetch)
+
+    async def scenario() -> None:
+        await asyncio.gather(*(store.get_keys("k1", "HS256") for _ in range(10)))
+
+    asyncio.run(scenario())
+    assert fetch.calls == 1
+    assert store.misses == 10
+
+
+def test_unknown_kid_refetches_at_most_once_per_interval() -> None:
+    fetch = _Fetcher("k1")
+    store = JWKSKeyStore(fetch, min_refresh_interval=30)
+
+    async def scenario() -> None:
+        await store.get_keys("k1", "HS256")
+        # Rotation: the new kid is picked up at once, without waiting for the TTL
+        fetch.kids = ["k1", "k2"]
+        assert len(await store.get_keys("k2", "HS256")) == 1
+        assert fetch.calls == 2
+        # Tokens with made-up kids cannot make every request hit the IdP
+        for _ in range(5):
+            with pytest.raises(KeyError):
+                await store.get_keys("forged", "HS256")
+        assert fetch.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_unknown_kid_refetch_failure_keeps_current_keys() -> None:
+    fetch = _Fetcher("k1")
+    store = JWKSKeyStore(fetch, min_refresh_interval=0)
+
+    async def scenario() -> None:
+        await store.get_keys("k1", "HS256")
+        fetch.fail = True
+        with pytest.raises(KeyError):
+            await store.get_keys("k2", "HS256")
+        assert len(await store.get_keys("k1", "HS256")) == 1
+
+    asyncio.run(scenario())
+    assert store.kids == ["k1"]
+
+
+def test_stale_keys_are_served_while_revalidating() -> None:
+    fetch = _Fetcher("k1")
+    store = JWKSKeyStore(fetch, ttl=60)
+
+    async def scenario() -> None:
+        await store.get_keys("k1", "HS256")
+        store._fetched_at -= 61
+        fetch.gate = asyncio.Event()
+        fetch.kids = ["k1", "k2"]
+        # Answered from the stale set without waiting for the slow IdP
+        assert len(await asyncio.wait_for(store.get_keys("k1", "HS256"), 1)) == 1
+        assert store.stale_hits == 1
+        assert fetch.calls == 2
+        # Further stale lookups join the revalidation already in flight
+        await store.get_keys("k1", "HS256")
+        assert fetch.calls == 2
+        fetch.gate.set()
+        await store._inflight
+        assert store.kids == ["k1", "k2"]
+        await store.get_keys("k2", "HS256")
+        assert store.hits == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_revalidation_keeps_stale_keys() -> None:
+    fetch = _Fetcher("k1")
+    store = JWKSKeyStore(fetch, ttl=60)
+
+    async def scenario() -> None:
+        await store.get_keys("k1", "HS256")
+        store._fetched_at -= 61
+        fetch.fail = True
+        assert len(await store.get_keys("k1", "HS256")) == 1
+        await asyncio.gather(store._inflight, return_exceptions=True)
+        assert len(await store.get_keys("k1", "HS256")) == 1
+        assert store.stale_hits == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,171 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+from jose import jwt
+from starlette.requests import Request
+
+from common.src.cache import TTLCache
+from common.src.config import LogoutFanoutConfig, RevocationConfig
+from common.src.logout import LogoutFanout, handle_backchannel_logout
+from common.src.registry import AppRegistry
+from common.src.revocation import RevocationIndex
+from common.src.session import BaseSessionManager
+
+
+class _IdP:
+    def __init__(self, claims: Dict[str, Any]) -> None:
+        self.claims = claims
+
+    async def verify_logout_token(self, logout_token: str) -> Dict[str, Any]:
+        return dict(self.claims, jti=logout_token, iat=int(time.time()), iss="http://idp.invalid")
+
+
+def _request(logout_token: str) -> Request:
+    body = f"logout_token={logout_token}".encode()
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request({"type": "http", "method": "POST", "path": "/backchannel-logout", "headers": []}, receive)
+
+
+def _backchannel_logout(claims: Dict[str, Any]) -> RevocationIndex:
+    revocation = RevocationIndex(RevocationConfig(backend="memory"), gc_interval=0)
+    manager = BaseSessionManager("secret", revocation=revocation)
+    response, accepted = asyncio.run(handle_backchannel_logout(_request("t1"), _IdP(claims), manager, TTLCache(16)))
+    assert response.status_code == 200 and accepted is not None
+    return revocation
+
+
+def test_sid_revokes_only_that_login() -> None:
+    revocation = _backchannel_logout({"sub": "u1", "sid": "idp1"})
+    assert revocation.is_revoked("sid:idp1", 0.0)
+    # The user's sessions on other devices stay valid
+    assert not revocation.is_revoked("sub:u1", 0.0)
+
+
+def test_sub_alone_revokes_every_session_of_the_user() -> None:
+    revocation = _backchannel_logout({"sub": "u1"})
+    assert revocation.is_revoked("sub:u1", 0.0)
+
+
+@pytest.mark.parametrize("claims", [{"sub": "u1", "sid": "idp1"}, {"sub": "u1"}])
+def test_replayed_logout_token_is_rejected(claims: Dict[str, Any]) -> None:
+    manager = BaseSessionManager("secret")
+    seen: TTLCache[bool] = TTLCache(16)
+    first, _ = asyncio.run(handle_backchannel_logout(_request("t1"), _IdP(claims), manager, seen))
+    again, accepted = asyncio.run(handle_backchannel_logout(_request("t1"), _IdP(claims), manager, seen))
+    assert first.status_code == 200
+    assert again.status_code == 400 and accepted is None
+
+
+def _fanout(make_spec, handler: Callable[[str, int], int], apps: int = 2, **cfg: Any):
+    """A started fan-out to ``apps`` apps whose back-channel endpoints answer ``handler(app, attempt)``."""
+    registry = AppRegistry([make_spec(f"app{i}") for i in range(1, apps + 1)], {})
+    fanout = LogoutFanout(registry, LogoutFanoutConfig(**{"backoff": 0.01, "backoff_max": 0.02, **cfg}))
+    attempts: Counter = Counter()
+    tokens: List[Dict[str, Any]] = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        app = request.url.path.split("/")[1]
+        attempts[app] += 1
+        token = parse_qs(request.content.decode())["logout_token"][0]
+        tokens.append(jwt.get_unverified_claims(token))
+        return httpx.Response(handler(app, attempts[app]))
+
+    async def start() -> LogoutFanout:
+        await fanout.start()
+        await fanout.http.aclose()
+        fanout.http = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+        return fanout
+
+    return start, attempts, tokens
+
+
+def test_every_app_gets_a_logout_token(make_spec) -> None:
+    start, attempts, tokens = _fanout(make_spec, lambda app, attempt: 200, apps=3)
+
+    async def scenario() -> None:
+        fanout = await start()
+        assert fanout.notify(sid="idp1") == 3
+        await asyncio.wait_for(fanout.drain(), 2)
+        await fanout.aclose()
+
+    asyncio.run(scenario())
+    assert attempts == {"app1": 1, "app2": 1, "app3": 1}
+    assert sorted(token["aud"] for token in tokens) == ["app1-client", "app2-client", "app3-client"]
+    assert all(token["sid"] == "idp1" and "sub" not in token for token in tokens)
+    # A fresh token per delivery, so an app's replay cache never rejects a retry
+    assert len({token["jti"] for token in tokens}) == 3
+
+
+def test_failed_deliveries_are_retried_until_delivered(make_spec) -> None:
+    # app1 is briefly down, app2 rate-limits once, app3 is up
+    answers = {"app1": [503, 0, 200], "app2": [429, 200], "app3": [200]}
+
+    def handler(app: str, attempt: int) -> int:
+        status = answers[app][attempt - 1]
+        if status == 0:
+            raise httpx.ConnectError("connection refused")
+        return status
+
+    start, attempts, _ = _fanout(make_spec, handler, apps=3, retries=3)
+
+    async def scenario() -> None:
+        fanout = await start()
+        fanout.notify(sub="u1")
+        # drain covers deliveries waiting for their backoff timer, not just the queue
+        await asyncio.wait_for(fanout.drain(), 2)
+        assert not fanout._timers
+        await fanout.aclose()
+
+    asyncio.run(scenario())
+    assert attempts == {"app1": 3, "app2": 2, "app3": 1}
+
+
+def test_deliveries_give_up_after_the_retries(make_spec) -> None:
+    start, attempts, _ = _fanout(make_spec, lambda app, attempt: 500 if app == "app1" else 400, retries=2)
+
+    async def scenario() -> None:
+        fanout = await start()
+        fanout.notify(sub="u1")
+        await asyncio.wait_for(fanout.drain(), 2)
+        await fanout.aclose()
+
+    asyncio.run(scenario())
+    # 5xx: first attempt plus two retries; 4xx: the app rejected the token, not retried
+    assert attempts == {"app1": 3, "app2": 1}
+
+
+def test_full_queue_drops_deliveries(make_spec) -> None:
+    start, attempts, _ = _fanout(make_spec, lambda app, attempt: 200, apps=3, queue_size=2, concurrency=1)
+
+    async def scenario() -> None:
+        fanout = await start()
+        assert fanout.notify(sub="u1") == 2
+        await asyncio.wait_for(fanout.drain(), 2)
+        await fanout.aclose()
+
+    asyncio.run(scenario())
+    assert sum(attempts.values()) == 2
+
+
+def test_aclose_cancels_pending_retries(make_spec) -> None:
+    start, attempts, _ = _fanout(make_spec, lambda app, attempt: 503, apps=1, retries=5, backoff=10, backoff_max=10)
+
+    async def scenario() -> None:
+        fanout = await start()
+        fanout.notify(sub="u1")
+        while not fanout._timers:
+            await asyncio.sleep(0.001)
+        await asyncio.wait_for(fanout.aclose(), 1)
+        # Nothing left to wait for after shutdown
+        await asyncio.wait_for(fanout.drain(), 1)
+
+    asyncio.run(scenario())
+    assert attempts == {"app1": 1}
@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+import pytest
+
+from common.src.oidc import NotAJWTError, OIDCClient
+from common.src.resilience import CircuitOpenError
+from common.src.snapshot import DiscoverySnapshot
+
+
+def _client() -> OIDCClient:
+    return OIDCClient("http://idp.invalid", "app-client", "app-secret", "http://app.invalid/callback")
+
+
+@pytest.mark.parametrize("error", [
+    NotAJWTError("Invalid access token: not a JWT"),
+    httpx.ConnectError("jwks unreachable"),
+    CircuitOpenError("IdP circuit open"),
+])
+def test_resolve_access_token_falls_back_to_userinfo(error: Exception) -> None:
+    client = _client()
+
+    async def verify(token, audiences=None):
+        raise error
+
+    async def userinfo(token):
+        return {"sub": "user-1"}
+
+    client.verify_access_token = verify
+    client.fetch_userinfo = userinfo
+    assert asyncio.run(client.resolve_access_token("token")) == {"sub": "user-1"}
+
+
+def test_resolve_access_token_without_fallback_raises() -> None:
+    client = _client()
+
+    async def verify(token, audiences=None):
+        raise httpx.ConnectError("jwks unreachable")
+
+    client.verify_access_token = verify
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(client.resolve_access_token("token", userinfo_fallback=False))
+
+
+@pytest.mark.parametrize("reason", ["Signature verification failed.", "Invalid audience", "Signature has expired."])
+def test_resolve_access_token_rejects_invalid_jwt(reason: str) -> None:
+    client = _client()
+    userinfo_calls = []
+
+    async def verify(token, audiences=None):
+        raise ValueError(f"Invalid access token: {reason}")
+
+    async def userinfo(token):
+        userinfo_calls.append(token)
+        return {"sub": "user-1"}
+
+    client.verify_access_token = verify
+    client.fetch_userinfo = userinfo
+    # userinfo checks neither aud nor the local signature: a failed JWT must not be retried there
+    with pytest.raises(ValueError, match=reason):
+        asyncio.run(client.resolve_access_token("token"))
+    assert userinfo_calls == []
+
+
+def test_opaque_token_is_not_a_jwt() -> None:
+    client = _client()
+    client.discovery._set_config({"issuer": "http://idp.invalid"})
+    with pytest.raises(NotAJWTError):
+        asyncio.run(client.verify_access_token("opaque-access-token"))
+
+
+def test_failed_discovery_does_not_overwrite_the_snapshot(tmp_path) -> None:
+    discovery = _client().discovery
+    discovery.snapshot = DiscoverySnapshot(str(tmp_path), discovery.issuer, "secret")
+    document = {"issuer": discovery.issuer, "jwks_uri": "http://idp.invalid/jwks"}
+    old_jwks = {"keys": [{"kty": "oct", "kid": "k1", "alg": "HS256", "k": "c2VjcmV0"}]}
+    new_jwks = {"keys": [{"kty": "oct", "kid": "k2", "alg": "HS256", "k": "c2VjcmV0"}]}
+    discovery.snapshot.save(document, old_jwks)
+
+    async def failing_config():
+        raise httpx.ConnectError("discovery unreachable")
+
+    async def fetch_jwks():
+        return new_jwks
+
+    discovery._fetch_config = failing_config
+    discovery._fetch_jwks = fetch_jwks
+    asyncio.run(discovery.fetch_jwks())
+    # A restart can still start from the last good discovery document
+    assert discovery.snapshot.load()["discovery"] == document
+    discovery._set_config(document)
+    asyncio.run(discovery.fetch_jwks())
+    assert discovery.snapshot.load()["jwks"] == new_jwks
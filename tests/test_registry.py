@@ -0,0 +1,27 @@
+import asyncio
+
+from common.src.registry import AppRegistry
+
+
+def test_aclose_closes_clients_still_in_their_grace_period(make_spec) -> None:
+    async def scenario() -> None:
+        registry = AppRegistry([make_spec("app1")], {})
+        await registry.open()
+        old = registry["app1"].oidc
+        closed = []
+        close = old.aclose
+
+        async def recording_close() -> None:
+            closed.append(old)
+            await close()
+
+        old.aclose = recording_close
+        await registry.apply([make_spec("app1", secret="rotated")], {})
+        assert registry["app1"].oidc is not old
+        # Retired, but kept open for requests that still hold it
+        assert closed == [] and old.http is not None
+        await registry.aclose()
+        assert closed == [old]
+
+    asyncio.run(scenario())
+
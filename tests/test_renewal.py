@@ -0,0 +1,95 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from common.src.config import TokenRenewalConfig
+from common.src.renewal import TokenRenewer, session_tokens
+
+
+class _IdP:
+    """Stands in for OIDCClient.refresh_token and counts the grants."""
+
+    def __init__(self) -> None:
+        self.grants: List[str] = []
+        self.gate = asyncio.Event()
+
+    async def refresh_token(self, refresh_token: str) -> Dict[str, Any]:
+        self.grants.append(refresh_token)
+        await self.gate.wait()
+        n = len(self.grants)
+        return {"access_token": f"access-{n}", "refresh_token": f"refresh-{n}", "expires_in": 3600}
+
+
+def _session(expires_in: float, refresh_token: str = "refresh-0") -> Dict[str, Any]:
+    return {"access_token": "access-0", "refresh_token": refresh_token, "expires_at": time.time() + expires_in}
+
+
+def test_session_tokens_can_leave_out_the_refresh_token() -> None:
+    token = {"access_token": "a", "id_token": "i", "refresh_token": "r", "expires_in": 60}
+    assert session_tokens(token)["refresh_token"] == "r"
+    fields = session_tokens(token, refresh_token=False)
+    assert "refresh_token" not in fields
+    assert fields["access_token"] == "a" and fields["id_token"] == "i" and "expires_at" in fields
+
+
+def test_concurrent_renewals_of_one_session_share_a_grant() -> None:
+    async def scenario() -> None:
+        idp = _IdP()
+        renewer = TokenRenewer(idp, TokenRenewalConfig(skew=60))
+        expired = _session(-1)
+        waiters = [asyncio.ensure_future(renewer.ensure_fresh(dict(expired))) for _ in range(10)]
+        await asyncio.sleep(0)
+        idp.gate.set()
+        results = await asyncio.gather(*waiters)
+        assert idp.grants == ["refresh-0"]
+        assert all(result == results[0] for result in results)
+        assert results[0]["access_token"] == "access-1" and results[0]["refresh_token"] == "refresh-1"
+        # A request still carrying the old cookie gets the result instead of redeeming the token again
+        assert await renewer.ensure_fresh(dict(expired)) == results[0]
+        assert idp.grants == ["refresh-0"]
+        await renewer.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_sessions_with_different_refresh_tokens_are_not_merged() -> None:
+    async def scenario() -> None:
+        idp = _IdP()
+        idp.gate.set()
+        renewer = TokenRenewer(idp, TokenRenewalConfig(skew=60))
+        await asyncio.gather(renewer.ensure_fresh(_session(-1, "refresh-a")), renewer.ensure_fresh(_session(-1, "refresh-b")))
+        assert sorted(idp.grants) == ["refresh-a", "refresh-b"]
+        await renewer.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_token_near_expiry_is_renewed_in_the_background() -> None:
+    async def scenario() -> None:
+        idp = _IdP()
+        renewer = TokenRenewer(idp, TokenRenewalConfig(skew=60))
+        near = _session(30)
+        # The current token is still served; the grant runs without holding up the request
+        assert await renewer.ensure_fresh(dict(near)) is None
+        assert await renewer.ensure_fresh(dict(near)) is None
+        await asyncio.sleep(0)
+        assert idp.grants == ["refresh-0"]
+        idp.gate.set()
+        await asyncio.sleep(0.01)
+        assert (await renewer.ensure_fresh(dict(near)))["access_token"] == "access-1"
+        # Far from expiry nothing happens
+        assert await renewer.ensure_fresh(_session(3600, "refresh-x")) is None
+        assert idp.grants == ["refresh-0"]
+        await renewer.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_sessions_without_a_refresh_token_are_left_alone() -> None:
+    async def scenario() -> None:
+        idp = _IdP()
+        renewer = TokenRenewer(idp, TokenRenewalConfig(skew=60))
+        assert await renewer.ensure_fresh({"access_token": "a", "expires_at": time.time() - 1}) is None
+        assert idp.grants == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from common.src.config import ResilienceConfig
+from common.src.resilience import CircuitBreaker, CircuitOpenError, IdPCaller
+
+
+def _caller(handler, threshold: int = 2, reset: float = 0.05, retries: int = 0) -> IdPCaller:
+    caller = IdPCaller("test", ResilienceConfig(retries=retries, retry_backoff=0.001, retry_backoff_max=0.001, breaker_threshold=threshold, breaker_reset=reset))
+    caller.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return caller
+
+
+async def _get(caller: IdPCaller) -> httpx.Response:
+    return await caller.request(caller.http, "GET", "http://idp.invalid/x", "discovery")
+
+
+def test_breaker_opens_after_threshold_and_fails_fast() -> None:
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    caller = _caller(handler)
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(_get(caller))
+    assert caller.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(_get(caller))
+    assert len(calls) == 2
+
+
+def test_client_errors_do_not_trip_the_breaker() -> None:
+    caller = _caller(lambda request: httpx.Response(401), threshold=1)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(_get(caller))
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_get_is_retried_on_transport_errors() -> None:
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        if len(attempts) < 3:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200)
+
+    caller = _caller(handler, threshold=5, retries=2)
+    assert asyncio.run(_get(caller)).status_code == 200
+    assert len(attempts) == 3
+    assert caller.breaker.failures == 0
+
+
+def test_half_open_trial_success_closes() -> None:
+    status = [503]
+    caller = _caller(lambda request: httpx.Response(status[0]), threshold=1)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(_get(caller))
+    time.sleep(0.06)
+    assert caller.breaker.state == CircuitBreaker.HALF_OPEN
+    status[0] = 200
+    asyncio.run(_get(caller))
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_timed_out_trial_does_not_block_the_breaker() -> None:
+    hang = [False]
+
+    async def handler(request):
+        if hang[0]:
+            await asyncio.sleep(10)
+        return httpx.Response(503)
+
+    caller = _caller(handler, threshold=1)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(_get(caller))
+    time.sleep(0.06)
+    hang[0] = True
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(_get(caller), 0.05))
+    # The cancelled trial counts as a failure: open again, then a new trial is allowed
+    assert caller.breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    assert caller.breaker.state == CircuitBreaker.HALF_OPEN
+    hang[0] = False
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(_get(caller))
+
+
+def test_cancelled_call_while_closed_is_not_a_failure() -> None:
+    async def handler(request):
+        await asyncio.sleep(10)
+
+    caller = _caller(handler, threshold=1)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(_get(caller), 0.05))
+    assert caller.breaker.state == CircuitBreaker.CLOSED
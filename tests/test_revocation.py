@@ -0,0 +1,128 @@
+import time
+
+import pytest
+from starlette.requests import Request
+from starlette.responses import Response
+
+from common.src.config import RevocationConfig, SessionCacheConfig
+from common.src.revocation import BloomFilter, RevocationIndex, session_keys
+from common.src.session import BaseSessionManager
+
+
+def _index(path=None, **cfg) -> RevocationIndex:
+    return RevocationIndex(RevocationConfig(backend="sqlite" if path else "memory", sync_interval=0, **cfg), path, gc_interval=0)
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives() -> None:
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f"member-{i}")
+    assert all(f"member-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_session_keys() -> None:
+    data = {"_sid": "s1", "user": {"sub": "u1"}, "oidc_sid": "idp1"}
+    assert session_keys(data) == ["session:s1", "sub:u1", "sid:idp1"]
+    assert session_keys({"user": "not-a-dict"}) == []
+
+
+def test_revocation_applies_to_sessions_issued_before_it() -> None:
+    index = _index()
+    before = time.time() - 1
+    index.revoke("sub:u1", ttl=60)
+    after = time.time() + 1
+    assert index.session_revoked({"_iat": before, "user": {"sub": "u1"}})
+    # Signing in again after "log out everywhere" works
+    assert not index.session_revoked({"_iat": after, "user": {"sub": "u1"}})
+    # Sessions without an issue time predate revocation support: any revocation applies
+    assert index.session_revoked({"user": {"sub": "u1"}})
+    assert not index.session_revoked({"_iat": before, "user": {"sub": "u2"}})
+    assert index.revoked == 2 and index.clear == 2
+
+
+def test_expired_revocations_are_ignored_and_collected() -> None:
+    index = _index()
+    index.revoke("session:s1", ttl=0.01)
+    time.sleep(0.02)
+    assert not index.is_revoked("session:s1", 0.0)
+    assert index.gc() == 1
+    assert len(index) == 0
+
+
+def test_sqlite_revocations_reach_other_processes(tmp_path) -> None:
+    path = str(tmp_path / "revocations.db")
+    writer, reader = _index(path), _index(path)
+    writer.revoke("sid:idp1", ttl=60)
+    assert not reader.is_revoked("sid:idp1", 0.0)
+    reader._sync()
+    assert reader.is_revoked("sid:idp1", 0.0)
+    # A process starting later loads existing revocations
+    assert _index(path).is_revoked("sid:idp1", 0.0)
+    for index in (writer, reader):
+        index.close()
+
+
+def test_sqlite_write_is_left_to_the_sync_thread(tmp_path) -> None:
+    path = str(tmp_path / "revocations.db")
+    index = RevocationIndex(RevocationConfig(backend="sqlite", sync_interval=60), path, gc_interval=0)
+    with index._db_lock:
+        # Another write is holding the database: revoke still returns at once
+        start = time.monotonic()
+        index.revoke("session:s1", ttl=60)
+        assert time.monotonic() - start < 0.05
+        assert index.is_revoked("session:s1", 0.0)
+    deadline = time.monotonic() + 2
+    while not _index(path).is_revoked("session:s1", 0.0):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    index.close()
+
+
+def test_pending_writes_are_flushed_on_close(tmp_path) -> None:
+    path = str(tmp_path / "revocations.db")
+    index = RevocationIndex(RevocationConfig(backend="sqlite", sync_interval=60), path, gc_interval=0)
+    # Sync thread already stopped: the write is still pending at close
+    index._stop.set()
+    index._wake.set()
+    index._thread.join()
+    index.revoke("sub:u1", ttl=60)
+    assert index._writes
+    index.close()
+    assert _index(path).is_revoked("sub:u1", 0.0)
+
+
+def _cookie(response: Response) -> str:
+    return response.headers["set-cookie"].split(";", 1)[0].split("=", 1)[1]
+
+
+def _request(manager: BaseSessionManager, value: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [(b"cookie", f"{manager.cookie_name}={value}".encode())]})
+
+
+@pytest.mark.parametrize("cached", [True, False])
+def test_revoked_cookie_stops_working(cached: bool) -> None:
+    manager = BaseSessionManager("secret", revocation=_index(), cache=SessionCacheConfig(max_entries=1024 if cached else 0))
+    response = Response()
+    manager.set_session(response, {"user": {"sub": "u1"}})
+    value = _cookie(response)
+    assert manager.get_session(_request(manager, value))["user"] == {"sub": "u1"}
+    manager.revoke_user("u1")
+    assert manager.get_session(_request(manager, value)) is None
+
+
+def test_logout_revokes_the_copied_cookie() -> None:
+    manager = BaseSessionManager("secret", revocation=_index())
+    response = Response()
+    manager.set_session(response, {"user": {"sub": "u1"}})
+    value = _cookie(response)
+    manager.clear_session(Response(), _request(manager, value))
+    assert manager.get_session(_request(manager, value)) is None
+
+
+def test_sessions_older_than_ttl_are_rejected() -> None:
+    manager = BaseSessionManager("secret", ttl=60)
+    response = Response()
+    manager.set_session(response, {"user": {"sub": "u1"}, "_sid": "s1", "_iat": time.time() - 120})
+    assert manager.get_session(_request(manager, _cookie(response))) is None
@@ -0,0 +1,76 @@
+import time
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from common.src.cache import token_digest
+from common.src.config import RevocationConfig, SessionCacheConfig
+from common.src.revocation import RevocationIndex
+from common.src.session import BaseSessionManager
+
+
+def _manager(**kwargs) -> BaseSessionManager:
+    kwargs.setdefault("cache", SessionCacheConfig(max_entries=16))
+    return BaseSessionManager("secret", **kwargs)
+
+
+def _login(manager: BaseSessionManager, data: dict) -> str:
+    response = Response()
+    manager.set_session(response, data)
+    return response.headers["set-cookie"].split(";", 1)[0].split("=", 1)[1]
+
+
+def _request(manager: BaseSessionManager, value: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [(b"cookie", f"{manager.cookie_name}={value}".encode())]})
+
+
+def test_repeat_requests_are_served_from_the_cache() -> None:
+    manager = _manager()
+    value = _login(manager, {"user": {"sub": "u1"}})
+    first = manager.get_session(_request(manager, value))
+    first["user"] = "changed by a handler"
+    again = manager.get_session(_request(manager, value))
+    # Each request gets its own copy
+    assert again["user"] == {"sub": "u1"}
+    stats = manager.cache.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 1
+
+
+def test_cached_session_expires_with_the_session() -> None:
+    manager = _manager(ttl=60)
+    value = _login(manager, {"user": {"sub": "u1"}, "_sid": "s1", "_iat": time.time() - 59.95})
+    assert manager.get_session(_request(manager, value)) is not None
+    time.sleep(0.1)
+    assert manager.get_session(_request(manager, value)) is None
+    # The entry expired with the session instead of lingering in the LRU
+    assert manager.cache.get(token_digest(value)) is None
+
+
+def test_revocation_applies_to_cached_sessions() -> None:
+    revocation = RevocationIndex(RevocationConfig(backend="memory"), gc_interval=0)
+    manager = _manager(revocation=revocation)
+    value = _login(manager, {"user": {"sub": "u1"}, "oidc_sid": "idp1"})
+    assert manager.get_session(_request(manager, value)) is not None
+    manager.revoke_idp_session("idp1")
+    assert manager.get_session(_request(manager, value)) is None
+    # Another login of the same user is unaffected
+    other = _login(manager, {"user": {"sub": "u1"}, "oidc_sid": "idp2"})
+    assert manager.get_session(_request(manager, other)) is not None
+
+
+def test_logout_drops_the_cached_entry() -> None:
+    manager = _manager()
+    value = _login(manager, {"user": {"sub": "u1"}})
+    manager.get_session(_request(manager, value))
+    assert manager.cache.get(token_digest(value)) is not None
+    manager.clear_session(Response(), _request(manager, value))
+    assert manager.cache.stats()["entries"] == 0
+
+
+def test_cache_is_bounded_by_cookie_bytes() -> None:
+    manager = _manager(cache=SessionCacheConfig(max_entries=100, max_bytes=1000))
+    values = [_login(manager, {"user": {"sub": f"u{i}"}, "pad": "x" * 200}) for i in range(10)]
+    for value in values:
+        manager.get_session(_request(manager, value))
+    stats = manager.cache.stats()
+    assert stats["bytes"] <= 1000 and stats["entries"] < 10 and stats["evictions"] > 0
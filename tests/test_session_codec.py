@@ -0,0 +1,91 @@
+import pytest
+from itsdangerous import BadSignature
+from jose import jwt
+
+from common.src.session_codec import CompactCodec, JSONCodec, _b64encode
+
+
+SECRET, SALT = "test-secret", "test-session"
+
+
+def _token(**claims) -> str:
+    return jwt.encode({"sub": "user-1", "name": "x" * 200, **claims}, "idp-secret", algorithm="HS256")
+
+
+def _session() -> dict:
+    return {
+        "user": {"sub": "user-1", "username": "alice", "email": "alice@example.com"},
+        "access_token": _token(typ="access"),
+        "id_token": _token(typ="id"),
+        "expires_at": 1700000000,
+    }
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_round_trip_restores_tokens_exactly(compress: bool) -> None:
+    codec = CompactCodec(SECRET, SALT, compress=compress)
+    data = _session()
+    value = codec.dumps(data)
+    assert value.startswith("~")
+    assert codec.loads(value) == data
+
+
+def test_jwt_lookalikes_stay_plain() -> None:
+    codec = CompactCodec(SECRET, SALT)
+    # Three dot-separated parts that are not canonical base64url
+    data = {"note": "a.b.c", "padded": "YQ==.YQ==.YQ=="}
+    assert codec.loads(codec.dumps(data)) == data
+
+
+def test_legacy_json_cookies_are_still_read() -> None:
+    legacy = JSONCodec(SECRET, SALT).dumps(_session())
+    assert CompactCodec(SECRET, SALT).loads(legacy) == _session()
+
+
+def test_tampered_cookie_is_rejected() -> None:
+    codec = CompactCodec(SECRET, SALT)
+    value = codec.dumps(_session())
+    tampered = value[:-2] + ("A" if value[-2] != "A" else "B") + value[-1]
+    with pytest.raises(BadSignature):
+        codec.loads(tampered)
+    with pytest.raises(BadSignature):
+        CompactCodec("other-secret", SALT).loads(value)
+
+
+def test_unknown_version_is_rejected() -> None:
+    codec = CompactCodec(SECRET, SALT)
+    forged = "~" + codec.signer.sign(_b64encode(bytes([99, 0]) + b"{}")).decode()
+    with pytest.raises(BadSignature):
+        codec.loads(forged)
+
+
+def test_over_budget_drops_optional_fields() -> None:
+    data = _session()
+    full = CompactCodec(SECRET, SALT, compress=False).dumps(data)
+    without_id_token = CompactCodec(SECRET, SALT, compress=False).dumps({k: v for k, v in data.items() if k != "id_token"})
+    codec = CompactCodec(SECRET, SALT, compress=False, budget=len(full) - 1)
+    value = codec.dumps(data)
+    assert len(value) == len(without_id_token) <= codec.budget
+    decoded = codec.loads(value)
+    assert "id_token" not in decoded
+    assert decoded["access_token"] == data["access_token"]
+    # The caller's dict is left untouched
+    assert "id_token" in data
+
+
+def test_under_budget_keeps_everything() -> None:
+    codec = CompactCodec(SECRET, SALT, budget=100000)
+    assert "id_token" in codec.loads(codec.dumps(_session()))
+
+
+def test_still_over_budget_is_logged(monkeypatch) -> None:
+    warnings = []
+    monkeypatch.setattr("common.src.session_codec.log.warning", lambda event, msg, **fields: warnings.append((event, fields)))
+    codec = CompactCodec(SECRET, SALT, compress=False, budget=100)
+    value = codec.dumps(_session())
+    assert len(value) > codec.budget
+    assert "id_token" not in codec.loads(value)
+    assert [event for event, _ in warnings] == ["session_cookie_oversized"]
+    assert warnings[0][1]["size"] == len(value)
+    codec.dumps({"user": {"sub": "user-1"}})
+    assert len(warnings) == 1
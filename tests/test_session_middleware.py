@@ -0,0 +1,79 @@
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from common.src.config import RevocationConfig, SessionCacheConfig
+from common.src.revocation import RevocationIndex
+from common.src.session import BaseSessionManager, SessionMiddleware
+
+
+def _app():
+    revocation = RevocationIndex(RevocationConfig(backend="memory"), gc_interval=0)
+    manager = BaseSessionManager("secret", revocation=revocation, cache=SessionCacheConfig(max_entries=0))
+    loads = []
+    load = manager._load
+
+    def counting(request):
+        loads.append(request.url.path)
+        return load(request)
+
+    manager._load = counting
+    app = FastAPI()
+    app.add_middleware(SessionMiddleware, manager=manager)
+
+    @app.get("/login")
+    async def login(request: Request):
+        response = JSONResponse({})
+        manager.set_session(response, {"user": {"sub": "u1"}}, request)
+        return response
+
+    @app.get("/read")
+    async def read(request: Request):
+        sessions = [manager.get_session(request) for _ in range(3)]
+        response = JSONResponse({"same": request.state.session.data is sessions[0]})
+        manager.set_session(response, dict(sessions[0]), request)
+        return response
+
+    @app.get("/change")
+    async def change(request: Request):
+        response = JSONResponse({})
+        manager.set_session(response, {**manager.get_session(request), "theme": "dark"}, request)
+        return response
+
+    @app.get("/login-and-logout")
+    async def login_and_logout(request: Request):
+        response = JSONResponse({})
+        manager.set_session(response, {"user": {"sub": "u2"}}, request)
+        sid = manager.get_session(request)["_sid"]
+        manager.clear_session(response, request)
+        return JSONResponse({"sid": sid, "revoked": revocation.is_revoked(f"session:{sid}", 0.0)})
+
+    @app.get("/metrics")
+    async def metrics(request: Request):
+        return JSONResponse({"session": "session" in request.scope.get("state", {})})
+
+    return app, loads
+
+
+def test_session_is_decoded_once_and_unchanged_writes_send_no_cookie() -> None:
+    app, loads = _app()
+    client = TestClient(app)
+    assert "set-cookie" in client.get("/login").headers
+    assert loads == []
+    response = client.get("/read")
+    assert response.json() == {"same": True}
+    assert "set-cookie" not in response.headers
+    assert loads == ["/read"]
+    assert "set-cookie" in client.get("/change").headers
+
+
+def test_session_written_in_a_request_can_be_revoked_in_it() -> None:
+    app, _ = _app()
+    body = TestClient(app).get("/login-and-logout").json()
+    assert body["sid"] and body["revoked"]
+
+
+def test_skipped_paths_get_no_session() -> None:
+    app, loads = _app()
+    assert TestClient(app).get("/metrics").json() == {"session": False}
+    assert loads == []
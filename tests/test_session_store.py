@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from common.src.session import BaseSessionManager, SessionMiddleware
+from common.src.session_store import MemorySessionStore, SessionStore, SQLiteSessionStore
+
+
+def test_incomplete_backend_fails_on_construction() -> None:
+    class Partial(SessionStore):
+        def get(self, sid):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial(gc_interval=0)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    backend = MemorySessionStore(gc_interval=0) if request.param == "memory" else SQLiteSessionStore(str(tmp_path / "sessions.db"), gc_interval=0)
+    yield backend
+    backend.close()
+
+
+def test_set_get_delete(store: SessionStore) -> None:
+    store.set("sid", {"user": {"sub": "u1"}}, ttl=60)
+    assert store.get("sid") == {"user": {"sub": "u1"}}
+    store.delete("sid")
+    assert store.get("sid") is None
+
+
+def test_expired_sessions_are_absent_and_collected(store: SessionStore) -> None:
+    store.set("old", {"a": 1}, ttl=0.01)
+    store.set("live", {"b": 2}, ttl=60)
+    time.sleep(0.02)
+    assert store.get("old") is None
+    store.gc()
+    assert store.get("live") == {"b": 2}
+
+
+def test_sqlite_store_io_runs_off_the_event_loop(tmp_path) -> None:
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), gc_interval=0)
+    calls = []
+    for name in ("get", "set", "delete"):
+        def recording(*args, _op=getattr(store, name), _name=name):
+            calls.append((_name, threading.get_ident()))
+            return _op(*args)
+        setattr(store, name, recording)
+    manager = BaseSessionManager("secret", store=store)
+    loop_threads = set()
+    app = FastAPI()
+    app.add_middleware(SessionMiddleware, manager=manager)
+
+    @app.get("/login")
+    async def login(request: Request):
+        loop_threads.add(threading.get_ident())
+        response = JSONResponse({})
+        manager.set_session(response, {"user": {"sub": "u1"}}, request)
+        return response
+
+    @app.get("/me")
+    async def me(request: Request):
+        loop_threads.add(threading.get_ident())
+        sess = manager.get_session(request)
+        return JSONResponse(sess and sess["user"])
+
+    @app.get("/logout")
+    async def logout(request: Request):
+        loop_threads.add(threading.get_ident())
+        response = JSONResponse({})
+        manager.clear_session(response, request)
+        return response
+
+    with TestClient(app) as client:
+        client.get("/login")
+        # The write is committed before the browser receives the cookie
+        assert client.get("/me").json() == {"sub": "u1"}
+        client.get("/logout")
+        assert client.get("/me").json() is None
+    assert [name for name, _ in calls] == ["set", "get", "get", "delete"]
+    assert not {thread for _, thread in calls} & loop_threads
+    manager.close()
@@ -0,0 +1,27 @@
+import pytest
+
+from common.src.settings import load_settings
+
+
+@pytest.fixture
+def env(monkeypatch) -> None:
+    monkeypatch.delenv("SSO_CONFIG_FILE", raising=False)
+    for name, value in {
+        "CASDOOR_ISSUER": "http://idp.invalid",
+        "SSO_APPS": "app1",
+        "APP1_CLIENT_ID": "app1-client",
+        "APP1_CLIENT_SECRET": "secret",
+        "APP1_REDIRECT_URI": "http://127.0.0.1:9001/callback",
+    }.items():
+        monkeypatch.setenv(name, value)
+
+
+def test_settings_mappings_are_read_only(env) -> None:
+    settings = load_settings()
+    with pytest.raises(TypeError):
+        settings.oidc_options["http_pool"] = None
+    with pytest.raises(TypeError):
+        settings.token_validation["app1"] = None
+    assert settings.token_validation["app1"].mode == "local"
+    # Reloading the same environment compares equal, so nothing is rebuilt
+    assert load_settings() == settings
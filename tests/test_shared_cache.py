@@ -0,0 +1,110 @@
+import asyncio
+import fcntl
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from common.src.shared_cache import SharedCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    shared = SharedCache(str(tmp_path / "cache"), slots=1, slot_size=1024, wait=0.5)
+    yield shared
+    shared.close()
+
+
+def _try_lock(path: str, offset: int, hold: float, result) -> None:
+    # Runs in another process: fcntl locks of the parent do not apply to it
+    fd = os.open(path, os.O_RDWR)
+    try:
+        fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset)
+    except OSError:
+        result.value = 0
+        return
+    result.value = 1
+    time.sleep(hold)
+
+
+def _other_process_can_lock(path: str, offset: int) -> bool:
+    ctx = multiprocessing.get_context("fork")
+    result = ctx.Value("i", -1)
+    proc = ctx.Process(target=_try_lock, args=(path, offset, 0, result))
+    proc.start()
+    proc.join()
+    return result.value == 1
+
+
+def test_set_get_and_versions(cache: SharedCache) -> None:
+    first = cache.set("k", {"a": 1}, time.time() + 60)
+    assert cache.get("k") == (first, {"a": 1})
+    second = cache.set("k", {"a": 2}, time.time() + 60)
+    assert second > first and cache.version("k") == second
+    # Same slot (one slot), different key: not returned for "k"
+    cache.set("other", 1, time.time() + 60)
+    assert cache.get("k") is None
+
+
+def test_expired_and_oversized_entries(cache: SharedCache) -> None:
+    assert cache.set("big", "x" * 2000, time.time() + 60) == 0
+    cache.set("k", 1, time.time() + 0.01)
+    time.sleep(0.02)
+    assert cache.get("k") is None and cache.version("k") == 0
+
+
+def test_concurrent_loads_in_one_process_share_one_load(cache: SharedCache) -> None:
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"v": 1}
+
+    async def run():
+        return await asyncio.gather(*[cache.load("k", loader, time.time() + 60) for _ in range(5)])
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(value == {"v": 1} for _, value in results)
+
+
+def test_lease_is_kept_while_another_coroutine_relies_on_it(cache: SharedCache) -> None:
+    # Both keys map to the single slot, so both loads use the same lease
+    lease = cache.slots + 0
+    observed = {}
+
+    async def fast():
+        return "fast"
+
+    async def slow():
+        await asyncio.sleep(0.2)
+        return "slow"
+
+    async def run():
+        slow_load = asyncio.ensure_future(cache.load("slow", slow, time.time() + 60))
+        await asyncio.sleep(0.01)
+        await cache.load("fast", fast, time.time() + 60)
+        # The fast load finished; the slow one still holds the lease
+        observed["during"] = await asyncio.get_running_loop().run_in_executor(None, _other_process_can_lock, cache.path, lease)
+        await slow_load
+
+    asyncio.run(run())
+    assert observed["during"] is False
+    assert _other_process_can_lock(cache.path, lease)
+
+
+def test_set_does_not_block_on_a_held_slot(cache: SharedCache) -> None:
+    ctx = multiprocessing.get_context("fork")
+    result = ctx.Value("i", -1)
+    holder = ctx.Process(target=_try_lock, args=(cache.path, 0, 1.0, result))
+    holder.start()
+    while result.value == -1:
+        time.sleep(0.005)
+    assert result.value == 1
+    start = time.monotonic()
+    assert cache.set("k", 1, time.time() + 60) == 0
+    assert time.monotonic() - start < 0.05
+    holder.join()
+    assert cache.set("k", 1, time.time() + 60) > 0
@@ -0,0 +1,51 @@
+import asyncio
+import dataclasses
+
+import pytest
+from starlette.requests import Request
+
+from common.src.config import TemplateConfig
+from common.src.registry import AppRegistry
+from common.src.templating import PageTemplates
+
+
+def _request(etag: str = "") -> Request:
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+@pytest.fixture
+def templates(tmp_path) -> PageTemplates:
+    (tmp_path / "apps.html").write_text("{% for rp in apps %}[{{ rp.spec.title }}]{% endfor %}")
+    (tmp_path / "app.html").write_text("{{ app.title }}")
+    return PageTemplates(str(tmp_path), TemplateConfig())
+
+
+def test_registry_page_follows_reloads(templates: PageTemplates, make_spec) -> None:
+    registry = AppRegistry([make_spec("app1", "One")], {})
+    assert asyncio.run(templates.cached(_request(), "apps.html", apps=registry)).body == b"[One]"
+    asyncio.run(registry.apply([make_spec("app1", "One"), make_spec("app2", "Two")], {}))
+    assert asyncio.run(templates.cached(_request(), "apps.html", apps=registry)).body == b"[One][Two]"
+    asyncio.run(registry.apply([make_spec("app2", "Deux")], {}))
+    assert asyncio.run(templates.cached(_request(), "apps.html", apps=registry)).body == b"[Deux]"
+
+
+def test_specs_are_keyed_by_content(templates: PageTemplates, make_spec) -> None:
+    spec = make_spec("app1", "One")
+    first = asyncio.run(templates.cached(_request(), "app.html", app=spec))
+    # An equal copy reuses the page; a changed spec renders a new one
+    again = asyncio.run(templates.cached(_request(), "app.html", app=dataclasses.replace(spec)))
+    assert again.headers["etag"] == first.headers["etag"]
+    changed = asyncio.run(templates.cached(_request(), "app.html", app=dataclasses.replace(spec, title="Uno")))
+    assert changed.body == b"Uno"
+    assert len(templates._pages) == 2
+
+
+def test_matching_etag_gets_304(templates: PageTemplates, make_spec) -> None:
+    etag = asyncio.run(templates.cached(_request(), "app.html", app=make_spec("app1", "One"))).headers["etag"]
+    assert asyncio.run(templates.cached(_request(etag), "app.html", app=make_spec("app1", "One"))).status_code == 304
+
+
+def test_unhashable_context_is_rejected(templates: PageTemplates) -> None:
+    with pytest.raises(TypeError):
+        asyncio.run(templates.cached(_request(), "app.html", app={"title": "One"}))